@@ -7,6 +7,7 @@ import random
 import sys
 import traceback
 
+import pyddle_collections as pcollections
 import pyddle_console as pconsole
 import pyddle_debugging as pdebugging
 import pyddle_dotnet as pdotnet
@@ -34,11 +35,12 @@ try:
     # A neutral character that is rarely used in solution/project names.
     VALUE_SEPARATOR = "|"
 
+    # The names are checked for every directory, so they are looked up in case-insensitive sets.
     ignored_directory_names = []
     ignored_directory_names_string = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}ignored_directory_names")
 
     if ignored_directory_names_string:
-        ignored_directory_names = [value.strip() for value in ignored_directory_names_string.split(VALUE_SEPARATOR) if value.strip()]
+        ignored_directory_names = pcollections.CaseInsensitiveSet(value.strip() for value in ignored_directory_names_string.split(VALUE_SEPARATOR) if value.strip())
 
         if ignored_directory_names:
             poutput.print_and_log(f"ignored_directory_names: {ignored_directory_names}")
@@ -47,7 +49,7 @@ try:
     obsolete_solution_names_string = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}obsolete_solution_names")
 
     if obsolete_solution_names_string:
-        obsolete_solution_names = [value.strip() for value in obsolete_solution_names_string.split(VALUE_SEPARATOR) if value.strip()]
+        obsolete_solution_names = pcollections.CaseInsensitiveSet(value.strip() for value in obsolete_solution_names_string.split(VALUE_SEPARATOR) if value.strip())
 
         if obsolete_solution_names:
             poutput.print_and_log(f"obsolete_solution_names: {obsolete_solution_names}")
@@ -65,7 +67,7 @@ try:
     not_archived_directory_names_string = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}not_archived_directory_names")
 
     if not_archived_directory_names_string:
-        not_archived_directory_names = [value.strip() for value in not_archived_directory_names_string.split(VALUE_SEPARATOR) if value.strip()]
+        not_archived_directory_names = pcollections.CaseInsensitiveSet(value.strip() for value in not_archived_directory_names_string.split(VALUE_SEPARATOR) if value.strip())
 
         if not_archived_directory_names:
             poutput.print_and_log(f"not_archived_directory_names: {not_archived_directory_names}")
@@ -74,7 +76,7 @@ try:
     not_archived_file_names_string = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}not_archived_file_names")
 
     if not_archived_file_names_string:
-        not_archived_file_names = [value.strip() for value in not_archived_file_names_string.split(VALUE_SEPARATOR) if value.strip()]
+        not_archived_file_names = pcollections.CaseInsensitiveSet(value.strip() for value in not_archived_file_names_string.split(VALUE_SEPARATOR) if value.strip())
 
         if not_archived_file_names:
             poutput.print_and_log(f"not_archived_file_names: {not_archived_file_names}")
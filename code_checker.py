@@ -5,6 +5,7 @@ import os
 import sys
 import traceback
 
+import pyddle_collections as pcollections
 import pyddle_console as pconsole
 import pyddle_datetime as pdatetime
 import pyddle_debugging as pdebugging
@@ -15,9 +16,13 @@ import pyddle_openai as popenai
 import pyddle_path as ppath
 import pyddle_prompts as pprompts
 import pyddle_string as pstring
+import pyddle_type as ptype
 
 pglobal.set_main_script_file_path(__file__)
 
+# The encoding is loaded while the user is selecting a project instead of after the first response.
+popenai.prewarm_encodings([popenai.Model.GPT_4_TURBO])
+
 try:
     KVS_KEY_PREFIX = "code_checker/"
 
@@ -28,19 +33,41 @@ try:
     project_directory_paths = sorted([path_ for path_ in (path.strip() for path in project_directory_paths_str.split("|")) if path_])
     pconsole.print(f"project_directory_paths: {project_directory_paths}")
 
-    def check_code(project_directory_path_, file_name_, prompt):
-        file_path = os.path.join(project_directory_path_, file_name_)
-        code = pfs.read_all_text_from_file(file_path)
+    # Replaying previous reviews is opt-in; a re-check is usually requested to get a fresh one.
+    # When enabled, the requests are made deterministic (as much as the API allows) so that a cached review is what the same request would return anyway.
+    use_response_cache = ptype.str_to_bool_or_default(pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}use_response_cache"), False)
+    pconsole.print(f"use_response_cache: {use_response_cache}")
+
+    RESPONSE_CACHE_SEED = 20240420
 
+    def build_messages(code, prompt):
         messages: list[dict[str, str]] = []
         popenai.add_system_message(messages, pprompts.SYSTEM_MESSAGE_FOR_TEXT_AND_MULTI_SENTENCE_PROMPT_MESSAGES)
         popenai.add_user_message(messages, pprompts.get_text_message(code))
         popenai.add_user_message(messages, pprompts.get_multi_sentence_prompt_message(prompt))
+        return messages
+
+    def check_code(project_directory_path_, file_name_, prompt):
+        file_path = os.path.join(project_directory_path_, file_name_)
+        code = pfs.read_all_text_from_file(file_path)
 
-        response = popenai.create_chat_completions(
-            model = popenai.Model.GPT_4_TURBO,
-            messages = messages,
-            stream = True)
+        messages = build_messages(code, prompt)
+
+        if use_response_cache:
+            # Re-checking an unchanged file with the same prompt replays the previous response from the cache.
+            response = popenai.create_chat_completions(
+                model = popenai.Model.GPT_4_TURBO,
+                messages = messages,
+                seed = RESPONSE_CACHE_SEED,
+                stream = True,
+                temperature = 0,
+                cache = popenai.get_default_response_cache())
+
+        else:
+            response = popenai.create_chat_completions(
+                model = popenai.Model.GPT_4_TURBO,
+                messages = messages,
+                stream = True)
 
         chunk_deltas: list[str] = []
         reader = pstring.ChunkStrReader(indents = pstring.LEVELED_INDENTS[1])
@@ -64,6 +91,9 @@ try:
 
         response_str = "".join(chunk_deltas).rstrip()
 
+        create_log_file(project_directory_path_, file_name_, prompt, code, response_str)
+
+    def create_log_file(project_directory_path_, file_name_, prompt, code, response_str):
         utc_now = pdatetime.get_utc_now()
         date_string = utc_now.strftime("%Y%m%dT%H%M%SZ")
         file_name_without_extension, _ = os.path.splitext(file_name_)
@@ -71,12 +101,14 @@ try:
         project_name = ppath.basename(project_directory_path_)
         log_file_path = os.path.join(pyddle_directory_path, "code_checks", project_name, log_file_name)
 
+        code_tokens, response_tokens = popenai.get_gpt_4_turbo_token_counter().count_batch([code, response_str])
+
         file_contents: list[str] = []
         file_contents.append(f"UTC: {utc_now.isoformat()}\n")
         file_contents.append(f"File: {project_name}/{file_name_}\n")
         file_contents.append(f"Prompt: {prompt}\n")
-        file_contents.append(f"Code Tokens: {popenai.get_gpt_4_turbo_token_counter().count(code)}\n")
-        file_contents.append(f"Response Tokens: {popenai.get_gpt_4_turbo_token_counter().count(response_str)}\n\n")
+        file_contents.append(f"Code Tokens: {code_tokens}\n")
+        file_contents.append(f"Response Tokens: {response_tokens}\n\n")
         file_contents.append(response_str)
         file_contents.append("\n")
         file_content_str = "".join(file_contents)
@@ -85,15 +117,64 @@ try:
         pfs.write_all_text_to_file(log_file_path, file_content_str)
         pconsole.print(f"Log file created: {log_file_path}")
 
+    # Checking every file of a project doesnt need immediate answers.
+    # With the Batch API, the requests are processed within 24 hours at half the price and without eating into the normal rate limits.
+
+    # Waiting for the whole completion window would block the menu for up to 24 hours.
+    # The console waits only for a while; the results of a batch that isnt done by then are collected later with "collect <batch ID>".
+    BATCH_WAIT_TIMEOUT = 10 * 60 # In seconds.
+
+    def check_code_in_batch(project_directory_path_, file_names_, prompt):
+        requests = []
+
+        settings = popenai.ChatSettings(model = popenai.Model.GPT_4_TURBO)
+
+        for file_name_ in file_names_:
+            code = pfs.read_all_text_from_file(os.path.join(project_directory_path_, file_name_))
+            requests.append(popenai.BatchRequest(custom_id = file_name_, settings = settings, messages = build_messages(code, prompt)))
+
+        project_name = ppath.basename(project_directory_path_)
+        batch_file_path = os.path.join(pyddle_directory_path, "code_checks", project_name, f"{pdatetime.get_utc_now().strftime("%Y%m%dT%H%M%SZ")}-batch.jsonl")
+
+        batch = popenai.submit_batch(popenai.write_batch_file(batch_file_path, requests))
+        pconsole.print(f"Batch submitted: {batch.id}")
+
+        collect_batch_results(project_directory_path_, batch.id, prompt)
+
+    def collect_batch_results(project_directory_path_, batch_id, prompt):
+        try:
+            batch = popenai.wait_for_batch(batch_id, timeout = BATCH_WAIT_TIMEOUT, on_polled = lambda batch: pconsole.print(f"Batch {batch.id}: {batch.status}"))
+
+        except TimeoutError:
+            pconsole.print(f"Batch {batch_id} is still running. Enter \"collect {batch_id}\" later to collect its results.", colors = pconsole.WARNING_COLORS)
+            return
+
+        results = popenai.download_batch_results(batch)
+
+        if not results:
+            pconsole.print(f"No results: batch {batch_id} is {batch.status}.", colors = pconsole.ERROR_COLORS)
+            return
+
+        for custom_id in sorted(results):
+            result = results[custom_id]
+
+            if result.is_successful:
+                # The results may be collected in a later session, so the code is read again for the log file.
+                code = pfs.read_all_text_from_file(os.path.join(project_directory_path_, custom_id))
+                create_log_file(project_directory_path_, custom_id, prompt, code, (popenai.extract_first_message(result.response) or "").rstrip())
+
+            else:
+                pconsole.print(f"Failed to check {custom_id}: {result.error}", colors = pconsole.ERROR_COLORS)
+
     def get_ignored_file_names(project_directory_path_):
         project_name = ppath.basename(project_directory_path_)
         ignored_file_path = os.path.join(pyddle_directory_path, "code_checks", project_name, "ignored.txt")
 
         if os.path.isfile(ignored_file_path):
             file_content_lines = pstring.splitlines(pfs.read_all_text_from_file(ignored_file_path))
-            return [path for path in file_content_lines if path and not path.startswith("#")]
+            return pcollections.CaseInsensitiveSet(path for path in file_content_lines if path and not path.startswith("#"))
 
-        return []
+        return pcollections.CaseInsensitiveSet()
 
     # Checked code on: 2024-04-21
     CHECK_PROMPT = "Potential issues and improvements, as many and detailed as possible, please."
@@ -143,7 +224,7 @@ try:
         pconsole.print("Files:")
         file_names = [ppath.basename(path) for path in file_paths]
         pconsole.print_numbered_options(file_names, indents = pstring.LEVELED_INDENTS[1])
-        file_index_str = input("Select file or \"all\" or else to close: ")
+        file_index_str = input("Select file or \"all\" or \"batch\" or \"collect <batch ID>\" or else to close: ")
 
         try:
             file_index = int(file_index_str)
@@ -164,6 +245,14 @@ try:
 
             continue
 
+        if pstring.equals_ignore_case(file_index_str, "batch"):
+            check_code_in_batch(project_directory_path, file_names, CHECK_PROMPT)
+            continue
+
+        if pstring.startswith_ignore_case(file_index_str, "collect "):
+            collect_batch_results(project_directory_path, file_index_str[len("collect "):].strip(), CHECK_PROMPT)
+            continue
+
         break
 
 except Exception: # pylint: disable = broad-except
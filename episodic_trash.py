@@ -13,6 +13,7 @@ import uuid
 
 import pyperclip # type: ignore
 
+import pyddle_collections as pcollections
 import pyddle_console as pconsole
 import pyddle_datetime as pdatetime
 import pyddle_debugging as pdebugging
@@ -179,7 +180,7 @@ def generate_random_code(episodes_):
 
         is_note_found = False
 
-        for episode_ in episodes_:
+        for episode_ in episodes_.values():
             if get_note(episode_.notes, code_):
                 is_note_found = True
                 break
@@ -192,11 +193,8 @@ def generate_random_code(episodes_):
 # Safer to separate the following 2 functions.
 
 def get_episode(episodes_, code_):
-    for episode_ in episodes_:
-        if pstring.equals_ignore_case(episode_.code, code_):
-            return episode_
-
-    return None
+    # "episodes_" is a CaseInsensitiveDict keyed by the codes.
+    return episodes_.get(code_)
 
 def get_note(notes, code_):
     for note in notes:
@@ -253,7 +251,7 @@ def episodes_list_command(episodes_):
         return
 
     # Sorted like a directory's file list.
-    for episode_ in sorted(episodes_, key = lambda episode: episode.title.lower()):
+    for episode_ in sorted(episodes_.values(), key = lambda episode: episode.title.lower()):
         pconsole.print(f"{episode_.code} {episode_.title}", indents = pstring.LEVELED_INDENTS[1])
 
 def notes_list_command(notes, depth):
@@ -264,8 +262,9 @@ def notes_list_command(notes, depth):
             pconsole.print("No notes found.", indents = pstring.LEVELED_INDENTS[1])
             return
 
-    for note in notes:
-        partial_content = pstring.extract_first_part(note.content)
+    partial_contents = pstring.extract_first_parts([note.content for note in notes])
+
+    for note, partial_content in zip(notes, partial_contents):
         pconsole.print(f"{note.code} {partial_content}", indents = pstring.LEVELED_INDENTS[depth + 1])
 
         if note.notes:
@@ -528,7 +527,11 @@ try:
     episodic_directory_path = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}episodic_directory_path")
     pconsole.print(f"episodic_directory_path: {episodic_directory_path}")
 
-    episodes = []
+    # Code => EpisodeInfo, case-insensitively.
+    episodes = pcollections.CaseInsensitiveDict()
+
+    # Code => File names of all the episodes with the code, for the codes that are used more than once.
+    duplicate_episode_file_names = pcollections.CaseInsensitiveDict()
 
     if os.path.isdir(episodic_directory_path):
         for episode_file_name in os.listdir(episodic_directory_path):
@@ -539,10 +542,25 @@ try:
                     episode = EpisodeInfo()
                     episode.file_path = os.path.join(episodic_directory_path, episode_file_name)
                     episode.load()
-                    episodes.append(episode)
 
                 except Exception as exception: # pylint: disable = broad-except
                     pconsole.print(f"Invalid episode file: {episode_file_name}", colors = pconsole.ERROR_COLORS)
+                    continue
+
+                if episode.code in episodes:
+                    if episode.code not in duplicate_episode_file_names:
+                        duplicate_episode_file_names[episode.code] = [ppath.basename(typing.cast(str, episodes[episode.code].file_path))]
+
+                    duplicate_episode_file_names[episode.code].append(episode_file_name)
+                    continue
+
+                episodes[episode.code] = episode
+
+    # Skipping any of the episodes would hide it and let its notes' codes be generated again.
+    # Nothing has been written yet, so stopping here loses nothing; the files must be fixed by hand.
+    # All the duplicates are reported at once so that they can be fixed in one go.
+    if duplicate_episode_file_names:
+        raise perrors.InvalidDataError("Duplicate episode codes: " + "; ".join(f"{code} ({", ".join(file_names)})" for code, file_names in duplicate_episode_file_names.items()))
 
     if not episodes:
         episodes_help_command()
@@ -578,7 +596,7 @@ try:
                         pconsole.print("Failed to create episode.", colors = pconsole.ERROR_COLORS)
                         continue
 
-                    episodes.append(episode)
+                    episodes[episode.code] = episode
 
                     pconsole.print("Episode created.")
 
@@ -657,7 +675,7 @@ try:
                             pconsole.print("Failed to delete episode.", colors = pconsole.ERROR_COLORS)
                             continue
 
-                        episodes.remove(episode)
+                        del episodes[episode.code]
 
                         pconsole.print("Episode deleted.")
 
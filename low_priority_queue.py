@@ -269,10 +269,10 @@ def select_shown_tasks(handled_task_list_, task_list_, shows_all):
     # Not great coding, but I dont want to change shown_tasks to an array of tuples.
     return shown_tasks_, execution_counts_
 
+COMMAND_STR_REGEX = pstring.register_regex("low_priority_queue/command_str", r"^(?P<command>[a-z]+)(\s+(?P<number>[0-9]+)(\s+(?P<parameter>.+))?)?$", flags = re.IGNORECASE)
+
 def parse_command_str(command_str_):
-    # Regex not compiled.
-    # Infrequent operation.
-    match = re.match(r"^(?P<command>[a-z]+)(\s+(?P<number>[0-9]+)(\s+(?P<parameter>.+))?)?$", command_str_, re.IGNORECASE)
+    match = COMMAND_STR_REGEX.match(command_str_)
 
     if match:
         number_str = match.group("number")
@@ -1,7 +1,10 @@
 ﻿# Created: 2024-03-26
 # Collection-related things.
 
+import collections.abc
+
 import pyddle_errors as perrors
+import pyddle_string as pstring
 
 # For implementing sugar-coating methods.
 # Sometimes, we should just not give certain arguments.
@@ -32,6 +35,11 @@ class PotentiallyFalsyArgs:
         if value:
             self.args[key] = value
 
+    # For numeric parameters like "seed" and "temperature", 0 is a meaningful value and must be given.
+    def may_contain_not_none(self, key, value):
+        if value is not None:
+            self.args[key] = value
+
     def may_contain_enum_name(self, key, value):
         if value:
             self.args[key] = value.name
@@ -39,3 +47,91 @@ class PotentiallyFalsyArgs:
     def may_contain_enum_value(self, key, value):
         if value:
             self.args[key] = value.value
+
+# Python has no equivalent of C#'s IEqualityComparer<T> to make a dictionary compare its keys case-insensitively.
+# CaseInsensitiveDict stores each item under its lowercased (or casefolded) key together with the original key,
+#     so that lookups are O(1) and the keys are still returned as they were first added.
+
+# The keys are converted by pyddle_string.to_ignore_case_key/to_casefold_key.
+
+class CaseInsensitiveDict(collections.abc.MutableMapping):
+    def __init__(self, items = None, casefold = False):
+        self.casefold = casefold
+        self.to_key = pstring.to_casefold_key if casefold else pstring.to_ignore_case_key
+        self.__items = {} # Converted key => (original key, value)
+
+        if items:
+            self.update(items)
+
+    def get_original_key(self, key):
+        ''' Returns None if the key is not in the dictionary. '''
+
+        item = self.__items.get(self.to_key(key))
+        return item[0] if item else None
+
+    def __getitem__(self, key):
+        return self.__items[self.to_key(key)][1]
+
+    def __setitem__(self, key, value):
+        converted_key = self.to_key(key)
+        item = self.__items.get(converted_key)
+
+        # Like dict, the original key is kept when the value is replaced.
+        self.__items[converted_key] = (item[0] if item else key, value)
+
+    def __delitem__(self, key):
+        del self.__items[self.to_key(key)]
+
+    def __contains__(self, key):
+        return self.to_key(key) in self.__items
+
+    def __iter__(self):
+        return (item[0] for item in self.__items.values())
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+# Like CaseInsensitiveDict, CaseInsensitiveSet keeps the original strings in the order they were first added.
+
+class CaseInsensitiveSet(collections.abc.MutableSet):
+    def __init__(self, strs = None, casefold = False):
+        self.casefold = casefold
+        self.to_key = pstring.to_casefold_key if casefold else pstring.to_ignore_case_key
+        self.__strs = {} # Converted key => original string
+
+        if strs:
+            for str_ in strs:
+                self.add(str_)
+
+    # The mixin methods (like "&" and "|") create new sets with this.
+    # Without it, the results would lowercase their strings even if this set casefolds them.
+    def _from_iterable(self, it):
+        return CaseInsensitiveSet(it, casefold = self.casefold)
+
+    def get_original_str(self, str_):
+        ''' Returns None if the string is not in the set. '''
+
+        return self.__strs.get(self.to_key(str_))
+
+    def add(self, value):
+        # Like set, the string that was added first is kept.
+        self.__strs.setdefault(self.to_key(value), value)
+
+    def discard(self, value):
+        self.__strs.pop(self.to_key(value), None)
+
+    def __contains__(self, x):
+        return self.to_key(x) in self.__strs
+
+    def __iter__(self):
+        return iter(self.__strs.values())
+
+    def __len__(self):
+        return len(self.__strs)
+
+    # Printed like the list it usually replaces.
+    def __repr__(self):
+        return repr(list(self))
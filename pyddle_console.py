@@ -27,7 +27,10 @@ def print(str_: str | None, indents = "", colors: list[str] | None = None, end =
     else:
         builtin_print("", end = end)
 
-def print_lines(str_: list[str] | None, indents = "", colors: list[str] | None = None, trailing = "", end = "\n"):
+# "line_part_offsets", if provided, must contain what pstring.get_line_part_offsets returns for each line.
+# pyddle_output.print_and_log_lines computes them once and shares them with plogging.log_lines.
+
+def print_lines(str_: list[str] | None, indents = "", colors: list[str] | None = None, trailing = "", end = "\n", line_part_offsets: list[tuple[int, int]] | None = None):
     if str_:
         if colors:
             colors_string = "".join(colors)
@@ -35,13 +38,14 @@ def print_lines(str_: list[str] | None, indents = "", colors: list[str] | None =
         else:
             colors_string = None
 
-        for line in str_:
-            parts = pstring.split_line_into_parts(line)
+        if line_part_offsets is None:
+            line_part_offsets = [pstring.get_line_part_offsets(line) for line in str_]
 
-            if parts[1]:
+        for line, (visible_content_start, visible_content_end) in zip(str_, line_part_offsets):
+            if visible_content_start < visible_content_end:
                 if colors_string:
                     # Colors are applied only to the visible content.
-                    builtin_print(f"{indents}{parts[0]}{colors_string}{parts[1]}{colorama.Style.RESET_ALL}{parts[2]}{trailing}", end = end)
+                    builtin_print(f"{indents}{line[:visible_content_start]}{colors_string}{line[visible_content_start:visible_content_end]}{colorama.Style.RESET_ALL}{line[visible_content_end:]}{trailing}", end = end)
 
                 else:
                     builtin_print(f"{indents}{line}{trailing}", end = end)
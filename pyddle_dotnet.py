@@ -8,6 +8,7 @@ import shutil
 import subprocess
 import xml.etree.ElementTree
 
+import pyddle_collections as pcollections
 import pyddle_errors as perrors
 import pyddle_file_system as pfs
 import pyddle_path as ppath
@@ -130,8 +131,11 @@ class ProjectInfo:
             if extracted_referenced_project_names:
                 referenced_projects = []
 
+                # Built for each project so that it reflects the current "projects" of the solutions.
+                project_index = build_project_index(self.solutions)
+
                 for referenced_project_name in extracted_referenced_project_names:
-                    referenced_project = find_referenced_project(self.solutions, referenced_project_name)
+                    referenced_project = find_referenced_project(self.solutions, referenced_project_name, project_index = project_index)
 
                     if not referenced_project:
                         raise perrors.GeneralError(f"Referenced project not found: {referenced_project_name}")
@@ -202,6 +206,9 @@ def extract_version_string_from_app_manifest_file(path):
 
 ASSEMBLY_INFO_FILE_VERSION_STRING_PATTERN = r"\[assembly:\s*AssemblyVersion\s*\(\"(?P<version>\d+\.\d+(\.\d+){0,2})\"\)\]"
 
+# Applied to every line of every AssemblyInfo.cs file.
+ASSEMBLY_INFO_FILE_VERSION_STRING_REGEX = pstring.register_regex("pyddle_dotnet/assembly_info_file_version_string", ASSEMBLY_INFO_FILE_VERSION_STRING_PATTERN, flags = re.IGNORECASE)
+
 def extract_version_string_from_assembly_info_file(path):
     """
         Returns None if the version string is not found.
@@ -214,9 +221,7 @@ def extract_version_string_from_assembly_info_file(path):
             if line.lstrip().startswith("//"):
                 continue
 
-            # Regex not compiled.
-            # Infrequent operation.
-            match = re.match(ASSEMBLY_INFO_FILE_VERSION_STRING_PATTERN, line, flags = re.IGNORECASE)
+            match = ASSEMBLY_INFO_FILE_VERSION_STRING_REGEX.match(line)
 
             if match:
                 return match.group("version")
@@ -320,7 +325,24 @@ def is_valid_referenced_project_name(str_):
 
     return True
 
-def find_referenced_project(solutions, referenced_project_name):
+# As "projects" is set from the outside, the index isnt kept anywhere in this module; it could go stale.
+# Whoever resolves many names against the same solutions builds it once and passes it.
+
+def build_project_index(solutions):
+    project_index = pcollections.CaseInsensitiveDict()
+
+    for solution in solutions:
+        for project in solution.projects:
+            # Like the linear search, the first project with the name is found.
+            if project.name not in project_index:
+                project_index[project.name] = project
+
+    return project_index
+
+def find_referenced_project(solutions, referenced_project_name, project_index = None):
+    if project_index is not None:
+        return project_index.get(referenced_project_name)
+
     for solution in solutions:
         for project in solution.projects:
             if pstring.equals_ignore_case(project.name, referenced_project_name):
@@ -4,6 +4,7 @@
 import os
 import zipfile
 
+import pyddle_collections as pcollections
 import pyddle_errors as perrors
 import pyddle_global as pglobal
 import pyddle_path as ppath
@@ -200,6 +201,14 @@ def zip_archive_directory(directory_path, archive_file_path, not_archived_direct
 
     # https://docs.python.org/3/library/zipfile.html
 
+    # The names are checked once per file and directory, so lists are converted to sets only once here.
+
+    if not_archived_directory_names and not isinstance(not_archived_directory_names, pcollections.CaseInsensitiveSet):
+        not_archived_directory_names = pcollections.CaseInsensitiveSet(not_archived_directory_names)
+
+    if not_archived_file_names and not isinstance(not_archived_file_names, pcollections.CaseInsensitiveSet):
+        not_archived_file_names = pcollections.CaseInsensitiveSet(not_archived_file_names)
+
     with zipfile.ZipFile(archive_file_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
         if os.path.isdir(directory_path):
             return zip_archive_subdirectory(zip_file, directory_path, directory_path, not_archived_directory_names, not_archived_file_names)
@@ -105,6 +105,8 @@ def get_merged_data():
 # Important: Keys are compared case-sensitively.
 # There seems to be no elegant way (like C#'s IEqualityComparer<T>) to make a case-insensitive dictionary in Python.
 # That would be one reason to use only lower-cased keys in JSON files that are meant to be read by Python.
+# pyddle_collections.CaseInsensitiveDict is available for name lookups in our own code,
+#     but the data here is kept in plain dictionaries so that the JSON files are read and written as they are.
 
 def read_from_public_data(key):
     """ Returns None if the key is not in the dictionary. """
@@ -2,8 +2,16 @@
 # A module that helps us organize knowledge in a tree structure.
 
 from __future__ import annotations
+import collections
+import concurrent.futures
+import datetime
+import enum
+import heapq
+import json
+import struct
 import typing
 import uuid
+import zlib
 
 import openai
 
@@ -43,6 +51,7 @@ class Element:
 
         # Optional:
         self.client: openai.OpenAI | None = None
+        self.async_client: openai.AsyncOpenAI | None = None
         self.chat_settings: popenai.ChatSettings | None = None
         self.timeout = None
 
@@ -63,6 +72,7 @@ class Element:
         attribute.parent_element = self
 
         attribute.client = self.client
+        attribute.async_client = self.async_client
         attribute.chat_settings = self.chat_settings
         attribute.timeout = self.timeout
 
@@ -79,6 +89,7 @@ class Element:
         translation.parent_element = self
 
         translation.client = self.client
+        translation.async_client = self.async_client
         translation.chat_settings = self.chat_settings
         translation.timeout = self.timeout
 
@@ -92,6 +103,12 @@ class Element:
             client,
             self.client)
 
+    def _get_async_client(self, async_client: openai.AsyncOpenAI | None):
+        return putility.get_not_none_or_call_func(
+            popenai.get_default_async_client,
+            async_client,
+            self.async_client)
+
     def _get_chat_settings(self, chat_settings: popenai.ChatSettings | None):
         return putility.get_not_none_or_call_func(
             popenai.get_default_chat_settings,
@@ -150,6 +167,81 @@ class Element:
 
         return self.create_translation(language, content)
 
+    # The "*_async" methods are the asynchronous versions of the methods with the same names without the suffix.
+    # They use openai.AsyncOpenAI and must be awaited.
+
+    async def generate_attribute_with_prompt_async(
+        self,
+
+        name,
+        prompt,
+
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        response = await popenai.create_chat_completions_with_settings_async(
+            settings = self._get_chat_settings(chat_settings),
+            messages = popenai.build_messages(prompt),
+            client = self._get_async_client(async_client),
+            timeout = self._get_response_timeout(timeout))
+
+        value = popenai.extract_first_message(response)
+
+        return self.create_attribute(name, value)
+
+    async def generate_translation_with_prompt_async(
+        self,
+
+        language: popenai.Language | str,
+        prompt,
+
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        response = await popenai.create_chat_completions_with_settings_async(
+            settings = self._get_chat_settings(chat_settings),
+            messages = popenai.build_messages(prompt),
+            client = self._get_async_client(async_client),
+            timeout = self._get_response_timeout(timeout))
+
+        content = popenai.extract_first_message(response)
+
+        return self.create_translation(language, content)
+
+    def generate_attributes_with_prompts(
+        self,
+
+        prompts: dict[str, str],
+
+        client: openai.OpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None,
+        max_workers = None):
+
+        ''' Generates the attributes concurrently. Returns the jobs in the order of "prompts". '''
+
+        jobs = [GenerationJob(self, GenerationTarget.ATTRIBUTE, name, prompt) for name, prompt in prompts.items()]
+
+        return run_generation_jobs(jobs, client = client, chat_settings = chat_settings, timeout = timeout, max_workers = max_workers)
+
+    def generate_translations_with_prompts(
+        self,
+
+        prompts: dict[popenai.Language | str, str],
+
+        client: openai.OpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None,
+        max_workers = None):
+
+        ''' Generates the translations concurrently. Returns the jobs in the order of "prompts". '''
+
+        jobs = [GenerationJob(self, GenerationTarget.TRANSLATION, language, prompt) for language, prompt in prompts.items()]
+
+        return run_generation_jobs(jobs, client = client, chat_settings = chat_settings, timeout = timeout, max_workers = max_workers)
+
     # Moves "attributes", "translations" and "child_messages" to the end of the dictionary for better readability.
     # Since Python 3.7, dictionaries are ordered by insertion order.
 
@@ -237,6 +329,65 @@ class Element:
 
         return element
 
+    # The compact binary format contains the same data as the dictionaries in the same order.
+    # Refer to the comments of "CompactWriter".
+
+    def serialize_to_bytes(self, compress = True):
+        writer = CompactWriter()
+        writer.write_byte(COMPACT_ELEMENT_TYPES.index(type(self)))
+        self._write_compact(writer)
+
+        return writer.to_bytes(compress = compress)
+
+    def _write_compact_header(self, writer: CompactWriter, container_guid):
+        writer.write_header(self.guid, self.creation_utc, self.parent_element_guid, container_guid)
+
+    def _write_compact_common_fields(self, writer: CompactWriter):
+        attributes = sorted(self.attributes.values(), key = lambda attribute: attribute.name)
+        writer.write_uint(len(attributes))
+
+        for attribute in attributes:
+            attribute._write_compact(writer, self.guid) # pylint: disable = protected-access
+
+        translations = sorted(self.translations.values(), key = lambda translation: translation.language_str)
+        writer.write_uint(len(translations))
+
+        for translation in translations:
+            translation._write_compact(writer, self.guid) # pylint: disable = protected-access
+
+    def _write_compact(self, writer: CompactWriter, container_guid = None):
+        self._write_compact_header(writer, container_guid)
+        self._write_compact_common_fields(writer)
+
+    @staticmethod
+    def _read_compact_header(reader: CompactReader, container_guid):
+        ''' Returns a tuple of "guid", "creation_utc" and "parent_element_guid". '''
+
+        return reader.read_header(container_guid)
+
+    @staticmethod
+    def _read_compact_common_fields(element, reader: CompactReader, parent_element_guid):
+        element.parent_element_guid = parent_element_guid
+
+        for _ in range(reader.read_uint()):
+            attribute = Attribute._read_compact(reader, element.guid) # pylint: disable = protected-access
+            attribute.parent_element = element
+            element.attributes[attribute.name] = attribute
+
+        for _ in range(reader.read_uint()):
+            translation = Translation._read_compact(reader, element.guid) # pylint: disable = protected-access
+            translation.parent_element = element
+            element.translations[translation.language] = translation
+
+        return element
+
+    @staticmethod
+    def _read_compact(reader: CompactReader, container_guid = None):
+        guid, creation_utc, parent_element_guid = Element._read_compact_header(reader, container_guid)
+        element = Element(guid = guid, creation_utc = creation_utc)
+
+        return Element._read_compact_common_fields(element, reader, parent_element_guid)
+
 class Message(Element):
     def __init__(
         self,
@@ -263,6 +414,11 @@ class Message(Element):
         # Comments: SH77 langtree-related Comments.json
         self.token_count: int | None = None
 
+        # Optional, nullable, not serialized:
+        # The index of this message in the parent's "child_messages".
+        # Set when the message is added to the list and validated before use, so a stale value only costs a search.
+        self.sibling_index: int | None = None
+
         # Required, nullable (but not encouraged), can be empty:
         self.child_messages: list[Message] = []
         # The items are loosely expected to be ordered by "creation_utc".
@@ -285,13 +441,35 @@ class Message(Element):
         child_message.parent_element = self
 
         child_message.client = self.client
+        child_message.async_client = self.async_client
         child_message.chat_settings = self.chat_settings
         child_message.timeout = self.timeout
 
+        child_message.sibling_index = len(self.child_messages)
         self.child_messages.append(child_message)
 
         return child_message
 
+    def remove_child_message(self, child_message: Message):
+        ''' Raises an error if the message is not a child of this message. '''
+
+        index = child_message.get_sibling_index()
+
+        if index is None or child_message.parent_element is not self:
+            raise perrors.ArgumentError("The message is not a child of this message.")
+
+        del self.child_messages[index]
+
+        # Only the younger siblings are shifted.
+        for younger_index in range(index, len(self.child_messages)):
+            self.child_messages[younger_index].sibling_index = younger_index
+
+        # The removed message becomes the root element of its own tree.
+        # Otherwise, it would still report the old parent and get_path_from_root would walk through it.
+        child_message.parent_element_guid = None
+        child_message.parent_element = None
+        child_message.sibling_index = None
+
     def generate_child_message_with_messages(
         self,
         messages,
@@ -323,7 +501,7 @@ class Message(Element):
         ''' Consider using "generate_sibling_message_with_context_builder" instead. '''
 
         return self.generate_child_message_with_messages(
-            context_builder.build(self),
+            context_builder.build(self).messages,
 
             client = client,
             chat_settings = chat_settings,
@@ -424,7 +602,7 @@ class Message(Element):
         timeout = None):
 
         return self.start_generating_message_with_messages(
-            context_builder.build(self),
+            context_builder.build(self).messages,
 
             client = client,
             chat_settings = chat_settings,
@@ -443,13 +621,161 @@ class Message(Element):
             chat_settings = chat_settings,
             timeout = timeout)
 
+    # Asynchronous versions of the methods above.
+    # With these methods, one event loop can drive many conversation branches concurrently.
+    # The streams returned by "start_generating_*_async" must be iterated with "async for".
+
+    async def generate_child_message_with_messages_async(
+        self,
+        messages,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        response = await popenai.create_chat_completions_with_settings_async(
+            settings = self._get_chat_settings(chat_settings),
+            messages = messages,
+            client = self._get_async_client(async_client),
+            timeout = self._get_response_timeout(timeout))
+
+        content = popenai.extract_first_message(response)
+
+        return self.create_child_message(
+            user_role = popenai.Role.ASSISTANT,
+            content = content)
+
+    async def generate_child_message_with_context_builder_async(
+        self,
+        context_builder: ContextBuilder,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        return await self.generate_child_message_with_messages_async(
+            context_builder.build(self).messages,
+
+            async_client = async_client,
+            chat_settings = chat_settings,
+            timeout = timeout)
+
+    async def generate_child_message_async(
+        self,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        return await self.generate_child_message_with_context_builder_async(
+            context_builder = get_default_context_builder(),
+
+            async_client = async_client,
+            chat_settings = chat_settings,
+            timeout = timeout)
+
+    async def generate_sibling_message_with_messages_async(
+        self,
+        messages,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        if self.parent_element:
+            return await typing.cast(Message, self.parent_element).generate_child_message_with_messages_async(messages, async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+        else:
+            return await self.generate_child_message_with_messages_async(messages, async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+    async def generate_sibling_message_with_context_builder_async(
+        self,
+        context_builder: ContextBuilder,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        if self.parent_element:
+            return await typing.cast(Message, self.parent_element).generate_child_message_with_context_builder_async(context_builder, async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+        else:
+            return await self.generate_child_message_with_context_builder_async(context_builder, async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+    async def generate_sibling_message_async(
+        self,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        if self.parent_element:
+            return await typing.cast(Message, self.parent_element).generate_child_message_async(async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+        else:
+            return await self.generate_child_message_async(async_client = async_client, chat_settings = chat_settings, timeout = timeout)
+
+    async def start_generating_message_with_messages_async(
+        self,
+        messages,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        return await popenai.create_chat_completions_with_settings_async(
+            settings = self._get_chat_settings(chat_settings),
+            messages = messages,
+            client = self._get_async_client(async_client),
+            stream_override = True,
+            timeout = self._get_chunk_timeout(timeout)) # Timeout for chunks.
+
+    async def start_generating_message_with_context_builder_async(
+        self,
+        context_builder: ContextBuilder,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        return await self.start_generating_message_with_messages_async(
+            context_builder.build(self).messages,
+
+            async_client = async_client,
+            chat_settings = chat_settings,
+            timeout = timeout)
+
+    async def start_generating_message_async(
+        self,
+        async_client: openai.AsyncOpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        return await self.start_generating_message_with_context_builder_async(
+            context_builder = get_default_context_builder(),
+
+            async_client = async_client,
+            chat_settings = chat_settings,
+            timeout = timeout)
+
+    def get_sibling_index(self):
+        ''' Returns None if the message is the root element. '''
+
+        if not self.parent_element:
+            return None
+
+        siblings = typing.cast(Message, self.parent_element).child_messages
+
+        # "child_messages" is a public list and may have been modified directly.
+        # If the cached index doesnt point to this message, we fall back to the linear search and update the cache.
+
+        index = self.sibling_index
+
+        if index is None or index >= len(siblings) or siblings[index] is not self:
+            index = siblings.index(self)
+            self.sibling_index = index
+
+        return index
+
     def get_previous_message(self):
         ''' Assumes child messages at each level are ordered by "creation_utc". '''
 
         if self.parent_element:
             parent_element = typing.cast(Message, self.parent_element)
 
-            index = parent_element.child_messages.index(self)
+            index = typing.cast(int, self.get_sibling_index())
 
             if index >= 1:
                 return parent_element.child_messages[index - 1]
@@ -466,7 +792,7 @@ class Message(Element):
             if self.parent_element:
                 parent_element = typing.cast(Message, self.parent_element)
 
-                index = parent_element.child_messages.index(self)
+                index = typing.cast(int, self.get_sibling_index())
 
                 if index + 1 < len(parent_element.child_messages):
                     return parent_element.child_messages[index + 1]
@@ -485,6 +811,47 @@ class Message(Element):
         else:
             return _get_child() or _get_sibling()
 
+    def get_path_from_root(self):
+        ''' Returns a list of messages from the root element to this message. '''
+
+        path = []
+
+        message = self
+
+        while message:
+            path.append(message)
+            message = typing.cast(Message | None, message.parent_element)
+
+        path.reverse()
+
+        return path
+
+    # The following methods yield this message and all its descendants.
+    # They dont use recursion, which could hit Python's recursion limit in a deep conversation.
+
+    def iterate_depth_first(self):
+        ''' Yields messages in pre-order; each message comes before its child messages. '''
+
+        stack: list[Message] = [self]
+
+        while stack:
+            message = stack.pop()
+            yield message
+
+            # Reversed so that the oldest child message is popped first.
+            stack.extend(reversed(message.child_messages))
+
+    def iterate_breadth_first(self):
+        ''' Yields messages level by level. '''
+
+        queue: collections.deque[Message] = collections.deque([self])
+
+        while queue:
+            message = queue.popleft()
+            yield message
+
+            queue.extend(message.child_messages)
+
     def serialize_to_dict(self):
         dictionary = {}
 
@@ -531,10 +898,51 @@ class Message(Element):
                 # child_message.parent_element_guid = message.guid
                 child_message.parent_element = message
 
+                child_message.sibling_index = len(message.child_messages)
                 message.child_messages.append(child_message)
 
         return message
 
+    def _write_compact(self, writer: CompactWriter, container_guid = None):
+        self._write_compact_header(writer, container_guid)
+
+        writer.write_optional_str(self.user_name)
+        writer.write_str(self.user_role.value)
+        writer.write_optional_str(self.content)
+
+        self._write_compact_common_fields(writer)
+
+        child_messages = sorted(self.child_messages, key = lambda child_message: child_message.creation_utc)
+        writer.write_uint(len(child_messages))
+
+        for child_message in child_messages:
+            child_message._write_compact(writer, self.guid) # pylint: disable = protected-access
+
+    @staticmethod
+    def _read_compact(reader: CompactReader, container_guid = None):
+        guid, creation_utc, parent_element_guid = Element._read_compact_header(reader, container_guid)
+        user_name = reader.read_optional_str()
+
+        message = Message(
+            user_role = popenai.Role(reader.read_str()),
+            content = reader.read_optional_str(),
+
+            guid = guid,
+            creation_utc = creation_utc)
+
+        message.user_name = user_name
+
+        Element._read_compact_common_fields(message, reader, parent_element_guid)
+
+        for _ in range(reader.read_uint()):
+            child_message = Message._read_compact(reader, message.guid)
+            child_message.parent_element = message
+
+            child_message.sibling_index = len(message.child_messages)
+            message.child_messages.append(child_message)
+
+        return message
+
 class Attribute(Element):
     def __init__(
         self,
@@ -586,6 +994,32 @@ class Attribute(Element):
 
         return attribute
 
+    def _write_compact(self, writer: CompactWriter, container_guid = None):
+        self._write_compact_header(writer, container_guid)
+
+        writer.write_str(self.name)
+        # "value" is usually a string, but anything that the dictionary version could hold must survive.
+        writer.write_optional_str(self.value if self.value is None or isinstance(self.value, str) else None)
+        writer.write_optional_str(None if self.value is None or isinstance(self.value, str) else json.dumps(self.value, ensure_ascii = False))
+
+        self._write_compact_common_fields(writer)
+
+    @staticmethod
+    def _read_compact(reader: CompactReader, container_guid = None):
+        guid, creation_utc, parent_element_guid = Element._read_compact_header(reader, container_guid)
+        name = reader.read_str()
+        value = reader.read_optional_str()
+        json_value = reader.read_optional_str()
+
+        attribute = Attribute(
+            name = name,
+            value = json.loads(json_value) if json_value is not None else value,
+
+            guid = guid,
+            creation_utc = creation_utc)
+
+        return Element._read_compact_common_fields(attribute, reader, parent_element_guid)
+
 class Translation(Element):
     def __init__(
         self,
@@ -629,14 +1063,20 @@ class Translation(Element):
         return dictionary
 
     @staticmethod
-    def deserialize_from_dict(dictionary):
-        language = ptype.str_to_enum_by_str_value(dictionary["language"], popenai.Language, ignore_case = True)
+    def _str_to_language(str_):
+        ''' Returns the string as-is if it's not a value of popenai.Language. '''
+
+        language = ptype.try_str_to_enum_by_str_value(str_, popenai.Language, ignore_case = True)
 
         if language is None:
-            language = dictionary["language"]
+            return str_
 
+        return language
+
+    @staticmethod
+    def deserialize_from_dict(dictionary):
         translation = Translation(
-            language = language,
+            language = Translation._str_to_language(dictionary["language"]),
             content = dictionary["content"],
 
             guid = uuid.UUID(dictionary["guid"]),
@@ -646,6 +1086,338 @@ class Translation(Element):
 
         return translation
 
+    def _write_compact(self, writer: CompactWriter, container_guid = None):
+        self._write_compact_header(writer, container_guid)
+
+        writer.write_str(self.language_str)
+        writer.write_optional_str(self.content)
+
+        self._write_compact_common_fields(writer)
+
+    @staticmethod
+    def _read_compact(reader: CompactReader, container_guid = None):
+        guid, creation_utc, parent_element_guid = Element._read_compact_header(reader, container_guid)
+
+        translation = Translation(
+            language = Translation._str_to_language(reader.read_str()),
+            content = reader.read_optional_str(),
+
+            guid = guid,
+            creation_utc = creation_utc)
+
+        return Element._read_compact_common_fields(translation, reader, parent_element_guid)
+
+# ------------------------------------------------------------------------------
+#     Compact binary serialization
+# ------------------------------------------------------------------------------
+
+# In the JSON representation, each GUID is a 36-char string and each "creation_utc" is a 32-char ISO 8601 string,
+#     and they are parsed back with uuid.UUID and datetime.fromisoformat for every element.
+# For large trees, the following format is smaller and faster to load:
+#     * GUIDs are stored as their 16 bytes
+#     * Timestamps are stored as 8-byte signed integers of microseconds since the Unix epoch (UTC)
+#     * Strings are stored as UTF-8 bytes preceded by their lengths
+#     * Lengths and counts are stored as unsigned LEB128 integers, which usually take 1 byte
+#     * The body may be compressed with zlib
+
+# The file starts with the signature, the version and the flags, followed by the type of the root element.
+# Then, each element is written like its dictionary: the common fields, the type-specific fields, attributes, translations and child messages.
+# Optional values are preceded by a byte that indicates their presence; for strings, the length is incremented by 1 instead and 0 means None.
+
+# "client", "async_client", "chat_settings", "timeout", "token_count" and "sibling_index" are not serialized as they arent in the dictionaries.
+
+COMPACT_FORMAT_SIGNATURE = b"LTRE"
+COMPACT_FORMAT_VERSION = 1
+
+COMPACT_FORMAT_FLAG_COMPRESSED = 1
+
+# The index of each type is stored; the order must not change.
+COMPACT_ELEMENT_TYPES: list[type] = [Element, Message, Attribute, Translation]
+
+UNIX_EPOCH_UTC = datetime.datetime(1970, 1, 1, tzinfo = datetime.UTC)
+
+def utc_to_unix_microseconds(utc: datetime.datetime):
+    # Integer division of timedelta objects is exact; floating-point timestamps could lose microseconds.
+    return (utc - UNIX_EPOCH_UTC) // datetime.timedelta(microseconds = 1)
+
+# The GUID, the timestamp and the kind of the parent element's GUID are read at once.
+HEADER_STRUCT = struct.Struct("<16sqB")
+
+# Kinds of "parent_element_guid":
+#     0: None
+#     1: The GUID follows
+#     2: Same as the GUID of the element that contains this one in the file, which is the case for all but the root element
+PARENT_ELEMENT_GUID_NONE = 0
+PARENT_ELEMENT_GUID_INCLUDED = 1
+PARENT_ELEMENT_GUID_CONTAINER = 2
+
+class CompactWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write_byte(self, value):
+        self.buffer.append(value)
+
+    def write_uint(self, value):
+        if value < 0:
+            raise perrors.ArgumentError("Negative values are not supported.")
+
+        while value >= 0x80:
+            self.buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+
+        self.buffer.append(value)
+
+    def write_str(self, str_):
+        bytes_ = str_.encode("utf-8")
+        self.write_uint(len(bytes_))
+        self.buffer += bytes_
+
+    def write_optional_str(self, str_):
+        if str_ is None:
+            self.write_uint(0)
+
+        else:
+            bytes_ = str_.encode("utf-8")
+            self.write_uint(len(bytes_) + 1)
+            self.buffer += bytes_
+
+    def write_header(self, guid: uuid.UUID, utc: datetime.datetime, parent_element_guid: uuid.UUID | None, container_guid: uuid.UUID | None):
+        microseconds = utc_to_unix_microseconds(utc)
+
+        if parent_element_guid is None:
+            self.buffer += HEADER_STRUCT.pack(guid.bytes, microseconds, PARENT_ELEMENT_GUID_NONE)
+
+        elif parent_element_guid == container_guid:
+            self.buffer += HEADER_STRUCT.pack(guid.bytes, microseconds, PARENT_ELEMENT_GUID_CONTAINER)
+
+        else:
+            self.buffer += HEADER_STRUCT.pack(guid.bytes, microseconds, PARENT_ELEMENT_GUID_INCLUDED)
+            self.buffer += parent_element_guid.bytes
+
+    def to_bytes(self, compress = True):
+        flags = COMPACT_FORMAT_FLAG_COMPRESSED if compress else 0
+        body = zlib.compress(self.buffer) if compress else bytes(self.buffer)
+
+        return COMPACT_FORMAT_SIGNATURE + bytes([COMPACT_FORMAT_VERSION, flags]) + body
+
+class CompactReader:
+    def __init__(self, bytes_):
+        header_len = len(COMPACT_FORMAT_SIGNATURE) + 2
+
+        if len(bytes_) < header_len or not bytes_.startswith(COMPACT_FORMAT_SIGNATURE):
+            raise perrors.FormatError("Not a compact langtree file.")
+
+        version = bytes_[len(COMPACT_FORMAT_SIGNATURE)]
+
+        if version != COMPACT_FORMAT_VERSION:
+            raise perrors.NotSupportedError(f"Unsupported compact format version: {version}")
+
+        flags = bytes_[len(COMPACT_FORMAT_SIGNATURE) + 1]
+
+        if flags & COMPACT_FORMAT_FLAG_COMPRESSED:
+            self.buffer = zlib.decompress(bytes_[header_len :])
+
+        else:
+            self.buffer = bytes(bytes_[header_len :])
+
+        self.position = 0
+
+    def read_bytes(self, length):
+        end = self.position + length
+
+        if end > len(self.buffer):
+            raise perrors.FormatError("Unexpected end of data.")
+
+        bytes_ = self.buffer[self.position : end]
+        self.position = end
+
+        return bytes_
+
+    def read_byte(self):
+        if self.position >= len(self.buffer):
+            raise perrors.FormatError("Unexpected end of data.")
+
+        value = self.buffer[self.position]
+        self.position += 1
+
+        return value
+
+    def read_uint(self):
+        # Most lengths and counts are less than 128 and take 1 byte.
+        byte = self.read_byte()
+
+        if byte < 0x80:
+            return byte
+
+        value = byte & 0x7F
+        shift = 7
+
+        while True:
+            byte = self.read_byte()
+            value |= (byte & 0x7F) << shift
+
+            if byte < 0x80:
+                return value
+
+            shift += 7
+
+    def read_str(self):
+        return self.read_bytes(self.read_uint()).decode("utf-8")
+
+    def read_optional_str(self):
+        length = self.read_uint()
+
+        if length == 0:
+            return None
+
+        return self.read_bytes(length - 1).decode("utf-8")
+
+    def read_header(self, container_guid: uuid.UUID | None):
+        ''' Returns a tuple of the GUID, the UTC and the parent element's GUID (or None). '''
+
+        guid_bytes, microseconds, parent_element_guid_kind = HEADER_STRUCT.unpack(self.read_bytes(HEADER_STRUCT.size))
+
+        guid = uuid.UUID(bytes = guid_bytes)
+        utc = UNIX_EPOCH_UTC + datetime.timedelta(microseconds = microseconds)
+
+        if parent_element_guid_kind == PARENT_ELEMENT_GUID_NONE:
+            parent_element_guid = None
+
+        elif parent_element_guid_kind == PARENT_ELEMENT_GUID_CONTAINER and container_guid is not None:
+            # The same instance is shared.
+            parent_element_guid = container_guid
+
+        elif parent_element_guid_kind == PARENT_ELEMENT_GUID_INCLUDED:
+            parent_element_guid = uuid.UUID(bytes = self.read_bytes(16))
+
+        else:
+            raise perrors.FormatError(f"Invalid kind of parent element GUID: {parent_element_guid_kind}")
+
+        return guid, utc, parent_element_guid
+
+def deserialize_from_bytes(bytes_):
+    ''' Returns an instance of the type that "Element.serialize_to_bytes" was called on. '''
+
+    reader = CompactReader(bytes_)
+    type_index = reader.read_byte()
+
+    if type_index >= len(COMPACT_ELEMENT_TYPES):
+        raise perrors.FormatError(f"Unknown element type: {type_index}")
+
+    element = COMPACT_ELEMENT_TYPES[type_index]._read_compact(reader) # type: ignore # pylint: disable = protected-access
+
+    if reader.position != len(reader.buffer):
+        raise perrors.FormatError("Unexpected data after the root element.")
+
+    return element
+
+# ------------------------------------------------------------------------------
+#     Concurrent generation
+# ------------------------------------------------------------------------------
+
+# Each call of "generate_attribute_with_prompt" or "generate_translation_with_prompt" waits for one response.
+# When we translate a message into many languages or generate attributes for many elements,
+#     the requests are independent of one another and the waiting time can overlap.
+
+# The requests are I/O-bound; a bounded thread pool is just enough and works with the synchronous client.
+# openai.OpenAI is based on httpx.Client, which is thread-safe.
+
+# Each job calls the existing methods, which:
+#     * Take the per-request timeout from "_get_response_timeout"
+#     * Attach the attribute/translation to the element as soon as its response is received
+# Assigning a value to a dictionary key is atomic in CPython and the jobs dont share keys unless the caller makes them do so.
+
+DEFAULT_MAX_GENERATION_WORKERS = 8
+
+class GenerationTarget(enum.Enum):
+    ATTRIBUTE = "attribute"
+    TRANSLATION = "translation"
+
+class GenerationJob:
+    def __init__(
+        self,
+
+        element: Element,
+        target: GenerationTarget,
+        # The name of the attribute or the language of the translation.
+        key,
+        prompt):
+
+        self.element = element
+        self.target = target
+        self.key = key
+        self.prompt = prompt
+
+        # Set when the job has been completed:
+        self.result: Attribute | Translation | None = None
+        self.exception: Exception | None = None
+
+    @property
+    def is_successful(self):
+        return self.result is not None
+
+    def run(
+        self,
+        client: openai.OpenAI | None = None,
+        chat_settings: popenai.ChatSettings | None = None,
+        timeout = None):
+
+        if self.target == GenerationTarget.ATTRIBUTE:
+            self.result = self.element.generate_attribute_with_prompt(self.key, self.prompt, client = client, chat_settings = chat_settings, timeout = timeout)
+
+        elif self.target == GenerationTarget.TRANSLATION:
+            self.result = self.element.generate_translation_with_prompt(self.key, self.prompt, client = client, chat_settings = chat_settings, timeout = timeout)
+
+        else:
+            raise perrors.InvalidDataError(f"Unknown generation target: {self.target}")
+
+        return self.result
+
+def run_generation_jobs(
+    jobs: list[GenerationJob],
+
+    client: openai.OpenAI | None = None,
+    chat_settings: popenai.ChatSettings | None = None,
+    timeout = None,
+    max_workers = None,
+    on_completed: typing.Callable[[GenerationJob], None] | None = None):
+
+    '''
+        Runs the jobs concurrently and returns them in the order they were given.
+        A failed job doesnt stop the others; its exception is set to "exception".
+        "on_completed" is called in the calling thread as each job completes.
+    '''
+
+    if not jobs:
+        return jobs
+
+    # The arguments are left unchanged; elements with their own clients/settings still use them.
+
+    popenai.preload_default_client(client or job.element.client for job in jobs)
+
+    # Like the default client, the default chat settings are lazy-loaded and are loaded here before the worker threads need them.
+    if chat_settings is None and any(job.element.chat_settings is None for job in jobs):
+        popenai.get_default_chat_settings()
+
+    def _run(job: GenerationJob):
+        try:
+            job.run(client = client, chat_settings = chat_settings, timeout = timeout)
+
+        except Exception as exception: # pylint: disable = broad-except
+            job.exception = exception
+
+        return job
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(jobs), max_workers or DEFAULT_MAX_GENERATION_WORKERS)) as executor:
+        futures = [executor.submit(_run, job) for job in jobs]
+
+        for future in concurrent.futures.as_completed(futures):
+            if on_completed:
+                on_completed(future.result())
+
+    return jobs
+
 # Episodic comments available: SH77 langtree-related Comments.json
 
 class ContextBuilder:
@@ -661,7 +1433,13 @@ class ContextBuilder:
         max_total_tokens_of_user_messages = 4096,
 
         max_number_of_assistant_messages = 3,
-        max_total_tokens_of_assistant_messages = 4096):
+        max_total_tokens_of_assistant_messages = 4096,
+
+        # The budget for all the messages, which is usually the model's context window minus the tokens reserved for the response.
+        max_total_tokens = None, # No limit.
+
+        # If True, system messages are selected before the others regardless of their age.
+        prioritize_system_messages = False):
 
         self.max_number_of_system_messages = max_number_of_system_messages
         self.max_total_tokens_of_system_messages = max_total_tokens_of_system_messages
@@ -672,6 +1450,9 @@ class ContextBuilder:
         self.max_number_of_assistant_messages = max_number_of_assistant_messages
         self.max_total_tokens_of_assistant_messages = max_total_tokens_of_assistant_messages
 
+        self.max_total_tokens = max_total_tokens
+        self.prioritize_system_messages = prioritize_system_messages
+
         # Optional:
         self.token_counter = None
 
@@ -681,10 +1462,9 @@ class ContextBuilder:
             token_counter,
             self.token_counter)
 
-    def build(
-        self,
-        message: Message,
-        token_counter: popenai.TokenCounter | None = None) -> Context:
+    @staticmethod
+    def collect_candidates(message: Message):
+        ''' Returns the messages "build" selects from, which arent sorted. '''
 
         # All younger siblings and the root element.
         elements = []
@@ -715,10 +1495,50 @@ class ContextBuilder:
 
                 break
 
-        # No matter how the tree structure has been built, no child is older than its parent.
-        elements.sort(key = lambda element: element.creation_utc, reverse = True)
+        return elements
+
+    def build(
+        self,
+        message: Message,
+        token_counter: popenai.TokenCounter | None = None) -> Context:
+
+        return self.build_from_candidates(ContextBuilder.collect_candidates(message), token_counter = token_counter)
+
+    @staticmethod
+    def _get_role_index(user_role: popenai.Role):
+        if user_role == popenai.Role.SYSTEM:
+            return 0
+
+        elif user_role == popenai.Role.USER:
+            return 1
+
+        elif user_role == popenai.Role.ASSISTANT:
+            return 2
+
+        else:
+            # The data's origin may be unclear here.
+            # We couldnt always call this an invalid operation.
+            raise perrors.InvalidDataError(f"Unknown user role: {user_role}")
+
+    def build_from_candidates(
+        self,
+        elements: list[Message],
+        token_counter: popenai.TokenCounter | None = None) -> Context:
+
+        ''' Selects messages from "elements", which dont have to be sorted. '''
 
-        # Reducing the "if" statements:
+        # Selection:
+        #     * Candidates are popped from a heap, newest first (after system messages if "prioritize_system_messages" is True)
+        #     * The token count of a candidate is computed (only if it hasnt been) when it's popped
+        #     * A candidate that would exceed its role's limits is skipped as the original implementation did
+        #     * A candidate that doesnt fit in the remaining total budget is skipped too, so smaller, older candidates that still fit are selected
+        #     * The loop ends when every role has reached its max number or the total budget is used up
+
+        # With the heap, building it is O(n) and each selected/skipped message costs O(log n).
+        # Tokenizing is far more expensive than the heap operations, so candidates are counted only when they are popped
+        #     and the counts are kept in "token_count" for the next builds.
+        # When the per-role max numbers end the selection, most of the candidates are never touched;
+        #     when only the total budget does, the remaining candidates are still counted to find the ones that fit.
 
         max_numbers = [self.max_number_of_system_messages, self.max_number_of_user_messages, self.max_number_of_assistant_messages]
         numbers = [0, 0, 0]
@@ -726,35 +1546,62 @@ class ContextBuilder:
         max_total_tokens = [self.max_total_tokens_of_system_messages, self.max_total_tokens_of_user_messages, self.max_total_tokens_of_assistant_messages]
         total_tokens = [0, 0, 0]
 
-        elements_to_include = []
+        remaining_tokens = self.max_total_tokens
 
         # We can just update "token_counter", but I like to keep arguments unchanged.
         token_counter_to_use = self._get_token_counter(token_counter)
 
-        for element in elements:
-            if element.user_role == popenai.Role.SYSTEM:
-                index = 0
+        heap = []
 
-            elif element.user_role == popenai.Role.USER:
-                index = 1
+        for order, element in enumerate(elements):
+            index = ContextBuilder._get_role_index(element.user_role)
 
-            elif element.user_role == popenai.Role.ASSISTANT:
-                index = 2
+            # Roles whose max number is 0 can never be selected.
+            if max_numbers[index] == 0:
+                continue
 
-            else:
-                # The data's origin may be unclear here.
-                # We couldnt always call this an invalid operation.
-                raise perrors.InvalidDataError(f"Unknown user role: {element.user_role}")
+            priority = 0 if self.prioritize_system_messages and index == 0 else 1
+
+            # Newer messages come first.
+            # The integer microseconds order exactly like "creation_utc"; a float timestamp would lose precision for later dates.
+            # "order" keeps the sort stable, which is how the original implementation with "sort" worked.
+            heap.append((priority, -utc_to_unix_microseconds(element.creation_utc), order, index, element))
+
+        heapq.heapify(heap)
+
+        elements_to_include = []
+
+        # Roles that can still take messages.
+        open_role_count = sum(1 for index in range(3) if max_numbers[index] != 0)
+
+        while heap and open_role_count > 0:
+            _, _, _, index, element = heapq.heappop(heap)
+
+            if max_numbers[index] is not None and numbers[index] >= max_numbers[index]:
+                continue
 
             if element.token_count is None:
                 element.token_count = token_counter_to_use.count(element.content)
 
-            if max_numbers[index] is None or numbers[index] < max_numbers[index]:
-                if max_total_tokens[index] is None or total_tokens[index] + element.token_count <= max_total_tokens[index]:
-                    elements_to_include.append(element)
+            if max_total_tokens[index] is not None and total_tokens[index] + element.token_count > max_total_tokens[index]:
+                continue
+
+            if remaining_tokens is not None and element.token_count > remaining_tokens:
+                continue
+
+            elements_to_include.append(element)
+
+            numbers[index] += 1
+            total_tokens[index] += element.token_count
+
+            if remaining_tokens is not None:
+                remaining_tokens -= element.token_count
+
+                if remaining_tokens <= 0:
+                    break
 
-                    numbers[index] += 1
-                    total_tokens[index] += element.token_count
+            if max_numbers[index] is not None and numbers[index] >= max_numbers[index]:
+                open_role_count -= 1
 
         elements_to_include.sort(key = lambda element: element.creation_utc)
 
@@ -55,12 +55,15 @@ def log(str_: str | None, indents = "", end = "\n", flush_ = False):
     if flush_:
         flush()
 
-def log_lines(str_: list[str] | None, indents = "", trailing = "", end = "\n", flush_ = False):
+# "line_part_offsets" works like the one of pyddle_console.print_lines.
+
+def log_lines(str_: list[str] | None, indents = "", trailing = "", end = "\n", flush_ = False, line_part_offsets: list[tuple[int, int]] | None = None):
     if str_:
-        for line in str_:
-            parts = pstring.split_line_into_parts(line)
+        if line_part_offsets is None:
+            line_part_offsets = [pstring.get_line_part_offsets(line) for line in str_]
 
-            if parts[1]:
+        for line, (visible_content_start, visible_content_end) in zip(str_, line_part_offsets):
+            if visible_content_start < visible_content_end:
                 # Using the original string of the line.
                 pending_logs.append(f"{indents}{line}{trailing}{end}")
 
@@ -1,22 +1,39 @@
 ﻿# Created: 2024-03-26
 # Sugar-coating classes and methods for OpenAI's API.
 
+import asyncio
 import base64
+import collections
+import concurrent.futures
+import datetime
 import enum
+import hashlib
+import importlib.util
+import io
+import json
 import mimetypes
 import os
-import requests
+import random
+import shutil
+import tempfile
+import threading
 import tiktoken
+import tiktoken.model
+import time
+import typing
+import wave
 
 import httpx
 import openai
 import openai.types.chat
 
 import pyddle_collections as pcollections
+import pyddle_datetime as pdatetime
 import pyddle_errors as perrors
 import pyddle_file_system as pfs
 import pyddle_kvs as pkvs
 import pyddle_path as ppath
+import pyddle_string as pstring
 import pyddle_utility as putility
 import pyddle_web as pweb
 
@@ -121,15 +138,91 @@ class Model(enum.Enum):
 # https://github.com/openai/tiktoken
 # https://github.com/openai/openai-cookbook/blob/main/examples/How_to_count_tokens_with_tiktoken.ipynb
 
+# Loading an encoding reads (and, the first time, downloads) a BPE file and builds a large table, which may take a noticeable moment.
+# If it happens lazily, it happens right in the middle of an interactive request.
+
+# Multiple models share the same encoding (for example, GPT-4 and GPT-4 Turbo both use "cl100k_base").
+# The registry keeps one tiktoken.Encoding per encoding name, which is thread-safe once loaded,
+#     and "prewarm_encodings" can load them in the background when a program starts.
+
+# Lazy loading:
+__encodings: dict[str, tiktoken.Encoding] = {} # pylint: disable = invalid-name
+__encoding_load_times: dict[str, float] = {} # pylint: disable = invalid-name
+
+# Held while an encoding is loaded so that 2 threads dont build the same table.
+__encodings_lock = threading.Lock() # pylint: disable = invalid-name
+
+def get_encoding_name(model: Model):
+    return tiktoken.model.encoding_name_for_model(model.value)
+
+def get_encoding_by_name(encoding_name):
+    # Already-loaded encodings are returned without the lock.
+    encoding = __encodings.get(encoding_name)
+
+    if encoding is None:
+        with __encodings_lock:
+            encoding = __encodings.get(encoding_name)
+
+            if encoding is None:
+                start = time.perf_counter()
+                encoding = tiktoken.get_encoding(encoding_name)
+                __encoding_load_times[encoding_name] = time.perf_counter() - start
+
+                __encodings[encoding_name] = encoding
+
+    return encoding
+
+def get_encoding(model: Model):
+    return get_encoding_by_name(get_encoding_name(model))
+
+def get_encoding_load_times():
+    ''' Returns a dictionary of encoding names and the seconds it took to load them. '''
+
+    with __encodings_lock:
+        return dict(__encoding_load_times)
+
+def prewarm_encodings(models: list[Model] | None = None, background = True):
+    '''
+        Loads the encodings of "models" (or that of DEFAULT_GPT_MODEL) in advance.
+        If "background" is True, returns the started daemon thread; otherwise, returns None after loading them.
+    '''
+
+    encoding_names = list(dict.fromkeys(get_encoding_name(model) for model in (models or [DEFAULT_GPT_MODEL])))
+
+    def _load():
+        for encoding_name in encoding_names:
+            get_encoding_by_name(encoding_name)
+
+    if background:
+        # A daemon thread doesnt keep the program running if it exits before loading is complete.
+        thread = threading.Thread(target = _load, daemon = True)
+        thread.start()
+        return thread
+
+    _load()
+    return None
+
+# Counting tokens costs as much as encoding the whole string, and the same contents are often counted again and again
+#     (for example, when pyddle_langtree.ContextBuilder builds contexts from the same messages).
+# TokenCounter remembers the counts of recently counted strings.
+# The keys are hashes of the strings so that the cache doesnt keep long strings alive; hashing is much faster than encoding.
+
+DEFAULT_TOKEN_COUNT_CACHE_SIZE = 4096 # In entries.
+
 class TokenCounter:
-    def __init__(self, model: Model):
+    def __init__(self, model: Model, cache_size = DEFAULT_TOKEN_COUNT_CACHE_SIZE):
         self.model: Model = model
         self.__encoding: tiktoken.Encoding | None = None
 
+        # 0 or None disables the cache.
+        self.cache_size = cache_size
+        self.__cache: collections.OrderedDict[bytes, int] = collections.OrderedDict()
+        self.__cache_lock = threading.Lock()
+
     @property
     def encoding(self):
         if self.__encoding is None:
-            self.__encoding = tiktoken.encoding_for_model(self.model.value)
+            self.__encoding = get_encoding(self.model)
 
         return self.__encoding
 
@@ -138,10 +231,70 @@ class TokenCounter:
 
         return self.encoding.encode(str_)
 
+    @staticmethod
+    def _get_cache_key(str_):
+        return hashlib.blake2b(str_.encode("utf-8"), digest_size = 16).digest()
+
+    def _get_cached_count(self, key):
+        with self.__cache_lock:
+            count = self.__cache.get(key)
+
+            if count is not None:
+                self.__cache.move_to_end(key)
+
+            return count
+
+    def _cache_count(self, key, count):
+        with self.__cache_lock:
+            self.__cache[key] = count
+            self.__cache.move_to_end(key)
+
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last = False)
+
     def count(self, str_):
         ''' Returns the number of tokens. '''
 
-        return len(self.encode(str_))
+        if not self.cache_size:
+            return len(self.encode(str_))
+
+        key = TokenCounter._get_cache_key(str_)
+        count = self._get_cached_count(key)
+
+        if count is None:
+            count = len(self.encode(str_))
+            self._cache_count(key, count)
+
+        return count
+
+    def count_batch(self, strs: list[str], num_threads = None):
+        ''' Returns a list of the numbers of tokens. The strings that arent cached are encoded in parallel by tiktoken. '''
+
+        counts: list[int | None] = [None] * len(strs)
+
+        keys = [TokenCounter._get_cache_key(str_) for str_ in strs] if self.cache_size else None
+        indexes_to_encode = []
+
+        for index in range(len(strs)):
+            if keys:
+                counts[index] = self._get_cached_count(keys[index])
+
+            if counts[index] is None:
+                indexes_to_encode.append(index)
+
+        if indexes_to_encode:
+            # tiktoken releases the GIL while encoding, so its thread pool really runs in parallel.
+            # https://github.com/openai/tiktoken/blob/main/tiktoken/core.py
+            args = {} if num_threads is None else {"num_threads": num_threads}
+            encoded = self.encoding.encode_batch([strs[index] for index in indexes_to_encode], **args)
+
+            for index, tokens in zip(indexes_to_encode, encoded):
+                counts[index] = len(tokens)
+
+                if keys:
+                    self._cache_count(keys[index], len(tokens))
+
+        return typing.cast(list[int], counts)
 
     def encode_to_strs(self, str_):
         ''' Returns a list of tokens as decoded strings. OFTEN fails to decode CJK strings. '''
@@ -152,85 +305,145 @@ class TokenCounter:
         return [self.encoding.decode_single_token_bytes(token).decode("utf-8") for token in self.encode(str_)]
 
 # Lazy loading:
-__gpt_3_5_turbo_token_counter: TokenCounter | None = None # pylint: disable = invalid-name
+# One counter per model; the counters of models with the same encoding share it through the registry.
+__token_counters: dict[Model, TokenCounter] = {} # pylint: disable = invalid-name
 
-def get_gpt_3_5_turbo_token_counter():
-    global __gpt_3_5_turbo_token_counter # pylint: disable = global-statement
+def get_token_counter(model: Model):
+    token_counter = __token_counters.get(model)
 
-    if __gpt_3_5_turbo_token_counter is None:
-        __gpt_3_5_turbo_token_counter = TokenCounter(model = Model.GPT_3_5_TURBO)
+    if token_counter is None:
+        # Creating a TokenCounter is cheap; if 2 threads race, "setdefault" keeps only one of the instances.
+        token_counter = __token_counters.setdefault(model, TokenCounter(model = model))
 
-    return __gpt_3_5_turbo_token_counter
+    return token_counter
 
-# Lazy loading:
-__gpt_4_token_counter: TokenCounter | None = None # pylint: disable = invalid-name
+def get_gpt_3_5_turbo_token_counter():
+    return get_token_counter(Model.GPT_3_5_TURBO)
 
 def get_gpt_4_token_counter():
-    global __gpt_4_token_counter # pylint: disable = global-statement
+    return get_token_counter(Model.GPT_4)
 
-    if __gpt_4_token_counter is None:
-        __gpt_4_token_counter = TokenCounter(model = Model.GPT_4)
+def get_gpt_4_turbo_token_counter():
+    return get_token_counter(Model.GPT_4_TURBO)
 
-    return __gpt_4_token_counter
+# May be unnecessary.
+def get_gpt_4_vision_token_counter():
+    return get_token_counter(Model.GPT_4_VISION)
 
-# Lazy loading:
-__gpt_4_turbo_token_counter: TokenCounter | None = None # pylint: disable = invalid-name
+# The GPT models whose tokens can be counted.
+TOKEN_COUNTER_MODELS = [Model.GPT_3_5_TURBO, Model.GPT_4, Model.GPT_4_TURBO, Model.GPT_4_VISION]
 
-def get_gpt_4_turbo_token_counter():
-    global __gpt_4_turbo_token_counter # pylint: disable = global-statement
+def get_default_token_counter():
+    if DEFAULT_GPT_MODEL not in TOKEN_COUNTER_MODELS:
+        # We wouldnt always know who or what has modified the default model.
+        # We couldnt call this an invalid operation.
+        raise perrors.InvalidDataError(f"Unsupported model: {DEFAULT_GPT_MODEL}")
 
-    if __gpt_4_turbo_token_counter is None:
-        __gpt_4_turbo_token_counter = TokenCounter(model = Model.GPT_4_TURBO)
+    return get_token_counter(DEFAULT_GPT_MODEL)
 
-    return __gpt_4_turbo_token_counter
+# ------------------------------------------------------------------------------
+#     Clients
+# ------------------------------------------------------------------------------
 
-# Lazy loading:
-# May be unnecessary.
-__gpt_4_vision_token_counter: TokenCounter | None = None # pylint: disable = invalid-name
+# https://github.com/openai/openai-python/blob/main/src/openai/_client.py
 
-def get_gpt_4_vision_token_counter():
-    global __gpt_4_vision_token_counter # pylint: disable = global-statement
+# Each openai.OpenAI creates its own httpx.Client unless one is given, and the images used to be downloaded with a new connection each.
+# Sharing one connection pool lets the chat, audio and image endpoints and the image downloader reuse TCP/TLS connections instead of handshaking every time.
+# https://www.python-httpx.org/advanced/clients/
+# https://www.python-httpx.org/advanced/resource-limits/
+# https://github.com/openai/openai-python/blob/main/README.md#configuring-the-http-client
+
+# Closing a client that uses the shared pool (for example, with "with create_client() as client:") closes the pool as well.
+# Clients that need their own lifetime should be given their own "http_client".
 
-    if __gpt_4_vision_token_counter is None:
-        __gpt_4_vision_token_counter = TokenCounter(model = Model.GPT_4_VISION)
+DEFAULT_HTTP_MAX_CONNECTIONS = 32
+DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS = 16
+DEFAULT_HTTP_KEEPALIVE_EXPIRY = 60 # In seconds.
+
+def is_http2_available():
+    # HTTPX supports HTTP/2 only when the "h2" package is installed: pip install httpx[http2]
+    # https://www.python-httpx.org/http2/
+    return importlib.util.find_spec("h2") is not None
+
+def _create_http_client_args(max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout):
+    return {
+        "limits": httpx.Limits(max_connections = max_connections, max_keepalive_connections = max_keepalive_connections, keepalive_expiry = keepalive_expiry),
+        "http2": is_http2_available() if http2 is None else http2,
+        # Explained in pyddle_web.py.
+        # The OpenAI clients pass their own timeouts with each request; this one is for the downloads.
+        "timeout": timeout or httpx.Timeout(timeout = pweb.DEFAULT_TIMEOUT, read = DEFAULT_RESPONSE_TIMEOUT),
+        # The image URLs may redirect.
+        "follow_redirects": True
+    }
+
+def create_http_client(
+    max_connections = DEFAULT_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections = DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry = DEFAULT_HTTP_KEEPALIVE_EXPIRY,
+    http2 = None, # Enabled if available.
+    timeout = None):
 
-    return __gpt_4_vision_token_counter
+    return httpx.Client(**_create_http_client_args(max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout))
 
 # Lazy loading:
-__default_token_counter: TokenCounter | None = None # pylint: disable = invalid-name
+__default_http_client: httpx.Client | None = None # pylint: disable = invalid-name
 
-def get_default_token_counter():
-    global __default_token_counter # pylint: disable = global-statement
+def get_default_http_client():
+    global __default_http_client # pylint: disable = global-statement
 
-    if __default_token_counter is None:
-        if DEFAULT_GPT_MODEL == Model.GPT_3_5_TURBO:
-            __default_token_counter = get_gpt_3_5_turbo_token_counter()
+    if __default_http_client is None:
+        __default_http_client = create_http_client()
 
-        elif DEFAULT_GPT_MODEL == Model.GPT_4:
-            __default_token_counter = get_gpt_4_token_counter()
+    return __default_http_client
 
-        elif DEFAULT_GPT_MODEL == Model.GPT_4_TURBO:
-            __default_token_counter = get_gpt_4_turbo_token_counter()
+def create_async_http_client(
+    max_connections = DEFAULT_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections = DEFAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry = DEFAULT_HTTP_KEEPALIVE_EXPIRY,
+    http2 = None, # Enabled if available.
+    timeout = None):
 
-        elif DEFAULT_GPT_MODEL == Model.GPT_4_VISION:
-            __default_token_counter = get_gpt_4_vision_token_counter()
+    return httpx.AsyncClient(**_create_http_client_args(max_connections, max_keepalive_connections, keepalive_expiry, http2, timeout))
 
-        else:
-            # We wouldnt always know who or what has modified the default model.
-            # We couldnt call this an invalid operation.
-            raise perrors.InvalidDataError(f"Unsupported model: {DEFAULT_GPT_MODEL}")
+# An httpx.AsyncClient (and therefore an openai.AsyncOpenAI) is bound to the event loop it's first used in;
+#     its pooled connections cant be used after the loop has been closed.
+# Scripts may call asyncio.run more than once, so the default async clients are shared per running event loop.
+# The clients of closed loops are dropped whenever a client is created for a new loop.
+# A weak dictionary wouldnt be enough as the clients' connections may refer back to their loops.
 
-    return __default_token_counter
+# Outside a running event loop, a new client is returned every time as there's no loop to share it within.
 
-# ------------------------------------------------------------------------------
-#     Clients
-# ------------------------------------------------------------------------------
+def _get_running_loop_or_none():
+    try:
+        return asyncio.get_running_loop()
 
-# https://github.com/openai/openai-python/blob/main/src/openai/_client.py
+    except RuntimeError:
+        return None
+
+def _get_or_create_per_loop(clients: dict, create_func: typing.Callable[[], typing.Any]):
+    loop = _get_running_loop_or_none()
+
+    if loop is None:
+        return create_func()
+
+    client = clients.get(loop)
+
+    if client is None:
+        for closed_loop in [loop_ for loop_ in clients if loop_.is_closed()]:
+            del clients[closed_loop]
+
+        client = create_func()
+        clients[loop] = client
 
-def create_client(api_key = None, organization = None, project = None, base_url = None, timeout = None):
-    ''' If the arguments are falsy and cant be retrieved from "get_default_connection_settings", environment variables (where the keys are "OPENAI_API_KEY", "OPENAI_ORG_ID" and "OPENAI_BASE_URL") are used internally. '''
+    return client
 
+# Lazy loading (per event loop):
+__default_async_http_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {} # pylint: disable = invalid-name
+
+def get_default_async_http_client():
+    return _get_or_create_per_loop(__default_async_http_clients, create_async_http_client)
+
+def _create_client_args(api_key = None, organization = None, project = None, base_url = None, timeout = None):
     if not api_key:
         api_key = get_default_connection_settings().api_key
 
@@ -256,7 +469,17 @@ def create_client(api_key = None, organization = None, project = None, base_url
         # Explained in pyddle_web.py.
         args.must_contain("timeout", httpx.Timeout(timeout = pweb.DEFAULT_TIMEOUT, read = DEFAULT_RESPONSE_TIMEOUT))
 
-    return openai.OpenAI(**args.args)
+    return args.args
+
+def create_client(api_key = None, organization = None, project = None, base_url = None, timeout = None, http_client: httpx.Client | None = None):
+    '''
+        If the arguments are falsy and cant be retrieved from "get_default_connection_settings", environment variables (where the keys are "OPENAI_API_KEY", "OPENAI_ORG_ID" and "OPENAI_BASE_URL") are used internally.
+        If "http_client" is None, the shared connection pool is used.
+    '''
+
+    return openai.OpenAI(
+        **_create_client_args(api_key = api_key, organization = organization, project = project, base_url = base_url, timeout = timeout),
+        http_client = putility.get_not_none_or_call_func(get_default_http_client, http_client))
 
 # Lazy loading:
 __default_client: openai.OpenAI | None = None # pylint: disable = invalid-name
@@ -269,6 +492,32 @@ def get_default_client():
 
     return __default_client
 
+# The lazy loading isnt thread-safe.
+# Code that fans requests out to worker threads passes the clients the threads will use,
+#     so that, if any of them is None, the default client is created here once instead of by the racing threads.
+
+def preload_default_client(clients: typing.Iterable[openai.OpenAI | None]):
+    if any(client is None for client in clients):
+        get_default_client()
+
+# The asynchronous client has the same methods as the synchronous one, but they are coroutines.
+# When it's used for streaming, the returned object must be iterated with "async for".
+# One event loop can drive many requests concurrently without a thread for each of them.
+# https://github.com/openai/openai-python/blob/main/README.md#async-usage
+
+def create_async_client(api_key = None, organization = None, project = None, base_url = None, timeout = None, http_client: httpx.AsyncClient | None = None):
+    ''' The asynchronous version of "create_client". '''
+
+    return openai.AsyncOpenAI(
+        **_create_client_args(api_key = api_key, organization = organization, project = project, base_url = base_url, timeout = timeout),
+        http_client = putility.get_not_none_or_call_func(get_default_async_http_client, http_client))
+
+# Lazy loading (per event loop, like get_default_async_http_client):
+__default_async_clients: dict[asyncio.AbstractEventLoop, openai.AsyncOpenAI] = {} # pylint: disable = invalid-name
+
+def get_default_async_client():
+    return _get_or_create_per_loop(__default_async_clients, create_async_client)
+
 # ------------------------------------------------------------------------------
 #     Text to speech
 # ------------------------------------------------------------------------------
@@ -294,6 +543,26 @@ class AudioFormat(enum.Enum):
     PCM = "pcm"
     WAV = "wav"
 
+def _create_audio_speech_args(input_, model: Model, voice: Voice, response_format: AudioFormat, speed, timeout):
+    # Checked: all, order, named, falsy
+    # Meaning: all parameters in the API reference are supported, their order is natural,
+    #     the parameters are specified with their names and potentially falsy values are converted to None.
+
+    # The API offers more parameters like: extra_headers, extra_query, extra_body and timeout.
+    # We wont support them because, in a situation where we need to specify them, we wont use one-liners.
+
+    args = pcollections.PotentiallyFalsyArgs()
+    args.must_contain("input", input_)
+    args.must_contain_enum_value("model", model)
+    args.must_contain_enum_value("voice", voice)
+    args.must_contain_enum_value("response_format", response_format)
+    args.may_contain("speed", speed)
+
+    if timeout:
+        args.must_contain("timeout", timeout)
+
+    return args.args
+
 def create_audio_speech(
     # Input:
     input_,
@@ -311,31 +580,193 @@ def create_audio_speech(
     client: openai.OpenAI | None = None,
     timeout = None):
 
-    # Checked: all, order, named, falsy
-    # Meaning: all parameters in the API reference are supported, their order is natural,
-    #     the parameters are specified with their names and potentially falsy values are converted to None.
-
-    # The API offers more parameters like: extra_headers, extra_query, extra_body and timeout.
-    # We wont support them because, in a situation where we need to specify them, we wont use one-liners.
-
-    args = pcollections.PotentiallyFalsyArgs()
-    args.must_contain("input", input_)
-    args.must_contain_enum_value("model", model)
-    args.must_contain_enum_value("voice", voice)
-    args.must_contain_enum_value("response_format", response_format)
-    args.may_contain("speed", speed)
-
-    if timeout:
-        args.must_contain("timeout", timeout)
+    args = _create_audio_speech_args(input_ = input_, model = model, voice = voice, response_format = response_format, speed = speed, timeout = timeout)
 
     # "create" returns HttpxBinaryResponseContent.
     # https://github.com/openai/openai-python/blob/main/src/openai/_legacy_response.py
-    return putility.get_not_none_or_call_func(get_default_client, client).audio.speech.create(**args.args) # pylint: disable = missing-kwoa
+    return putility.get_not_none_or_call_func(get_default_client, client).audio.speech.create(**args) # pylint: disable = missing-kwoa
 
 def openai_save_audio(file_path, response):
     pfs.create_parent_directory(file_path)
     response.write_to_file(file_path)
 
+# "create_audio_speech" returns after the whole audio has been generated and keeps it in memory until it's saved.
+# With "with_streaming_response", the bytes are written to the file as they arrive,
+#     so the first part can be played (by another process reading the file) before the rest has been generated.
+# https://github.com/openai/openai-python/blob/main/README.md#streaming-response-bodies
+
+# The API accepts up to 4096 characters per request.
+# For longer texts, "save_long_audio_speech" splits the text on sentence boundaries,
+#     generates the parts concurrently and appends them to the file in order as soon as each of them and all the ones before it are ready.
+
+# The parts are concatenated as they are, which works for formats made of independent frames or packets:
+#     * MP3 and AAC (ADTS) are sequences of frames
+#     * Opus comes in Ogg, where "chained" streams are valid
+#     * PCM is raw samples
+# WAV files have a header with the data size, so the parts are generated as PCM and written with the "wave" module.
+# FLAC has a single header with the stream info, so it cant be concatenated.
+
+MAX_SPEECH_INPUT_LENGTH = 4096
+DEFAULT_MAX_SPEECH_WORKERS = 4
+
+# https://platform.openai.com/docs/guides/text-to-speech/supported-output-formats
+# "Raw samples in 24kHz (16-bit signed, low-endian), without the header."
+SPEECH_PCM_FRAME_RATE = 24000
+SPEECH_PCM_SAMPLE_WIDTH = 2
+SPEECH_PCM_CHANNELS = 1
+
+SPEECH_STREAMING_CHUNK_SIZE = 64 * 1024
+
+def save_audio_speech(
+    # Output:
+    file_path,
+
+    # Input:
+    input_,
+
+    # Parameters:
+    model: Model,
+    voice: Voice,
+    response_format: AudioFormat,
+
+    # Optional parameters:
+    speed = None,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    timeout = None):
+
+    ''' Writes the audio to the file as it's generated. Returns the file path. '''
+
+    args = _create_audio_speech_args(input_ = input_, model = model, voice = voice, response_format = response_format, speed = speed, timeout = timeout)
+
+    pfs.create_parent_directory(file_path)
+
+    with putility.get_not_none_or_call_func(get_default_client, client).audio.speech.with_streaming_response.create(**args) as response: # pylint: disable = missing-kwoa
+        with open(file_path, "wb") as file:
+            for chunk in response.iter_bytes(chunk_size = SPEECH_STREAMING_CHUNK_SIZE):
+                file.write(chunk)
+
+    return file_path
+
+# Sentence-ending punctuation marks followed by whitespace (in most languages) or not (in Chinese and Japanese).
+SENTENCE_BOUNDARY_PATTERN = pstring.register_regex("pyddle_openai/sentence_boundary", r"(?<=[.!?])\s+|(?<=[。！？])")
+
+def split_text_for_speech(text, max_length = MAX_SPEECH_INPUT_LENGTH):
+    ''' Splits the text into parts of up to "max_length" characters, preferably on sentence boundaries and then on whitespace. '''
+
+    parts = []
+    current_part = ""
+
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text):
+        sentence = sentence.strip()
+
+        if not sentence:
+            continue
+
+        # A sentence that is too long by itself is split on whitespace, or wherever it must be.
+        while len(sentence) > max_length:
+            if current_part:
+                parts.append(current_part)
+                current_part = ""
+
+            index = sentence.rfind(" ", 0, max_length + 1)
+
+            if index <= 0:
+                index = max_length
+
+            parts.append(sentence[:index].strip())
+            sentence = sentence[index:].strip()
+
+        # Chinese and Japanese sentences arent separated by spaces.
+        separator = "" if not current_part or current_part[-1] in "。！？" else " "
+
+        if current_part and len(current_part) + len(separator) + len(sentence) > max_length:
+            parts.append(current_part)
+            current_part = sentence
+
+        else:
+            current_part += separator + sentence
+
+    if current_part:
+        parts.append(current_part)
+
+    return parts
+
+def save_long_audio_speech(
+    # Output:
+    file_path,
+
+    # Input:
+    input_,
+
+    # Parameters:
+    model: Model,
+    voice: Voice,
+    response_format: AudioFormat,
+
+    # Optional parameters:
+    speed = None,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    timeout = None,
+    max_length = MAX_SPEECH_INPUT_LENGTH,
+    max_workers = None):
+
+    ''' Generates the audio of a text of any length. Returns the file path. '''
+
+    if response_format == AudioFormat.FLAC:
+        raise perrors.NotSupportedError("FLAC audio cant be concatenated.")
+
+    parts = split_text_for_speech(input_, max_length = max_length)
+
+    # Empty or whitespace-only input has nothing to speak; the API would reject it as well.
+    if not parts:
+        raise perrors.ArgumentError("Input must contain text to speak.")
+
+    if len(parts) <= 1 and response_format != AudioFormat.WAV:
+        return save_audio_speech(file_path, input_, model = model, voice = voice, response_format = response_format, speed = speed, client = client, timeout = timeout)
+
+    part_format = AudioFormat.PCM if response_format == AudioFormat.WAV else response_format
+
+    preload_default_client([client])
+
+    pfs.create_parent_directory(file_path)
+
+    with tempfile.TemporaryDirectory() as directory_path:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(parts), max_workers or DEFAULT_MAX_SPEECH_WORKERS)) as executor:
+            futures = [executor.submit(save_audio_speech, os.path.join(directory_path, f"{index}.{part_format.value}"), part,
+                model = model, voice = voice, response_format = part_format, speed = speed, client = client, timeout = timeout) for index, part in enumerate(parts)]
+
+            try:
+                if response_format == AudioFormat.WAV:
+                    with wave.open(file_path, "wb") as wave_file:
+                        wave_file.setnchannels(SPEECH_PCM_CHANNELS)
+                        wave_file.setsampwidth(SPEECH_PCM_SAMPLE_WIDTH)
+                        wave_file.setframerate(SPEECH_PCM_FRAME_RATE)
+
+                        # In the order of the parts; each one is appended as soon as it's ready.
+                        for future in futures:
+                            with open(future.result(), "rb") as part_file:
+                                while chunk := part_file.read(SPEECH_STREAMING_CHUNK_SIZE):
+                                    wave_file.writeframes(chunk)
+
+                else:
+                    with open(file_path, "wb") as file:
+                        for future in futures:
+                            with open(future.result(), "rb") as part_file:
+                                shutil.copyfileobj(part_file, file, SPEECH_STREAMING_CHUNK_SIZE)
+
+            except Exception:
+                # The remaining parts wont be needed.
+                for future in futures:
+                    future.cancel()
+
+                raise
+
+    return file_path
+
 # ------------------------------------------------------------------------------
 #     Speech to text
 # ------------------------------------------------------------------------------
@@ -450,7 +881,7 @@ def create_audio_transcription(
         args.must_contain_enum_value("response_format", response_format)
         args.may_contain("language", language)
         args.may_contain("prompt", prompt)
-        args.may_contain("temperature", temperature)
+        args.may_contain_not_none("temperature", temperature)
         args.may_contain("timestamp_granularities", timestamp_granularities)
 
         if timeout:
@@ -484,13 +915,502 @@ def create_audio_translation(
         args.must_contain_enum_value("model", model)
         args.must_contain_enum_value("response_format", response_format)
         args.may_contain("prompt", prompt)
-        args.may_contain("temperature", temperature)
+        args.may_contain_not_none("temperature", temperature)
 
         if timeout:
             args.must_contain("timeout", timeout)
 
         return putility.get_not_none_or_call_func(get_default_client, client).audio.translations.create(**args.args) # pylint: disable = missing-kwoa
 
+# ------------------------------------------------------------------------------
+#     Long audio transcription
+# ------------------------------------------------------------------------------
+
+# The API accepts files of up to 25 MB and transcribes one file in one request from the beginning to the end.
+# For long recordings, we split the audio into segments, transcribe/translate them concurrently and stitch the results back together.
+
+# Each segment's file extends a little beyond the segment's range so that a part (a phrase or a word) that crosses the boundary is heard to its end.
+# Each segment is transcribed as "verbose_json" regardless of the requested format so that we know when each part of the text was spoken:
+#     * The timestamps are shifted by where the segment starts in the original file
+#     * A part that starts in the overlap after the segment's range is left to the next segment, which hears it from its beginning
+#     * A part that crossed the boundary has been kept whole by the previous segment;
+#           the next segment hears only its tail, which is dropped if its midpoint comes before the end of what has already been stitched
+# The requested format is then rendered from the stitched parts.
+
+# WAV files are split with the standard "wave" module.
+# Other formats need a splitter (for example, one that calls ffmpeg) with the same signature as "split_wav_file".
+
+MAX_AUDIO_FILE_SIZE = 25 * 1024 * 1024
+
+# In seconds.
+DEFAULT_AUDIO_SEGMENT_DURATION = 10 * 60
+DEFAULT_AUDIO_SEGMENT_OVERLAP = 2
+
+DEFAULT_MAX_TRANSCRIPTION_WORKERS = 4
+
+# For the WAV header and anything else that isnt audio data.
+AUDIO_FILE_SIZE_MARGIN = 64 * 1024
+
+class AudioSegment:
+    def __init__(self, file_path, offset, start, end):
+        self.file_path = file_path
+
+        # In seconds, in the original file:
+        # Where the segment's audio starts, which is usually "start".
+        self.offset = offset
+        # The range the segment is responsible for; the file may continue after "end" by the overlap.
+        self.start = start
+        self.end = end
+
+# Arguments: file_path, output_directory_path, segment_duration, overlap
+AudioSplitter = typing.Callable[[str, str, float, float], list[AudioSegment]]
+
+def split_wav_file(file_path, output_directory_path, segment_duration = DEFAULT_AUDIO_SEGMENT_DURATION, overlap = DEFAULT_AUDIO_SEGMENT_OVERLAP):
+    ''' Segments longer than what fits in MAX_AUDIO_FILE_SIZE are shortened. '''
+
+    segments = []
+
+    root, extension = os.path.splitext(ppath.basename(file_path))
+
+    with wave.open(file_path, "rb") as input_file:
+        params = input_file.getparams()
+        bytes_per_frame = params.sampwidth * params.nchannels
+
+        overlap_frames = int(overlap * params.framerate)
+        max_frames = (MAX_AUDIO_FILE_SIZE - AUDIO_FILE_SIZE_MARGIN) // bytes_per_frame - overlap_frames
+
+        if max_frames <= 0:
+            raise perrors.ArgumentError("The overlap is too long.")
+
+        segment_frames = max(1, min(int(segment_duration * params.framerate), max_frames))
+
+        for index, start_frame in enumerate(range(0, params.nframes, segment_frames)):
+            end_frame = min(start_frame + segment_frames, params.nframes)
+            # The overlap comes after the boundary so that what crosses it is heard to its end.
+            file_end_frame = min(end_frame + overlap_frames, params.nframes)
+
+            segment_file_path = os.path.join(output_directory_path, f"{root}-{index}{extension}")
+
+            input_file.setpos(start_frame)
+
+            with wave.open(segment_file_path, "wb") as output_file:
+                # The number of frames in the header is updated when the file is closed.
+                output_file.setparams(params)
+
+                # Copied in blocks of about 1 MB so that a whole segment isnt loaded at once.
+                remaining_frames = file_end_frame - start_frame
+                block_frames = max(1, 1024 * 1024 // bytes_per_frame)
+
+                while remaining_frames > 0:
+                    frames = input_file.readframes(min(block_frames, remaining_frames))
+
+                    if not frames:
+                        break
+
+                    output_file.writeframes(frames)
+                    remaining_frames -= len(frames) // bytes_per_frame
+
+            segments.append(AudioSegment(
+                file_path = segment_file_path,
+                offset = start_frame / params.framerate,
+                start = start_frame / params.framerate,
+                end = end_frame / params.framerate))
+
+    return segments
+
+def _get_transcript_result(response, response_format: TranscriptFormat):
+    # The API returns strings for "text", "srt" and "vtt" and objects for the JSON formats.
+    # The objects are converted to dictionaries so that the results look the same whether they have been stitched or not.
+    if response_format in (TranscriptFormat.JSON, TranscriptFormat.VERBOSE_JSON):
+        return response.model_dump()
+
+    return response
+
+def _format_subtitle_timestamp(seconds, decimal_separator):
+    milliseconds = round(seconds * 1000)
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    seconds_, milliseconds = divmod(milliseconds, 1000)
+
+    return f"{hours:02}:{minutes:02}:{seconds_:02}{decimal_separator}{milliseconds:03}"
+
+def _stitch_parts(segment: AudioSegment, parts, is_last, stitched_parts: list[dict]):
+    # What the previous segments have covered.
+    covered_end = stitched_parts[-1]["end"] if stitched_parts else 0
+
+    for part in parts:
+        start = part["start"] + segment.offset
+        end = part["end"] + segment.offset
+
+        # The last segment has no next one to take over what comes after its range.
+        if start >= segment.end and not is_last:
+            continue
+
+        # The tail of a part the previous segment has kept whole.
+        if (start + end) / 2 < covered_end:
+            continue
+
+        stitched_parts.append({**part, "start": start, "end": end})
+
+def _stitch_transcripts(segments: list[AudioSegment], transcripts: list[dict], response_format: TranscriptFormat):
+    stitched_segments: list[dict] = []
+    stitched_words: list[dict] = []
+    language = None
+
+    for index, (segment, transcript) in enumerate(zip(segments, transcripts)):
+        language = language or transcript.get("language")
+
+        is_last = index == len(segments) - 1
+
+        _stitch_parts(segment, transcript.get("segments") or [], is_last, stitched_segments)
+        _stitch_parts(segment, transcript.get("words") or [], is_last, stitched_words)
+
+    for index, part in enumerate(stitched_segments):
+        part["id"] = index
+
+    if stitched_segments:
+        # Whisper's segments start with spaces where the language needs them.
+        text = "".join(part["text"] for part in stitched_segments).strip()
+
+    else:
+        # The segments are always requested for stitching, but a custom "create_transcript" may return only the words, which dont contain spaces.
+        text = " ".join(word["word"].strip() for word in stitched_words)
+
+    if response_format == TranscriptFormat.TEXT:
+        return text
+
+    if response_format == TranscriptFormat.JSON:
+        return {"text": text}
+
+    if response_format == TranscriptFormat.VERBOSE_JSON:
+        result = {
+            "language": language,
+            "duration": segments[-1].end if segments else 0,
+            "text": text,
+            "segments": stitched_segments
+        }
+
+        if stitched_words:
+            result["words"] = stitched_words
+
+        return result
+
+    if response_format == TranscriptFormat.SRT:
+        # https://en.wikipedia.org/wiki/SubRip
+        return "".join(f"{index + 1}\n{_format_subtitle_timestamp(part["start"], ",")} --> {_format_subtitle_timestamp(part["end"], ",")}\n{part["text"].strip()}\n\n"
+            for index, part in enumerate(stitched_segments))
+
+    if response_format == TranscriptFormat.VTT:
+        # https://developer.mozilla.org/en-US/docs/Web/API/WebVTT_API
+        return "WEBVTT\n\n" + "".join(f"{_format_subtitle_timestamp(part["start"], ".")} --> {_format_subtitle_timestamp(part["end"], ".")}\n{part["text"].strip()}\n\n"
+            for part in stitched_segments)
+
+    raise perrors.NotSupportedError(f"Unsupported transcript format: {response_format}")
+
+def _create_long_audio_transcript(
+    file_path,
+    response_format: TranscriptFormat,
+    # Called with the file path and the response format.
+    create_transcript: typing.Callable[[str, TranscriptFormat], typing.Any],
+    segment_duration,
+    overlap,
+    splitter: AudioSplitter | None,
+    max_workers,
+    client: openai.OpenAI | None):
+
+    if splitter is None:
+        if os.path.splitext(file_path)[1].lower() == ".wav":
+            splitter = split_wav_file
+
+        elif os.path.getsize(file_path) <= MAX_AUDIO_FILE_SIZE:
+            # Small enough to be sent as it is.
+            return _get_transcript_result(create_transcript(file_path, response_format), response_format)
+
+        else:
+            raise perrors.NotSupportedError(f"A splitter is required for: {file_path}")
+
+    with tempfile.TemporaryDirectory() as directory_path:
+        segments = splitter(file_path, directory_path, segment_duration, overlap)
+
+        if len(segments) <= 1:
+            return _get_transcript_result(create_transcript(file_path, response_format), response_format)
+
+        preload_default_client([client])
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(segments), max_workers or DEFAULT_MAX_TRANSCRIPTION_WORKERS)) as executor:
+            futures = [executor.submit(create_transcript, segment.file_path, TranscriptFormat.VERBOSE_JSON) for segment in segments]
+
+        # Raises the first exception (in the order of the segments) if any.
+        transcripts = [future.result().model_dump() for future in futures]
+
+    return _stitch_transcripts(segments, transcripts, response_format)
+
+def create_long_audio_transcription(
+    # Input:
+    file_path,
+
+    # Parameters:
+    model: Model,
+    response_format: TranscriptFormat,
+
+    # Optional parameters:
+    language = None,
+    # Given to every segment; the text before each segment isnt available because the segments are transcribed at the same time.
+    prompt = None,
+    temperature = None,
+    timestamp_granularities = None,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    timeout = None,
+    segment_duration = DEFAULT_AUDIO_SEGMENT_DURATION,
+    overlap = DEFAULT_AUDIO_SEGMENT_OVERLAP,
+    splitter: AudioSplitter | None = None,
+    max_workers = None):
+
+    ''' Returns a str for TEXT, SRT and VTT and a dict for JSON and VERBOSE_JSON. '''
+
+    # Stitching needs the segments, which the API omits when only "word" is requested.
+    if timestamp_granularities and "segment" not in timestamp_granularities:
+        verbose_json_timestamp_granularities = [*timestamp_granularities, "segment"]
+
+    else:
+        verbose_json_timestamp_granularities = timestamp_granularities
+
+    def _create_transcript(file_path_, response_format_):
+        return create_audio_transcription(
+            file_path = file_path_,
+            model = model,
+            response_format = response_format_,
+            language = language,
+            prompt = prompt,
+            temperature = temperature,
+            timestamp_granularities = verbose_json_timestamp_granularities if response_format_ == TranscriptFormat.VERBOSE_JSON else timestamp_granularities,
+            client = client,
+            timeout = timeout)
+
+    return _create_long_audio_transcript(file_path, response_format, _create_transcript, segment_duration, overlap, splitter, max_workers, client)
+
+def create_long_audio_translation(
+    # Input:
+    file_path,
+
+    # Parameters:
+    model: Model,
+    response_format: TranscriptFormat,
+
+    # Optional parameters:
+    prompt = None,
+    temperature = None,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    timeout = None,
+    segment_duration = DEFAULT_AUDIO_SEGMENT_DURATION,
+    overlap = DEFAULT_AUDIO_SEGMENT_OVERLAP,
+    splitter: AudioSplitter | None = None,
+    max_workers = None):
+
+    ''' Returns a str for TEXT, SRT and VTT and a dict for JSON and VERBOSE_JSON. '''
+
+    def _create_transcript(file_path_, response_format_):
+        return create_audio_translation(
+            file_path = file_path_,
+            model = model,
+            response_format = response_format_,
+            prompt = prompt,
+            temperature = temperature,
+            client = client,
+            timeout = timeout)
+
+    return _create_long_audio_transcript(file_path, response_format, _create_transcript, segment_duration, overlap, splitter, max_workers, client)
+
+# ------------------------------------------------------------------------------
+#     Response cache
+# ------------------------------------------------------------------------------
+
+# Scripts like code_checker.py may send the exact same request again and again, for example, when re-checking an unchanged file.
+# ResponseCache stores the responses on disk, keyed by a fingerprint of the request, so that such requests cost neither time nor tokens.
+
+# It's opt-in.
+# Unless "temperature" is 0 and "seed" is set, the same request may return different responses,
+#     and only the caller can decide whether a previous one is good enough.
+
+# Each response is a JSON file named after the fingerprint.
+# Expiration is based on the creation time written in the file,
+#     and the file's modification time is updated on every hit so that the least recently used ones are evicted first when the directory grows too large.
+
+DEFAULT_RESPONSE_CACHE_TIME_TO_LIVE = datetime.timedelta(days = 7)
+DEFAULT_RESPONSE_CACHE_MAX_TOTAL_SIZE = 64 * 1024 * 1024
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory_path,
+        time_to_live: datetime.timedelta | None = DEFAULT_RESPONSE_CACHE_TIME_TO_LIVE,
+        max_total_size: int | None = DEFAULT_RESPONSE_CACHE_MAX_TOTAL_SIZE):
+
+        self.directory_path = directory_path
+        self.time_to_live = time_to_live
+        self.max_total_size = max_total_size
+
+        # Writes and evictions may run on multiple threads (for example, in pyddle_langtree.run_generation_jobs).
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_fingerprint(args):
+        # "timeout" doesnt affect the response.
+        # The keys are sorted so that the order of the arguments doesnt matter.
+        data = {key: value for key, value in args.items() if key != "timeout"}
+        json_str = json.dumps(data, ensure_ascii = False, sort_keys = True, separators = (",", ":"), default = str)
+        return hashlib.sha256(json_str.encode("utf-8")).hexdigest()
+
+    def get_file_path(self, fingerprint):
+        return os.path.join(self.directory_path, f"{fingerprint}.json")
+
+    def read(self, fingerprint):
+        ''' Returns None if the response isnt cached or has expired. '''
+
+        file_path = self.get_file_path(fingerprint)
+
+        if not os.path.isfile(file_path):
+            return None
+
+        try:
+            entry = json.loads(pfs.read_all_text_from_file(file_path))
+
+        except (OSError, ValueError):
+            # The file may have been evicted by another thread or left broken by a crashed process.
+            # Either way, it's as good as a cache miss.
+            return None
+
+        if self.time_to_live is not None:
+            creation_utc = pdatetime.roundtrip_string_to_utc(entry["creation_utc"])
+
+            if pdatetime.get_utc_now() - creation_utc > self.time_to_live:
+                self.remove(fingerprint)
+                return None
+
+        try:
+            # Marking the file as recently used.
+            os.utime(file_path)
+
+        except OSError:
+            pass
+
+        return entry["data"]
+
+    def write(self, fingerprint, data):
+        entry = {
+            "creation_utc": pdatetime.utc_to_roundtrip_string(pdatetime.get_utc_now()),
+            "data": data
+        }
+
+        file_path = self.get_file_path(fingerprint)
+
+        # Written to a temporary file first so that a reader never sees a half-written file.
+        temporary_file_path = f"{file_path}.{threading.get_ident()}.tmp"
+
+        with self.lock:
+            os.makedirs(self.directory_path, exist_ok = True)
+            pfs.write_all_text_to_file(temporary_file_path, json.dumps(entry, ensure_ascii = False))
+            os.replace(temporary_file_path, file_path)
+
+            self.evict()
+
+    def remove(self, fingerprint):
+        try:
+            os.remove(self.get_file_path(fingerprint))
+
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        ''' Removes the least recently used responses until the total size fits in "max_total_size". '''
+
+        if self.max_total_size is None or not os.path.isdir(self.directory_path):
+            return
+
+        files = []
+        total_size = 0
+
+        for entry in os.scandir(self.directory_path):
+            if entry.is_file() and entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        if total_size <= self.max_total_size:
+            return
+
+        files.sort()
+
+        for _, size, path in files:
+            if total_size <= self.max_total_size:
+                break
+
+            try:
+                os.remove(path)
+
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory_path):
+            return
+
+        with self.lock:
+            for entry in os.scandir(self.directory_path):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    os.remove(entry.path)
+
+# Lazy loading:
+__default_response_cache: ResponseCache | None = None # pylint: disable = invalid-name
+
+def get_default_response_cache():
+    global __default_response_cache # pylint: disable = global-statement
+
+    if __default_response_cache is None:
+        # Like the private KVS file, it's shared by all the scripts of the user.
+        __default_response_cache = ResponseCache(directory_path = os.path.join(os.path.expanduser("~"), ".pyddle_openai_cache"))
+
+    return __default_response_cache
+
+# The chunks of a streamed response are cached as a list and replayed one by one.
+# A stream that isnt read to the end (or fails) isnt cached because we cant tell whether it's complete.
+
+# The replayed objects are parsed by the same models as the live ones,
+#     but they are plain iterables/async iterables and dont have other members of openai.Stream/openai.AsyncStream such as "close".
+
+def _replay_chat_completion_chunks(chunks):
+    for chunk in chunks:
+        yield openai.types.chat.ChatCompletionChunk.model_validate(chunk)
+
+def _record_chat_completion_chunks(cache: ResponseCache, fingerprint, response):
+    chunks = []
+
+    for chunk in response:
+        chunks.append(chunk.model_dump(mode = "json"))
+        yield chunk
+
+    cache.write(fingerprint, chunks)
+
+async def _replay_chat_completion_chunks_async(chunks):
+    for chunk in chunks:
+        yield openai.types.chat.ChatCompletionChunk.model_validate(chunk)
+
+async def _record_chat_completion_chunks_async(cache: ResponseCache, fingerprint, response):
+    chunks = []
+
+    async for chunk in response:
+        chunks.append(chunk.model_dump(mode = "json"))
+        yield chunk
+
+    # Writing may also evict old files, which means scanning the directory; it shouldnt block the event loop.
+    await asyncio.to_thread(cache.write, fingerprint, chunks)
+
 # ------------------------------------------------------------------------------
 #     Chat
 # ------------------------------------------------------------------------------
@@ -512,6 +1432,54 @@ class ChatFormat(enum.Enum):
     JSON_OBJECT = "json_object"
     TEXT = "text"
 
+def _create_chat_completions_args(
+    model: Model,
+    messages,
+    frequency_penalty = None,
+    logit_bias = None,
+    logprobs = None,
+    top_logprobs = None,
+    max_tokens = None,
+    n = None,
+    presence_penalty = None,
+    response_format: ChatFormat | None = None,
+    seed = None,
+    stop = None,
+    stream = None,
+    temperature = None,
+    top_p = None,
+    user = None,
+    timeout = None):
+
+    # Checked: all, order, named, falsy
+
+    args = pcollections.PotentiallyFalsyArgs()
+    args.must_contain_enum_value("model", model)
+    args.must_contain("messages", messages)
+    args.may_contain_not_none("frequency_penalty", frequency_penalty)
+    args.may_contain("logit_bias", logit_bias)
+    args.may_contain("logprobs", logprobs)
+    args.may_contain_not_none("top_logprobs", top_logprobs)
+    args.may_contain("max_tokens", max_tokens)
+    args.may_contain("n", n)
+    args.may_contain_not_none("presence_penalty", presence_penalty)
+    args.may_contain_enum_value("response_format", response_format)
+    args.may_contain_not_none("seed", seed)
+    args.may_contain("stop", stop)
+    args.may_contain("stream", stream)
+    args.may_contain_not_none("temperature", temperature)
+    args.may_contain_not_none("top_p", top_p)
+    args.may_contain("user", user)
+
+    if timeout:
+        args.must_contain("timeout", timeout)
+
+    else:
+        if stream:
+            args.must_contain("timeout", httpx.Timeout(timeout = pweb.DEFAULT_TIMEOUT, read = DEFAULT_CHUNK_TIMEOUT))
+
+    return args.args
+
 def create_chat_completions(
     # Parameters:
     model: Model,
@@ -534,38 +1502,119 @@ def create_chat_completions(
     top_p = None,
     user = None,
 
-    # Optional settings:
-    client: openai.OpenAI | None = None,
-    timeout = None):
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    timeout = None,
+    cache: ResponseCache | None = None):
+
+    args = _create_chat_completions_args(
+        model = model,
+        messages = messages,
+        frequency_penalty = frequency_penalty,
+        logit_bias = logit_bias,
+        logprobs = logprobs,
+        top_logprobs = top_logprobs,
+        max_tokens = max_tokens,
+        n = n,
+        presence_penalty = presence_penalty,
+        response_format = response_format,
+        seed = seed,
+        stop = stop,
+        stream = stream,
+        temperature = temperature,
+        top_p = top_p,
+        user = user,
+        timeout = timeout)
+
+    if cache is None:
+        return putility.get_not_none_or_call_func(get_default_client, client).chat.completions.create(**args)
+
+    fingerprint = ResponseCache.get_fingerprint(args)
+    data = cache.read(fingerprint)
+
+    if stream:
+        if data is not None:
+            return _replay_chat_completion_chunks(data)
+
+        return _record_chat_completion_chunks(cache, fingerprint,
+            putility.get_not_none_or_call_func(get_default_client, client).chat.completions.create(**args))
+
+    if data is not None:
+        return openai.types.chat.ChatCompletion.model_validate(data)
+
+    response = putility.get_not_none_or_call_func(get_default_client, client).chat.completions.create(**args)
+    cache.write(fingerprint, response.model_dump(mode = "json"))
+
+    return response
+
+async def create_chat_completions_async(
+    # Parameters:
+    model: Model,
+    messages,
+
+    # Optional parameters:
+    frequency_penalty = None,
+    logit_bias = None,
+    logprobs = None,
+    top_logprobs = None,
+    max_tokens = None,
+    n = None,
+    presence_penalty = None,
+    response_format: ChatFormat | None = None,
+    seed = None,
+    stop = None,
+    stream = None,
+    temperature = None,
+    top_p = None,
+    user = None,
+
+    # Optional settings:
+    client: openai.AsyncOpenAI | None = None,
+    timeout = None,
+    cache: ResponseCache | None = None):
+
+    ''' If "stream" is True, the returned object must be iterated with "async for". '''
+
+    args = _create_chat_completions_args(
+        model = model,
+        messages = messages,
+        frequency_penalty = frequency_penalty,
+        logit_bias = logit_bias,
+        logprobs = logprobs,
+        top_logprobs = top_logprobs,
+        max_tokens = max_tokens,
+        n = n,
+        presence_penalty = presence_penalty,
+        response_format = response_format,
+        seed = seed,
+        stop = stop,
+        stream = stream,
+        temperature = temperature,
+        top_p = top_p,
+        user = user,
+        timeout = timeout)
+
+    if cache is None:
+        return await putility.get_not_none_or_call_func(get_default_async_client, client).chat.completions.create(**args)
 
-    # Checked: all, order, named, falsy
+    # ResponseCache does blocking file I/O, which runs on a worker thread here.
+    fingerprint = ResponseCache.get_fingerprint(args)
+    data = await asyncio.to_thread(cache.read, fingerprint)
 
-    args = pcollections.PotentiallyFalsyArgs()
-    args.must_contain_enum_value("model", model)
-    args.must_contain("messages", messages)
-    args.may_contain("frequency_penalty", frequency_penalty)
-    args.may_contain("logit_bias", logit_bias)
-    args.may_contain("logprobs", logprobs)
-    args.may_contain("top_logprobs", top_logprobs)
-    args.may_contain("max_tokens", max_tokens)
-    args.may_contain("n", n)
-    args.may_contain("presence_penalty", presence_penalty)
-    args.may_contain_enum_value("response_format", response_format)
-    args.may_contain("seed", seed)
-    args.may_contain("stop", stop)
-    args.may_contain("stream", stream)
-    args.may_contain("temperature", temperature)
-    args.may_contain("top_p", top_p)
-    args.may_contain("user", user)
+    if stream:
+        if data is not None:
+            return _replay_chat_completion_chunks_async(data)
 
-    if timeout:
-        args.must_contain("timeout", timeout)
+        return _record_chat_completion_chunks_async(cache, fingerprint,
+            await putility.get_not_none_or_call_func(get_default_async_client, client).chat.completions.create(**args))
 
-    else:
-        if stream:
-            args.must_contain("timeout", httpx.Timeout(timeout = pweb.DEFAULT_TIMEOUT, read = DEFAULT_CHUNK_TIMEOUT))
+    if data is not None:
+        return openai.types.chat.ChatCompletion.model_validate(data)
 
-    return putility.get_not_none_or_call_func(get_default_client, client).chat.completions.create(**args.args)
+    response = await putility.get_not_none_or_call_func(get_default_async_client, client).chat.completions.create(**args)
+    await asyncio.to_thread(cache.write, fingerprint, response.model_dump(mode = "json"))
+
+    return response
 
 class ChatSettings:
     def __init__(self, model: Model):
@@ -616,7 +1665,8 @@ def create_chat_completions_with_settings(
     # Optional settings:
     client: openai.OpenAI | None = None,
     stream_override = None,
-    timeout = None):
+    timeout = None,
+    cache: ResponseCache | None = None):
 
     return create_chat_completions(
         model = settings.model,
@@ -636,7 +1686,39 @@ def create_chat_completions_with_settings(
         top_p = settings.top_p,
         user = settings.user,
         client = client,
-        timeout = timeout)
+        timeout = timeout,
+        cache = cache)
+
+async def create_chat_completions_with_settings_async(
+    settings: ChatSettings,
+    messages,
+
+    # Optional settings:
+    client: openai.AsyncOpenAI | None = None,
+    stream_override = None,
+    timeout = None,
+    cache: ResponseCache | None = None):
+
+    return await create_chat_completions_async(
+        model = settings.model,
+        messages = messages,
+        frequency_penalty = settings.frequency_penalty,
+        logit_bias = settings.logit_bias,
+        logprobs = settings.logprobs,
+        top_logprobs = settings.top_logprobs,
+        max_tokens = settings.max_tokens,
+        n = settings.n,
+        presence_penalty = settings.presence_penalty,
+        response_format = settings.response_format,
+        seed = settings.seed,
+        stop = settings.stop,
+        stream = settings.stream if stream_override is None else stream_override,
+        temperature = settings.temperature,
+        top_p = settings.top_p,
+        user = settings.user,
+        client = client,
+        timeout = timeout,
+        cache = cache)
 
 def create_message(role: Role, content, name = None):
     message = {}
@@ -695,9 +1777,180 @@ class VisionDetail(enum.Enum):
     HIGH = "high"
     LOW = "low"
 
+# Images are sent as data URLs, which are Base64 strings about 4/3 the size of the files.
+# Building one used to keep the file's bytes, their Base64 bytes, the decoded string and the URL in memory at once.
+
+# So:
+#     * The URL, including its "data:...;base64," prefix, is written into one buffer chunk by chunk and decoded to a string once;
+#           the buffer and the string coexist only while it's decoded, and the file's bytes are never held as a whole
+#     * Optionally, the images are downsampled to the resolution the model actually sees before they are encoded
+#     * Optionally, the URLs can be cached with ImageDataUrlCache when the same images are sent again and again (for example, when asking about them in a conversation)
+
+# How images are resized for the model:
+#     * "low": 512x512
+#     * "high": Scaled to fit within 2048x2048 and then so that the shorter side is 768 pixels
+# https://platform.openai.com/docs/guides/vision/calculating-costs
+
+# For "auto", the model decides, so we can only safely apply the limits of "high".
+
+VISION_LOW_DETAIL_SIZE = 512
+VISION_HIGH_DETAIL_MAX_SIZE = 2048
+VISION_HIGH_DETAIL_SHORTER_SIDE = 768
+
+# Must be a multiple of 3 so that the chunks' Base64 strings can be concatenated without padding in between.
+BASE64_ENCODING_CHUNK_SIZE = 3 * 256 * 1024
+
+def get_vision_target_size(width, height, detail: VisionDetail | None):
+    ''' Returns the size the image will be resized to by the model, which is never larger than the original. '''
+
+    if detail == VisionDetail.LOW:
+        scale = min(1, VISION_LOW_DETAIL_SIZE / max(width, height))
+
+    else:
+        scale = min(1, VISION_HIGH_DETAIL_MAX_SIZE / max(width, height))
+        # Then, the shorter side is scaled down to 768 pixels if it's longer.
+        scale *= min(1, VISION_HIGH_DETAIL_SHORTER_SIDE / (min(width, height) * scale))
+
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def is_pillow_available():
+    # Pillow is optional; without it, images are sent as they are.
+    return importlib.util.find_spec("PIL") is not None
+
+def _create_data_url_from_stream(mimetype, stream: typing.BinaryIO):
+    # https://docs.python.org/3/library/base64.html
+    buffer = bytearray(f"data:{mimetype};base64,".encode("ascii"))
+
+    while chunk := stream.read(BASE64_ENCODING_CHUNK_SIZE):
+        buffer += base64.b64encode(chunk)
+
+    return buffer.decode("ascii")
+
+# The formats the vision models accept; others are converted to PNG.
+# https://platform.openai.com/docs/guides/vision/what-type-of-files-can-i-upload
+VISION_IMAGE_FORMATS = ["JPEG", "PNG", "GIF", "WEBP"]
+
+def _downsample_image(file_path, detail: VisionDetail | None):
+    ''' Returns the mimetype and the re-encoded bytes, or None if the image is already small enough or re-encoding it wouldnt make the file smaller. '''
+
+    import PIL.Image # pip install pillow # pylint: disable = import-outside-toplevel
+
+    with PIL.Image.open(file_path) as image:
+        target_size = get_vision_target_size(image.width, image.height, detail)
+
+        if target_size == image.size:
+            return None
+
+        image_format = image.format if image.format in VISION_IMAGE_FORMATS else "PNG"
+        resized_image = image.resize(target_size, PIL.Image.Resampling.LANCZOS)
+
+    # The original format is kept; a photo re-encoded as PNG could be larger than the original JPEG or WebP.
+    # Animated GIFs lose their frames here, but only the first one is looked at anyway.
+    with io.BytesIO() as stream:
+        if image_format == "JPEG":
+            resized_image.convert("RGB").save(stream, format = "JPEG", quality = 90)
+
+        else:
+            resized_image.save(stream, format = image_format)
+
+        bytes_ = stream.getvalue()
+
+    # Fewer pixels dont always mean fewer bytes, for example, with a heavily compressed original.
+    if len(bytes_) >= os.path.getsize(file_path):
+        return None
+
+    return PIL.Image.MIME[image_format], bytes_
+
+# Opt-in, like ResponseCache.
+# The URLs are large, so the default limit is kept small.
+
+DEFAULT_IMAGE_DATA_URL_CACHE_MAX_TOTAL_SIZE = 8 * 1024 * 1024 # In characters.
+
+class ImageDataUrlCache:
+    ''' Keeps the least recently used data URLs within "max_total_size" characters. '''
+
+    def __init__(self, max_total_size = DEFAULT_IMAGE_DATA_URL_CACHE_MAX_TOTAL_SIZE):
+        self.max_total_size = max_total_size
+
+        self.data_urls: collections.OrderedDict[tuple, str] = collections.OrderedDict()
+        self.total_size = 0
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(image_file_path, detail: VisionDetail | None):
+        # If the file has been modified, its modification time and/or size should change.
+        stat = os.stat(image_file_path)
+        return (os.path.abspath(image_file_path), stat.st_mtime_ns, stat.st_size, detail)
+
+    def read(self, key):
+        with self.lock:
+            data_url = self.data_urls.get(key)
+
+            if data_url is not None:
+                self.data_urls.move_to_end(key)
+
+            return data_url
+
+    def write(self, key, data_url):
+        # A URL larger than the whole cache would only evict everything else.
+        if len(data_url) > self.max_total_size:
+            return
+
+        with self.lock:
+            if key in self.data_urls:
+                return
+
+            self.data_urls[key] = data_url
+            self.total_size += len(data_url)
+
+            while self.total_size > self.max_total_size:
+                _, evicted_data_url = self.data_urls.popitem(last = False)
+                self.total_size -= len(evicted_data_url)
+
+    def clear(self):
+        with self.lock:
+            self.data_urls.clear()
+            self.total_size = 0
+
+def create_image_data_url(image_file_path, detail: VisionDetail | None = None, downsample = False, cache: ImageDataUrlCache | None = None):
+    ''' If "downsample" is True and Pillow is installed, the image is resized to what the model would see with "detail". '''
+
+    downsample = downsample and is_pillow_available()
+
+    key = ImageDataUrlCache.get_key(image_file_path, detail if downsample else None) if cache is not None else None
+
+    if cache is not None:
+        data_url = cache.read(key)
+
+        if data_url is not None:
+            return data_url
+
+    downsampled = _downsample_image(image_file_path, detail) if downsample else None
+
+    if downsampled:
+        mimetype, bytes_ = downsampled
+
+        with io.BytesIO(bytes_) as stream:
+            data_url = _create_data_url_from_stream(mimetype, stream)
+
+    else:
+        # https://docs.python.org/3/library/mimetypes.html
+        mimetype = mimetypes.guess_type(image_file_path)[0]
+
+        with open(image_file_path, "rb") as file:
+            data_url = _create_data_url_from_stream(mimetype, file)
+
+    if cache is not None:
+        cache.write(key, data_url)
+
+    return data_url
+
 def build_messages_for_vision(image_file_paths, user_message,
                                      detail: VisionDetail | None = None,
-                                     system_message = None):
+                                     system_message = None,
+                                     downsample = False,
+                                     cache: ImageDataUrlCache | None = None):
     messages = []
 
     if system_message:
@@ -714,23 +1967,17 @@ def build_messages_for_vision(image_file_paths, user_message,
     })
 
     for image_file_path in image_file_paths:
-        with open(image_file_path, "rb") as image_file:
-            # https://docs.python.org/3/library/mimetypes.html
-            mimetype = mimetypes.guess_type(image_file_path)[0]
-            # https://docs.python.org/3/library/base64.html
-            base64_str = base64.b64encode(image_file.read()).decode("ascii")
-
-            image_url = {}
+        image_url = {}
 
-            image_url["url"] = f"data:{mimetype};base64,{base64_str}"
+        image_url["url"] = create_image_data_url(image_file_path, detail = detail, downsample = downsample, cache = cache)
 
-            if detail:
-                image_url["detail"] = detail.value
+        if detail:
+            image_url["detail"] = detail.value
 
-            content.append({
-                "type": "image_url",
-                "image_url": image_url
-            })
+        content.append({
+            "type": "image_url",
+            "image_url": image_url
+        })
 
     messages.append({
         "role": Role.USER.value,
@@ -763,13 +2010,61 @@ class ImageStyle(enum.Enum):
     NATURAL = "natural"
     VIVID = "vivid"
 
-# Used internally.
 # It's more like how the image is returned, but I like the simplicity of the name.
+# URL is the default; with B64_JSON, the images come in the response itself and dont have to be downloaded.
 class ImageFormat(enum.Enum):
     B64_JSON = "b64_json"
     URL = "url"
 
-def save_images(file_path, response):
+# When "n" is greater than 1, the images are downloaded concurrently.
+# Downloading is I/O-bound and the connections come from the shared pool, so a few threads are just enough.
+DEFAULT_MAX_DOWNLOAD_WORKERS = 4
+
+# I've seen 8192 in a lot of places.
+# https://stackoverflow.com/questions/2811006/what-is-a-good-buffer-size-for-socket-programming
+# Generated images are a few megabytes each, so larger chunks mean fewer writes and fewer Python-level iterations.
+# The chunk size is adapted to "Content-Length" (if known) within this range.
+MIN_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Must be a multiple of 4 so that each slice of a Base64 string decodes on its own.
+BASE64_DECODING_CHUNK_SIZE = 1024 * 1024
+
+def _get_download_chunk_size(content_length):
+    if not content_length:
+        return MIN_DOWNLOAD_CHUNK_SIZE
+
+    # Roughly 16 writes per file.
+    return max(MIN_DOWNLOAD_CHUNK_SIZE, min(MAX_DOWNLOAD_CHUNK_SIZE, int(content_length) // 16))
+
+def _download_image(url, file_path):
+    # The images are downloaded through the shared connection pool.
+    with get_default_http_client().stream("GET", url, timeout = pweb.DEFAULT_TIMEOUT) as downloader:
+        downloader.raise_for_status()
+
+        pfs.create_parent_directory(file_path)
+
+        with open(file_path, "wb") as file:
+            for chunk in downloader.iter_bytes(chunk_size = _get_download_chunk_size(downloader.headers.get("content-length"))):
+                file.write(chunk)
+
+def _decode_image(b64_json, file_path):
+    pfs.create_parent_directory(file_path)
+
+    # Decoding the whole string at once would keep both the string and the decoded bytes in memory.
+    # Decoding it slice by slice writes the bytes as they are produced.
+    with open(file_path, "wb") as file:
+        for index in range(0, len(b64_json), BASE64_DECODING_CHUNK_SIZE):
+            file.write(base64.b64decode(b64_json[index:index + BASE64_DECODING_CHUNK_SIZE]))
+
+def _save_image(image, file_path):
+    if image.b64_json:
+        _decode_image(image.b64_json, file_path)
+
+    else:
+        _download_image(image.url, file_path)
+
+def save_images(file_path, response, max_workers = None):
     ''' Returns a list of file paths. '''
 
     file_paths = []
@@ -781,29 +2076,30 @@ def save_images(file_path, response):
     # https://github.com/openai/openai-python/blob/main/src/openai/types/images_response.py
     # https://github.com/openai/openai-python/blob/main/src/openai/types/image.py
 
-    for index, image in enumerate(response.data):
+    for index in range(len(response.data)):
         if index == 0:
-            new_file_path = file_path
+            file_paths.append(file_path)
 
         else:
-            new_file_path = os.path.join(dirname, f"{root}-{index}{extension}")
+            file_paths.append(os.path.join(dirname, f"{root}-{index}{extension}"))
+
+    if len(response.data) <= 1:
+        for image, new_file_path in zip(response.data, file_paths):
+            _save_image(image, new_file_path)
 
-        with requests.get(image.url, stream = True, timeout = pweb.DEFAULT_TIMEOUT) as downloader:
-            # If it fails with the second image, the user might leave the first one on the disk.
-            # I will not take care of that for 2 reasons:
-            #     1. If the first one was saved, the rest should usually be saved as well
-            #     2. DALL-E-3 can generate only 1 image at a time
-            downloader.raise_for_status()
+        return file_paths
 
-            pfs.create_parent_directory(new_file_path)
+    # If it fails with one of the images, the user might leave the others on the disk.
+    # I will not take care of that for 2 reasons:
+    #     1. If one was saved, the rest should usually be saved as well
+    #     2. DALL-E-3 can generate only 1 image at a time
+    # All the downloads are waited for and then the first exception (in the order of the images) is raised.
 
-            with open(new_file_path, "wb") as file:
-                # I've seen 8192 in a lot of places.
-                # https://stackoverflow.com/questions/2811006/what-is-a-good-buffer-size-for-socket-programming
-                for chunk in downloader.iter_content(chunk_size = 8192):
-                    file.write(chunk)
+    with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(response.data), max_workers or DEFAULT_MAX_DOWNLOAD_WORKERS)) as executor:
+        futures = [executor.submit(_save_image, image, new_file_path) for image, new_file_path in zip(response.data, file_paths)]
 
-        file_paths.append(new_file_path)
+    for future in futures:
+        future.result()
 
     return file_paths
 
@@ -821,7 +2117,8 @@ def generate_images(
 
     # Optional settings:
     client: openai.OpenAI | None = None,
-    timeout = None):
+    timeout = None,
+    response_format: ImageFormat | None = None): # URL if None.
 
     ''' Returns a list of file paths. '''
 
@@ -841,7 +2138,7 @@ def generate_images(
 
     # This is a one-liner.
     # It takes care of saving the images as well.
-    args.must_contain_enum_value("response_format", ImageFormat.URL)
+    args.must_contain_enum_value("response_format", response_format or ImageFormat.URL)
 
     return putility.get_not_none_or_call_func(get_default_client, client).images.generate(**args.args) # pylint: disable = missing-kwoa
 
@@ -867,7 +2164,8 @@ def edit_image(
 
     # Optional settings:
     client: openai.OpenAI | None = None,
-    timeout = None):
+    timeout = None,
+    response_format: ImageFormat | None = None): # URL if None.
 
     ''' Returns a list of file paths. '''
 
@@ -885,7 +2183,7 @@ def edit_image(
         if timeout:
             args.must_contain("timeout", timeout)
 
-        args.must_contain_enum_value("response_format", ImageFormat.URL)
+        args.must_contain_enum_value("response_format", response_format or ImageFormat.URL)
 
         if mask_file_path:
             with open(mask_file_path, "rb") as mask_file:
@@ -916,7 +2214,8 @@ def create_image_variations(
 
     # Optional settings:
     client: openai.OpenAI | None = None,
-    timeout = None):
+    timeout = None,
+    response_format: ImageFormat | None = None): # URL if None.
 
     ''' Returns a list of file paths. '''
 
@@ -933,6 +2232,451 @@ def create_image_variations(
         if timeout:
             args.must_contain("timeout", timeout)
 
-        args.must_contain_enum_value("response_format", ImageFormat.URL)
+        args.must_contain_enum_value("response_format", response_format or ImageFormat.URL)
 
         return putility.get_not_none_or_call_func(get_default_client, client).images.create_variation(**args.args) # pylint: disable = missing-kwoa
+
+# ------------------------------------------------------------------------------
+#     Request executor
+# ------------------------------------------------------------------------------
+
+# Sending many requests one at a time leaves most of the time to waiting for responses.
+# RequestExecutor runs them on a bounded thread pool, keeps the numbers of requests and tokens per minute within the given budgets
+#     and retries the ones that have failed because of rate limits or server errors.
+
+# https://platform.openai.com/docs/guides/rate-limits
+# https://platform.openai.com/docs/guides/error-codes
+
+# The rate limits depend on the account's usage tier and the model, so there are no default budgets.
+# The client itself retries some errors (2 times by default) without knowing anything about our budgets.
+# Our retries come on top of them; a client created with "max_retries = 0" leaves retrying entirely to the executor.
+
+# Every attempt, including each retry, takes a request from "requests_per_minute"
+#     because the API counts failed requests against the requests-per-minute limit too.
+# Otherwise, the limiter would undercount exactly when the account is being throttled and invite more 429s.
+# The estimated tokens are charged only with the first attempt; a job's retries dont generate more tokens than the job itself.
+
+DEFAULT_MAX_REQUEST_WORKERS = 8
+DEFAULT_MAX_REQUEST_RETRIES = 5
+
+# In seconds.
+DEFAULT_RETRY_BASE_DELAY = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+
+RATE_LIMIT_WINDOW = 60 # In seconds.
+
+class RateLimiter:
+    ''' Keeps the numbers of requests and tokens sent within any 60-second window under the budgets. '''
+
+    def __init__(self, requests_per_minute = None, tokens_per_minute = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        # The time and the number of tokens of each request sent within the window, oldest first.
+        self.history: collections.deque[tuple[float, int]] = collections.deque()
+        self.total_tokens = 0
+
+        self.lock = threading.Lock()
+
+    def _get_wait_time(self, tokens, now):
+        while self.history and now - self.history[0][0] >= RATE_LIMIT_WINDOW:
+            _, old_tokens = self.history.popleft()
+            self.total_tokens -= old_tokens
+
+        wait_time = 0
+
+        if self.requests_per_minute is not None and len(self.history) >= self.requests_per_minute:
+            # We must wait until enough requests have left the window to make room for one more.
+            wait_time = self.history[len(self.history) - self.requests_per_minute][0] + RATE_LIMIT_WINDOW - now
+
+        if self.tokens_per_minute is not None and self.total_tokens + tokens > self.tokens_per_minute:
+            # A request that is larger than the whole budget would never fit; it's sent when the window is empty.
+            tokens_to_release = self.total_tokens + min(tokens, self.tokens_per_minute) - self.tokens_per_minute
+            released_tokens = 0
+
+            for time_, old_tokens in self.history:
+                released_tokens += old_tokens
+
+                if released_tokens >= tokens_to_release:
+                    wait_time = max(wait_time, time_ + RATE_LIMIT_WINDOW - now)
+                    break
+
+        return wait_time
+
+    def acquire(self, tokens = 0):
+        ''' Blocks until a request with "tokens" can be sent and records it. '''
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait_time = self._get_wait_time(tokens, now)
+
+                if wait_time <= 0:
+                    self.history.append((now, tokens))
+                    self.total_tokens += tokens
+                    return
+
+            # Other threads may acquire in the meantime; we'll just check again.
+            time.sleep(wait_time)
+
+def is_retryable_error(exception: Exception):
+    # "insufficient_quota" also comes with 429, but waiting wont fix it.
+    if getattr(exception, "code", None) == "insufficient_quota":
+        return False
+
+    # Includes APITimeoutError.
+    if isinstance(exception, openai.APIConnectionError):
+        return True
+
+    if isinstance(exception, openai.APIStatusError):
+        return exception.status_code == 429 or exception.status_code >= 500
+
+    return False
+
+def get_retry_delay(exception: Exception, attempt, base_delay = DEFAULT_RETRY_BASE_DELAY, max_delay = DEFAULT_RETRY_MAX_DELAY):
+    ''' "attempt" starts from 0. Returns the delay in seconds. '''
+
+    # If the server tells us how long to wait, that's the most reliable value.
+    response = getattr(exception, "response", None)
+
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+
+        if retry_after:
+            try:
+                return min(float(retry_after), max_delay)
+
+            except ValueError:
+                # It may be an HTTP date, which we dont bother to parse.
+                pass
+
+    # Exponential backoff with "full jitter" so that the threads that have failed at the same time dont retry at the same time.
+    # https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+class RequestJob:
+    def __init__(
+        self,
+
+        # A function like "create_chat_completions" and its keyword arguments.
+        func: typing.Callable[..., typing.Any],
+        kwargs: dict[str, typing.Any] | None = None,
+
+        # Counted against "tokens_per_minute".
+        estimated_tokens = 0):
+
+        self.func = func
+        self.kwargs = kwargs or {}
+        self.estimated_tokens = estimated_tokens
+
+        # Set when the job has been completed:
+        self.result: typing.Any = None
+        self.exception: Exception | None = None
+        self.number_of_attempts = 0
+
+    @property
+    def is_successful(self):
+        return self.number_of_attempts > 0 and self.exception is None
+
+def estimate_chat_completions_tokens(messages, max_tokens = None, token_counter: TokenCounter | None = None):
+    ''' Counts the text contents of the messages and adds "max_tokens", which the API also counts against the rate limit. '''
+
+    token_counter_to_use = putility.get_not_none_or_call_func(get_default_token_counter, token_counter)
+
+    tokens = 0
+
+    for message in messages:
+        content = message.get("content")
+
+        # The contents of vision messages are lists; their images arent counted.
+        if isinstance(content, str):
+            tokens += token_counter_to_use.count(content)
+
+        elif isinstance(content, list):
+            tokens += sum(token_counter_to_use.count(part["text"]) for part in content if part.get("type") == "text")
+
+    return tokens + (max_tokens or 0)
+
+def create_chat_completions_job(model: Model, messages, token_counter: TokenCounter | None = None, **kwargs):
+    ''' "kwargs" are passed to "create_chat_completions". '''
+
+    return RequestJob(
+        func = create_chat_completions,
+        kwargs = {"model": model, "messages": messages, **kwargs},
+        estimated_tokens = estimate_chat_completions_tokens(messages, max_tokens = kwargs.get("max_tokens"), token_counter = token_counter))
+
+def create_audio_speech_job(input_, model: Model, voice: Voice, response_format: AudioFormat, **kwargs):
+    ''' "kwargs" are passed to "create_audio_speech". '''
+
+    # Speech is limited by requests, not by tokens.
+    return RequestJob(
+        func = create_audio_speech,
+        kwargs = {"input_": input_, "model": model, "voice": voice, "response_format": response_format, **kwargs})
+
+def generate_images_job(model: Model, prompt, **kwargs):
+    ''' "kwargs" are passed to "generate_images". '''
+
+    return RequestJob(
+        func = generate_images,
+        kwargs = {"model": model, "prompt": prompt, **kwargs})
+
+class RequestExecutor:
+    def __init__(
+        self,
+
+        max_workers = DEFAULT_MAX_REQUEST_WORKERS,
+        requests_per_minute = None, # No limit.
+        tokens_per_minute = None, # No limit.
+        max_retries = DEFAULT_MAX_REQUEST_RETRIES,
+        retry_base_delay = DEFAULT_RETRY_BASE_DELAY,
+        retry_max_delay = DEFAULT_RETRY_MAX_DELAY):
+
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        # Shared by all the "run" calls so that consecutive batches stay within the budgets together.
+        self.rate_limiter = RateLimiter(requests_per_minute = requests_per_minute, tokens_per_minute = tokens_per_minute)
+
+    def run_job(self, job: RequestJob):
+        ''' Runs the job in the calling thread, retrying it if necessary. Sets either "result" or "exception". '''
+
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire(job.estimated_tokens if attempt == 0 else 0)
+            job.number_of_attempts += 1
+
+            try:
+                job.result = job.func(**job.kwargs)
+                job.exception = None
+                return job
+
+            except Exception as exception: # pylint: disable = broad-except
+                job.exception = exception
+
+                if attempt >= self.max_retries or not is_retryable_error(exception):
+                    return job
+
+            time.sleep(get_retry_delay(job.exception, attempt, base_delay = self.retry_base_delay, max_delay = self.retry_max_delay))
+            attempt += 1
+
+    def run(self, jobs: list[RequestJob], on_completed: typing.Callable[[RequestJob], None] | None = None):
+        '''
+            Runs the jobs concurrently on up to "max_workers" threads and returns them in the order they were given.
+            A failed job doesnt stop the others; either "result" or "exception" is set to each job.
+            "on_completed" is called in the calling thread as each job completes.
+        '''
+
+        if not jobs:
+            return jobs
+
+        preload_default_client(job.kwargs.get("client") for job in jobs if job.func in (create_chat_completions, create_audio_speech, generate_images))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(jobs), self.max_workers or DEFAULT_MAX_REQUEST_WORKERS)) as executor:
+            futures = [executor.submit(self.run_job, job) for job in jobs]
+
+            for future in concurrent.futures.as_completed(futures):
+                if on_completed:
+                    on_completed(future.result())
+
+        return jobs
+
+# ------------------------------------------------------------------------------
+#     Batch
+# ------------------------------------------------------------------------------
+
+# For bulk jobs that dont need immediate answers, the Batch API processes a JSONL file of requests within 24 hours
+#     at half the price and with separate, much higher rate limits.
+# https://platform.openai.com/docs/guides/batch
+# https://platform.openai.com/docs/api-reference/batch
+# https://github.com/openai/openai-python/blob/main/src/openai/resources/batches.py
+
+# The workflow:
+#     1. Build a JSONL file from BatchRequest objects, each with a unique "custom_id"
+#     2. Upload it and create a batch
+#     3. Poll the batch until it's done
+#     4. Download the output (and error) files and map the results back to the requests by "custom_id"
+# The results may be in any order.
+
+BATCH_CHAT_COMPLETIONS_ENDPOINT = "/v1/chat/completions"
+DEFAULT_BATCH_COMPLETION_WINDOW = "24h" # The only value supported as of 2024-04.
+DEFAULT_BATCH_POLL_INTERVAL = 30 # In seconds.
+
+BATCH_FINAL_STATUSES = ["cancelled", "completed", "expired", "failed"]
+
+class BatchRequest:
+    def __init__(self, custom_id, settings: ChatSettings, messages):
+        self.custom_id = custom_id
+        self.settings = settings
+        self.messages = messages
+
+    def to_dict(self):
+        # Streaming and timeouts mean nothing in a batch.
+        body = _create_chat_completions_args(
+            model = self.settings.model,
+            messages = self.messages,
+            frequency_penalty = self.settings.frequency_penalty,
+            logit_bias = self.settings.logit_bias,
+            logprobs = self.settings.logprobs,
+            top_logprobs = self.settings.top_logprobs,
+            max_tokens = self.settings.max_tokens,
+            n = self.settings.n,
+            presence_penalty = self.settings.presence_penalty,
+            response_format = self.settings.response_format,
+            seed = self.settings.seed,
+            stop = self.settings.stop,
+            temperature = self.settings.temperature,
+            top_p = self.settings.top_p,
+            user = self.settings.user)
+
+        return {
+            "custom_id": self.custom_id,
+            "method": "POST",
+            "url": BATCH_CHAT_COMPLETIONS_ENDPOINT,
+            "body": body
+        }
+
+class BatchResult:
+    def __init__(self, custom_id, response: openai.types.chat.ChatCompletion | None, status_code = None, error = None):
+        self.custom_id = custom_id
+
+        # Set if the request has succeeded.
+        self.response = response
+
+        # The HTTP status code of the request and/or the error object as a dictionary.
+        self.status_code = status_code
+        self.error = error
+
+    @property
+    def is_successful(self):
+        return self.response is not None
+
+def build_batch_jsonl(requests: list[BatchRequest]):
+    custom_ids = set()
+
+    for request in requests:
+        if request.custom_id in custom_ids:
+            raise perrors.ArgumentError(f"Duplicate custom_id: {request.custom_id}")
+
+        custom_ids.add(request.custom_id)
+
+    return "".join(f"{json.dumps(request.to_dict(), ensure_ascii = False)}\n" for request in requests)
+
+def write_batch_file(file_path, requests: list[BatchRequest]):
+    pfs.create_parent_directory(file_path)
+
+    # Without a BOM; each line must be a JSON object.
+    pfs.write_all_text_to_file(file_path, build_batch_jsonl(requests), write_bom = False)
+
+    return file_path
+
+def submit_batch(
+    file_path,
+
+    # Optional parameters:
+    completion_window = DEFAULT_BATCH_COMPLETION_WINDOW,
+    metadata = None,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None):
+
+    ''' Uploads the JSONL file and creates a batch. Returns the Batch object. '''
+
+    client_to_use = putility.get_not_none_or_call_func(get_default_client, client)
+
+    with open(file_path, "rb") as file:
+        input_file = client_to_use.files.create(file = file, purpose = "batch")
+
+    args = pcollections.PotentiallyFalsyArgs()
+    args.must_contain("input_file_id", input_file.id)
+    args.must_contain("endpoint", BATCH_CHAT_COMPLETIONS_ENDPOINT)
+    args.must_contain("completion_window", completion_window)
+    args.may_contain("metadata", metadata)
+
+    return client_to_use.batches.create(**args.args) # pylint: disable = missing-kwoa
+
+def wait_for_batch(
+    batch_id,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    poll_interval = DEFAULT_BATCH_POLL_INTERVAL,
+    timeout = None, # In seconds; no limit if None.
+    on_polled: typing.Callable[[typing.Any], None] | None = None):
+
+    ''' Returns the Batch object once its status is final. Raises TimeoutError if "timeout" elapses first. '''
+
+    client_to_use = putility.get_not_none_or_call_func(get_default_client, client)
+    start = time.monotonic()
+
+    while True:
+        batch = client_to_use.batches.retrieve(batch_id)
+
+        if on_polled:
+            on_polled(batch)
+
+        if batch.status in BATCH_FINAL_STATUSES:
+            return batch
+
+        if timeout is not None and time.monotonic() - start + poll_interval > timeout:
+            raise TimeoutError(f"Batch {batch_id} is still {batch.status}.")
+
+        time.sleep(poll_interval)
+
+def _read_batch_output_file(client: openai.OpenAI, file_id):
+    if not file_id:
+        return []
+
+    # JSONL lines are separated only by "\n".
+    # str.splitlines would also split at characters like U+2028 and "\x85", which JSON strings may contain unescaped.
+    content = client.files.content(file_id).text
+    return [json.loads(line) for line in content.split("\n") if line.strip()]
+
+def download_batch_results(batch, client: openai.OpenAI | None = None):
+    ''' Returns a dictionary of custom IDs and BatchResult objects, including the failed requests. '''
+
+    client_to_use = putility.get_not_none_or_call_func(get_default_client, client)
+
+    results: dict[str, BatchResult] = {}
+
+    for line in _read_batch_output_file(client_to_use, batch.output_file_id) + _read_batch_output_file(client_to_use, batch.error_file_id):
+        response = line.get("response") or {}
+        status_code = response.get("status_code")
+        body = response.get("body")
+        error = line.get("error") or (body.get("error") if isinstance(body, dict) else None)
+
+        if status_code == 200 and body and not error:
+            results[line["custom_id"]] = BatchResult(line["custom_id"], openai.types.chat.ChatCompletion.model_validate(body), status_code = status_code)
+
+        else:
+            results[line["custom_id"]] = BatchResult(line["custom_id"], None, status_code = status_code, error = error)
+
+    return results
+
+def run_batch(
+    requests: list[BatchRequest],
+
+    # Where the JSONL file is written.
+    file_path,
+
+    # Optional settings:
+    client: openai.OpenAI | None = None,
+    poll_interval = DEFAULT_BATCH_POLL_INTERVAL,
+    timeout = None,
+    on_polled: typing.Callable[[typing.Any], None] | None = None):
+
+    '''
+        Writes, submits and waits for the batch, and returns the results in the order of the requests.
+        A request that has no result (for example, because the batch has expired) gets a BatchResult with neither "response" nor "error".
+    '''
+
+    write_batch_file(file_path, requests)
+
+    batch = submit_batch(file_path, client = client)
+    batch = wait_for_batch(batch.id, client = client, poll_interval = poll_interval, timeout = timeout, on_polled = on_polled)
+
+    results = download_batch_results(batch, client = client)
+
+    return [results.get(request.custom_id) or BatchResult(request.custom_id, None) for request in requests]
@@ -3,6 +3,7 @@
 
 import pyddle_console as pconsole
 import pyddle_logging as plogging
+import pyddle_string as pstring
 
 # These methods assume "str" is a raw string, meaning it has to be output as-is.
 # If "str" is falsy, "indents" wont be output, but "end" will be.
@@ -24,6 +25,9 @@ def print_and_log(str_: str | None, indents = "", colors = "", end = "\n", flush
 
 # If #2 is falsy, "indents", the indentation and trailing whitespace parts of #2 and "trailing" wont be output, but "end" will be.
 
+# Each line is split only once; the offsets of the parts are shared by the console and the log file.
+
 def print_and_log_lines(str_: list[str] | None, indents = "", colors: list[str] | None = None, trailing = "", end = "\n", flush = False):
-    pconsole.print_lines(str_, indents = indents, colors = colors, trailing = trailing, end = end)
-    plogging.log_lines(str_, indents = indents, trailing = trailing, end = end, flush_ = flush)
+    line_part_offsets = [pstring.get_line_part_offsets(line) for line in str_] if str_ else None
+    pconsole.print_lines(str_, indents = indents, colors = colors, trailing = trailing, end = end, line_part_offsets = line_part_offsets)
+    plogging.log_lines(str_, indents = indents, trailing = trailing, end = end, flush_ = flush, line_part_offsets = line_part_offsets)
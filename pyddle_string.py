@@ -1,7 +1,11 @@
 ﻿# Created: 2024-03-05
 # This script contains string-related functions.
 
+import io
 import re
+import threading
+import time
+import typing
 import unicodedata
 
 import pyddle_errors as perrors
@@ -40,6 +44,126 @@ def to_visible_str(str_):
 
     return str_
 
+# ------------------------------------------------------------------------------
+#     Regex registry
+# ------------------------------------------------------------------------------
+
+# Some regexes used to be left uncompiled because they were used infrequently,
+#     but, for example, reading the AssemblyInfo.cs files of hundreds of projects line by line calls them thousands of times
+#     and, mixed with other patterns, the re module's internal cache may have to compile them again.
+# Regexes that are used repeatedly should be compiled once and registered by name with register_regex.
+
+# When instrumentation is enabled, each registered regex counts its calls and the time spent in them.
+# While it's disabled (by default), the methods of a registered regex are those of the compiled regex itself and there's no overhead.
+# The time of finditer includes only the creation of the iterator.
+
+REGEX_METHOD_NAMES = ["match", "fullmatch", "search", "findall", "finditer", "sub", "split"]
+
+class RegisteredRegex:
+    def __init__(self, name, pattern, flags = 0):
+        self.name = name
+        self.pattern = pattern
+        self.flags = flags
+        self.regex = re.compile(pattern, flags)
+
+        self.call_count = 0
+        self.total_elapsed_time = 0.0 # In seconds.
+
+        self.__lock = threading.Lock()
+
+        # Replaced by set_instrumentation.
+        self.match = self.regex.match
+        self.fullmatch = self.regex.fullmatch
+        self.search = self.regex.search
+        self.findall = self.regex.findall
+        self.finditer = self.regex.finditer
+        self.sub = self.regex.sub
+        self.split = self.regex.split
+
+    def __instrument(self, method):
+        def instrumented_method(*args, **kwargs):
+            start = time.perf_counter()
+
+            try:
+                return method(*args, **kwargs)
+
+            finally:
+                elapsed_time = time.perf_counter() - start
+
+                with self.__lock:
+                    self.call_count += 1
+                    self.total_elapsed_time += elapsed_time
+
+        return instrumented_method
+
+    def set_instrumentation(self, enabled):
+        for method_name in REGEX_METHOD_NAMES:
+            method = getattr(self.regex, method_name)
+            setattr(self, method_name, self.__instrument(method) if enabled else method)
+
+    def reset_statistics(self):
+        with self.__lock:
+            self.call_count = 0
+            self.total_elapsed_time = 0.0
+
+__regex_registry: dict[str, RegisteredRegex] = {} # pylint: disable = invalid-name
+__regex_registry_lock = threading.Lock() # pylint: disable = invalid-name
+__regex_instrumentation_enabled = False # pylint: disable = invalid-name
+
+def register_regex(name, pattern, flags = 0):
+    ''' Returns the already registered regex if the same pattern and flags have been registered with the name. '''
+
+    with __regex_registry_lock:
+        registered_regex = __regex_registry.get(name)
+
+        if registered_regex:
+            if registered_regex.pattern != pattern or registered_regex.flags != flags:
+                raise perrors.InvalidOperationError(f"Another regex is registered as {name}.")
+
+            return registered_regex
+
+        registered_regex = RegisteredRegex(name, pattern, flags)
+
+        if __regex_instrumentation_enabled:
+            registered_regex.set_instrumentation(True)
+
+        __regex_registry[name] = registered_regex
+
+        return registered_regex
+
+def get_regex(name):
+    ''' Returns None if no regex is registered with the name. '''
+
+    return __regex_registry.get(name)
+
+def get_registered_regexes():
+    with __regex_registry_lock:
+        return list(__regex_registry.values())
+
+def is_regex_instrumentation_enabled():
+    return __regex_instrumentation_enabled
+
+def enable_regex_instrumentation(enabled = True):
+    global __regex_instrumentation_enabled # pylint: disable = global-statement
+
+    with __regex_registry_lock:
+        __regex_instrumentation_enabled = enabled
+
+        for registered_regex in __regex_registry.values():
+            registered_regex.set_instrumentation(enabled)
+
+def reset_regex_statistics():
+    for registered_regex in get_registered_regexes():
+        registered_regex.reset_statistics()
+
+def regex_statistics_to_lines(include_unused = False):
+    ''' Returns a line for each registered regex, the most time-consuming first. '''
+
+    registered_regexes = [registered_regex for registered_regex in get_registered_regexes() if include_unused or registered_regex.call_count > 0]
+    registered_regexes.sort(key = lambda registered_regex: registered_regex.total_elapsed_time, reverse = True)
+
+    return [f"{registered_regex.name}: {registered_regex.call_count} calls ({registered_regex.total_elapsed_time * 1000:.3f} ms)" for registered_regex in registered_regexes]
+
 # ------------------------------------------------------------------------------
 #     Equality
 # ------------------------------------------------------------------------------
@@ -80,7 +204,26 @@ def equals_casefold(str1, str2):
         else:
             return True
 
+# The keys under which strings are stored and looked up case-insensitively in sets, dictionaries and lookup tables.
+# Like equals_ignore_case/equals_casefold, None and "" are considered equal.
+
+def to_ignore_case_key(str_):
+    return str_.lower() if str_ else ""
+
+def to_casefold_key(str_):
+    return str_.casefold() if str_ else ""
+
+# contains_* compare the string with each item, converting both of them every time.
+# When the same list is checked many times (like ignored file/directory names while walking a directory tree),
+#     wrap it in pyddle_collections.CaseInsensitiveSet once; the converted keys are computed in advance and looked up in O(1).
+# contains_* accept it (and built-in sets for "contains") in place of lists.
+
+# pyddle_collections imports this module, so its collections are recognized by the key functions they use rather than by their types.
+
 def contains(str_array, str_):
+    if isinstance(str_array, (set, frozenset)):
+        return str_ in str_array
+
     for item in str_array:
         if equals(item, str_):
             return True
@@ -88,6 +231,10 @@ def contains(str_array, str_):
     return False
 
 def contains_ignore_case(str_array, str_):
+    # A casefolding collection is iterated instead because casefolding matches more strings than lowercasing (like "ß" and "ss").
+    if getattr(str_array, "to_key", None) is to_ignore_case_key:
+        return str_ in str_array
+
     for item in str_array:
         if equals_ignore_case(item, str_):
             return True
@@ -95,6 +242,9 @@ def contains_ignore_case(str_array, str_):
     return False
 
 def contains_casefold(str_array, str_):
+    if getattr(str_array, "to_key", None) is to_casefold_key:
+        return str_ in str_array
+
     for item in str_array:
         if equals_casefold(item, str_):
             return True
@@ -223,63 +373,137 @@ def index_of_ignore_case(str_, substring):
 def index_of_casefold(str_, substring):
     return str_.casefold().find(substring.casefold())
 
-def index_of_any(str_, substrings):
+# index_of_any and last_index_of_any used to check every substring at every index in Python, calling equals_at each time.
+# Now, for forward searching, the substrings are compiled into one regex (cached per set of substrings) that scans the string at native speed.
+# For backward searching, the regex module cant search from the end, so str.rfind is called once per substring and the maximum index is returned.
+
+# The "_ignore_case" and "_casefold" versions convert the string and the substrings once and search the converted string.
+# The indices are valid only if the conversion hasnt changed any lengths,
+#     and str.lower converts "Σ" to "ς" at the end of a word, which a substring converted alone wouldnt match,
+#     so, in such rare cases, the original comparison at each index is used.
+
+# There are usually only a few sets of substrings (like ["\\", "/"] in pyddle_path), but the cache is cleared when it grows too much.
+MAX_SUBSTRING_SEARCHER_CACHE_SIZE = 256
+
+# Keys: (convert, substrings) where "convert" is None, str.lower or str.casefold.
+# Values: (converted_substrings, regex) where "converted_substrings" is None if the conversion changes their lengths
+#     and "regex" is None if there are no substrings to look for (an empty regex would match at 0).
+_substring_searcher_cache: dict[tuple[typing.Callable[[str], str] | None, tuple[str, ...]], tuple[tuple[str, ...] | None, re.Pattern | None]] = {}
+
+def _validate_args(str_, substrings):
     # Checking for None, not caching.
     str_length = len(str_)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    substrings = tuple(substrings)
 
-        # Without this block, the next "for" loop will miss the case where one or more of the substrings are ""
-        #     and the edge-of-cliff zero-comparison situation described in pyddle_string.py occurs.
-        # This is a search-forward function; only the minimum index must be considered in edge cases.
-        if substring == "":
-            return 0
+    if None in substrings:
+        raise perrors.ArgumentError("None is not a valid substring.")
 
-    # From now on, no zero-comparison will occur.
-    # We can assume we are looking for something that exists.
+    return str_length, substrings
+
+def _get_substring_searcher(substrings, convert = None):
+    key = (convert, substrings)
+    searcher = _substring_searcher_cache.get(key)
+
+    if searcher is None:
+        if len(_substring_searcher_cache) >= MAX_SUBSTRING_SEARCHER_CACHE_SIZE:
+            _substring_searcher_cache.clear()
+
+        converted_substrings = substrings
+
+        if convert is not None:
+            converted_substrings = tuple(convert(substring) for substring in substrings)
+
+            if any(len(converted_substring) != len(substring) for converted_substring, substring in zip(converted_substrings, substrings)):
+                converted_substrings = None
+
+        regex = re.compile("|".join(re.escape(substring) for substring in converted_substrings)) if converted_substrings else None
+
+        searcher = (converted_substrings, regex)
+        _substring_searcher_cache[key] = searcher
+
+    return searcher
+
+def _convert_str_for_searching(str_, convert):
+    ''' Returns None if the indices in the converted string wouldnt match those in the original string. '''
+
+    if convert is str.lower and "Σ" in str_:
+        return None
+
+    converted_str = convert(str_)
 
-    for index in range(str_length):
+    if len(converted_str) != len(str_):
+        return None
+
+    return converted_str
+
+def _search_forward(str_, regex):
+    if regex is None:
+        return -1
+
+    match = regex.search(str_)
+    return match.start() if match else -1
+
+def _search_backward(str_, substrings):
+    return max(map(str_.rfind, substrings), default = -1)
+
+def _index_of_any_at_each_index(str_, substrings, equals_at_func):
+    for index in range(len(str_)):
+        for substring in substrings:
+            if equals_at_func(str_, index, substring):
+                return index
+
+    return -1
+
+def _last_index_of_any_at_each_index(str_, substrings, equals_at_func):
+    for index in range(len(str_) - 1, -1, -1):
         for substring in substrings:
-            if equals_at(str_, index, substring):
+            if equals_at_func(str_, index, substring):
                 return index
 
     return -1
 
+def index_of_any(str_, substrings):
+    _, substrings = _validate_args(str_, substrings)
+
+    # Without this, the edge-of-cliff zero-comparison situation described in pyddle_string.py would be missed.
+    # This is a search-forward function; only the minimum index must be considered in edge cases.
+    if "" in substrings:
+        return 0
+
+    # From now on, no zero-comparison will occur.
+    # We can assume we are looking for something that exists.
+
+    _, regex = _get_substring_searcher(substrings)
+    return _search_forward(str_, regex)
+
 def index_of_any_ignore_case(str_, substrings):
-    str_length = len(str_)
+    _, substrings = _validate_args(str_, substrings)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    if "" in substrings:
+        return 0
 
-        if substring == "":
-            return 0
+    converted_substrings, regex = _get_substring_searcher(substrings, str.lower)
+    converted_str = _convert_str_for_searching(str_, str.lower) if converted_substrings is not None else None
 
-    for index in range(str_length):
-        for substring in substrings:
-            if equals_at_ignore_case(str_, index, substring):
-                return index
+    if converted_str is None:
+        return _index_of_any_at_each_index(str_, substrings, equals_at_ignore_case)
 
-    return -1
+    return _search_forward(converted_str, regex)
 
 def index_of_any_casefold(str_, substrings):
-    str_length = len(str_)
+    _, substrings = _validate_args(str_, substrings)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    if "" in substrings:
+        return 0
 
-        if substring == "":
-            return 0
+    converted_substrings, regex = _get_substring_searcher(substrings, str.casefold)
+    converted_str = _convert_str_for_searching(str_, str.casefold) if converted_substrings is not None else None
 
-    for index in range(str_length):
-        for substring in substrings:
-            if equals_at_casefold(str_, index, substring):
-                return index
+    if converted_str is None:
+        return _index_of_any_at_each_index(str_, substrings, equals_at_casefold)
 
-    return -1
+    return _search_forward(converted_str, regex)
 
 # I thought about implementing contains_any, but we generally shouldnt implement methods
 #     that just call other methods and (partially) discard the results.
@@ -294,57 +518,42 @@ def last_index_of_casefold(str_, substring):
     return str_.casefold().rfind(substring.casefold())
 
 def last_index_of_any(str_, substrings):
-    str_length = len(str_)
+    str_length, substrings = _validate_args(str_, substrings)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    if "" in substrings:
+        # Not str_length - 1.
+        # "a".rfind("") returns 1.
+        return str_length
 
-        if substring == "":
-            # Not str_length - 1.
-            # "a".rfind("") returns 1.
-            return str_length
-
-    for index in range(str_length - 1, -1, -1):
-        for substring in substrings:
-            if equals_at(str_, index, substring):
-                return index
-
-    return -1
+    return _search_backward(str_, substrings)
 
 def last_index_of_any_ignore_case(str_, substrings):
-    str_length = len(str_)
+    str_length, substrings = _validate_args(str_, substrings)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    if "" in substrings:
+        return str_length
 
-        if substring == "":
-            return str_length
+    converted_substrings, _ = _get_substring_searcher(substrings, str.lower)
+    converted_str = _convert_str_for_searching(str_, str.lower) if converted_substrings is not None else None
 
-    for index in range(str_length - 1, -1, -1):
-        for substring in substrings:
-            if equals_at_ignore_case(str_, index, substring):
-                return index
+    if converted_str is None:
+        return _last_index_of_any_at_each_index(str_, substrings, equals_at_ignore_case)
 
-    return -1
+    return _search_backward(converted_str, converted_substrings)
 
 def last_index_of_any_casefold(str_, substrings):
-    str_length = len(str_)
+    str_length, substrings = _validate_args(str_, substrings)
 
-    for substring in substrings:
-        if substring is None:
-            raise perrors.ArgumentError("None is not a valid substring.")
+    if "" in substrings:
+        return str_length
 
-        if substring == "":
-            return str_length
+    converted_substrings, _ = _get_substring_searcher(substrings, str.casefold)
+    converted_str = _convert_str_for_searching(str_, str.casefold) if converted_substrings is not None else None
 
-    for index in range(str_length - 1, -1, -1):
-        for substring in substrings:
-            if equals_at_casefold(str_, index, substring):
-                return index
+    if converted_str is None:
+        return _last_index_of_any_at_each_index(str_, substrings, equals_at_casefold)
 
-    return -1
+    return _search_backward(converted_str, converted_substrings)
 
 # ------------------------------------------------------------------------------
 #     Multiline strings
@@ -380,28 +589,60 @@ def normalize_lines(lines: list[str], trim_line_start = False, trim_line_end = T
         # We dont need to raise an error just because "lines" is None.
         return []
 
-    if trim_line_start:
-        if trim_line_end:
-            stripped_lines = [line.strip() for line in lines]
+    return list(iterate_normalized_lines(lines, trim_line_start = trim_line_start, trim_line_end = trim_line_end,
+                                         remove_empty_lines_at_start = remove_empty_lines_at_start, remove_redundant_empty_lines = remove_redundant_empty_lines, remove_empty_lines_at_end = remove_empty_lines_at_end))
 
-        else:
-            stripped_lines = [line.lstrip() for line in lines]
+# normalize_lines needed the whole list of lines and made a stripped copy of it before building another list.
+# iterate_normalized_lines consumes any iterable of lines, including a file object, and yields the normalized lines one by one,
+#     so that a large text can be normalized (and written somewhere) without holding all of it in memory.
+# Empty lines are only counted until we know whether they are kept, so the memory usage doesnt grow with the number of them either.
 
-    else:
-        if trim_line_end:
-            stripped_lines = [line.rstrip() for line in lines]
+# Lines read from a file or stream end with the line break that ended them, which is removed even if "trim_line_end" is False.
+# Which characters end the lines depends on the "newline" argument of "open"; by default, only "\n", "\r" and "\r\n" do,
+#     while str.splitlines also splits on characters like "\v", "\f" and "\u2028".
+# The items of any other iterable (like a list) are not lines read from anywhere and are kept as they are.
 
-        else:
-            stripped_lines = lines
+def remove_line_break(line):
+    if line.endswith("\r\n"):
+        return line[:-2]
 
-    new_lines = []
+    if line.endswith(("\n", "\r")):
+        return line[:-1]
+
+    return line
+
+def iterate_normalized_lines(lines: typing.Iterable[str] | None, trim_line_start = False, trim_line_end = True,
+                             remove_empty_lines_at_start = True, remove_redundant_empty_lines = True, remove_empty_lines_at_end = True):
+    ''' Yields the normalized lines like normalize_lines returns them. '''
+
+    if not lines:
+        return
+
+    is_stream = isinstance(lines, io.IOBase)
 
     has_detected_visible_line = False # Whether at least one visible line has ever been detected.
     detected_continuous_empty_line_count = 0
 
-    for stripped_line in stripped_lines:
+    for line in lines:
+        if trim_line_end is False and is_stream:
+            line = remove_line_break(line)
+
+        if trim_line_start:
+            if trim_line_end:
+                stripped_line = line.strip()
+
+            else:
+                stripped_line = line.lstrip()
+
+        else:
+            if trim_line_end:
+                stripped_line = line.rstrip()
+
+            else:
+                stripped_line = line
+
         if not stripped_line:
-            # Empty lines are added when a visible line is detected or at the end.
+            # Empty lines are yielded when a visible line is detected or at the end.
             detected_continuous_empty_line_count += 1
 
         else:
@@ -410,27 +651,25 @@ def normalize_lines(lines: list[str], trim_line_start = False, trim_line_end = T
 
                 if remove_empty_lines_at_start is False:
                     for _ in range(detected_continuous_empty_line_count):
-                        new_lines.append("")
+                        yield ""
 
             else: # Middle part.
                 if detected_continuous_empty_line_count > 0:
                     if remove_redundant_empty_lines:
-                        new_lines.append("")
+                        yield ""
 
                     else:
                         for _ in range(detected_continuous_empty_line_count):
-                            new_lines.append("")
+                            yield ""
 
             detected_continuous_empty_line_count = 0
-            new_lines.append(stripped_line)
+            yield stripped_line
 
     # End part.
     if detected_continuous_empty_line_count > 0:
         if remove_empty_lines_at_end is False:
             for _ in range(detected_continuous_empty_line_count):
-                new_lines.append("")
-
-    return new_lines
+                yield ""
 
 def normalize_multiline_str(str_, trim_line_start = False, trim_line_end = True,
                             remove_empty_lines_at_start = True, remove_redundant_empty_lines = True, remove_empty_lines_at_end = True):
@@ -439,15 +678,16 @@ def normalize_multiline_str(str_, trim_line_start = False, trim_line_end = True,
     if not str_:
         return str_
 
-    return "\n".join(splitlines(str_, trim_line_start, trim_line_end,
-                                remove_empty_lines_at_start, remove_redundant_empty_lines, remove_empty_lines_at_end))
+    # The lines are joined as they are yielded without building another list.
+    return "\n".join(iterate_normalized_lines(str_.splitlines(), trim_line_start, trim_line_end,
+                                              remove_empty_lines_at_start, remove_redundant_empty_lines, remove_empty_lines_at_end))
 
 # ------------------------------------------------------------------------------
 #     Normalization of single line strings
 # ------------------------------------------------------------------------------
 
 # "\s" matches new lines as well.
-COMPILED_REGEX_FOR_NORMALIZE_SINGLELINE_STR = re.compile(r"\s+")
+COMPILED_REGEX_FOR_NORMALIZE_SINGLELINE_STR = register_regex("pyddle_string/normalize_singleline_str", r"\s+")
 
 # This method is often an overkill.
 # It may be useful in a situation where the input string can NEVER contain a line break
@@ -491,6 +731,11 @@ def normalize_singleline_str(str_, trim_start = True, remove_redundant_whitespac
     if not str_:
         return str_
 
+    # str.split without arguments splits the string at runs of the same whitespace chars as "\s" and drops those at both ends,
+    #     which is several times faster than stripping the string and using the regex.
+    if trim_start and remove_redundant_whitespace_chars and trim_end:
+        return " ".join(str_.split())
+
     if trim_start:
         if trim_end:
             new_str = str_.strip()
@@ -511,6 +756,23 @@ def normalize_singleline_str(str_, trim_start = True, remove_redundant_whitespac
     else:
         return new_str
 
+# normalize_singleline_strs normalizes many strings (like titles) at once.
+
+# I tried a single regex pass over the strings joined with a separator (and looked at NumPy's np.char, which calls the str methods for each element),
+#     but most of the time is spent replacing whitespace, not calling the function, and the joined buffer was no faster.
+# What does make a difference is that, with the default options, str.split and str.join do the job several times faster than the regex;
+#     the strings are processed that way, with the options checked only once.
+# The benchmark in test_string.py compares the approaches.
+
+def normalize_singleline_strs(strs, trim_start = True, remove_redundant_whitespace_chars = True, trim_end = True):
+    ''' Returns a list of the strings normalized like normalize_singleline_str. '''
+
+    if trim_start and remove_redundant_whitespace_chars and trim_end:
+        # Falsy strings are returned as-is.
+        return [" ".join(str_.split()) if str_ else str_ for str_ in strs]
+
+    return [normalize_singleline_str(str_, trim_start = trim_start, remove_redundant_whitespace_chars = remove_redundant_whitespace_chars, trim_end = trim_end) for str_ in strs]
+
 # ------------------------------------------------------------------------------
 #     Line parts
 # ------------------------------------------------------------------------------
@@ -519,10 +781,10 @@ def normalize_singleline_str(str_, trim_start = True, remove_redundant_whitespac
 
 # If the line is None or empty, a tuple with the same value set to each component is returned (to avoid the "not extracted" error).
 
-# If the line contains only whitespace, as the (non-greedy) middle part and the last part of the regex have no reason to take the characters, everything goes to the first part.
+# If the line contains only whitespace, everything goes to the first part.
 # I would say "an empty visible content having all the leading whitespace characters as indents" is a natural perception.
 
-# If the line contains line breaks, re.DOTALL lets "." match them and the matching should still succeed.
+# If the line contains line breaks, they are whitespace like any other and the splitting should still succeed.
 # At first, I checked is_debugging and raised an error, but that was overreacting, which only complicated the caller side's code.
 # Calling this method on a line is technically inappropriate, but it is often harmless
 #     while injecting a multiline string into a place where a singleline is expected may not be challenging.
@@ -531,21 +793,34 @@ def normalize_singleline_str(str_, trim_start = True, remove_redundant_whitespac
 # In many cases, a line only with invisible indents and trailing whitespace doesnt need to be processed.
 # Then, if the visible content shouldnt contain a line break, make sure to check it.
 
-COMPILED_REGEX_FOR_SPLIT_LINE_INTO_PARTS = re.compile(r"^(\s*)(.*?)(\s*)$", flags = re.DOTALL)
+# The parts used to be extracted with a regex: ^(\s*)(.*?)(\s*)$ with re.DOTALL.
+# The non-greedy middle part made the engine try the last group at every position of the visible content,
+#     and the 3 strings were created even when the caller only wanted to know whether the line was visible.
+# As "\s" matches exactly the characters str.isspace considers whitespace, lstrip/rstrip find the same boundaries in one linear pass each.
 
-def split_line_into_parts(str_):
+# get_line_part_offsets returns the boundaries instead of the strings:
+#     #1 is str_[:visible_content_start], #2 is str_[visible_content_start:visible_content_end] and #3 is str_[visible_content_end:].
+# If the line is falsy or contains only whitespace, both offsets are at the end of the line (or 0).
+# str.lstrip returns the same object when there's nothing to strip, so an unindented line is never copied.
+
+def get_line_part_offsets(str_):
     if not str_:
-        return (str_, str_, str_)
+        return (0, 0)
 
-    match = COMPILED_REGEX_FOR_SPLIT_LINE_INTO_PARTS.match(str_)
+    str_len = len(str_)
+    visible_content_start = str_len - len(str_.lstrip())
 
-    if match:
-        return match.groups()
+    if visible_content_start == str_len:
+        return (str_len, str_len)
 
-    else:
-        # Unless the "re" module is implemented incorrectly, the number of groups should always be 3.
-        # If this operation ever fails, theoretically, it'd be a failure upon parsing something in a certain format.
-        raise perrors.FormatError(f"Line parts could not be extracted from \"{str_}\".")
+    return (visible_content_start, len(str_.rstrip()))
+
+def split_line_into_parts(str_):
+    if not str_:
+        return (str_, str_, str_)
+
+    visible_content_start, visible_content_end = get_line_part_offsets(str_)
+    return (str_[:visible_content_start], str_[visible_content_start:visible_content_end], str_[visible_content_end:])
 
 # ------------------------------------------------------------------------------
 #     ChunkStrReader
@@ -560,6 +835,9 @@ def split_line_into_parts(str_):
 
 LINE_BREAK_CHARS = ["\r", "\n"]
 
+# "\r\n" must come first so that it is matched as one line break.
+COMPILED_REGEX_FOR_LINE_BREAKS = register_regex("pyddle_string/line_breaks", r"\r\n|\r|\n")
+
 def get_line_break_len(str_, str_len, first_line_break_char_index):
     if str_[first_line_break_char_index] == "\r":
         if first_line_break_char_index + 1 < str_len:
@@ -579,114 +857,98 @@ class ChunkStrReader:
             self.chunks.append(chunk)
 
     def read_str(self, force = False):
-        # If no chunk contains a line break char, it would be a singleline string when joined.
-
-        for chunk_index, chunk in enumerate(self.chunks):
-            line_break_index = index_of_any(chunk, LINE_BREAK_CHARS)
-
-            # When we find one chunk containing a line break char (not necessarily a complete line break),
-            #     we join the chunks up to that point as a singleline string and switch to the mode where "chunks_to_return" is populated.
-
-            # If that string contains at least one character, even though they may be whitespace,
-            #     as explained in the comments at the end of this method, the first indents are applied.
-
-            if line_break_index >= 0:
-                temp_str = "".join(self.chunks[0 : chunk_index])
+        # The buffered chunks are joined once and the line breaks are located with a compiled regex,
+        #     so that each character is looked at only by the regex engine and whole lines are appended as slices.
+        # The previous implementation appended one character at a time, which was noticeably slow with long streamed responses.
 
-                chunks_to_return = []
-
-                if not self.__first_indents_consumed and temp_str:
-                    chunks_to_return.append(self.indents)
-                    self.__first_indents_consumed = True
+        str_ = "".join(self.chunks)
+        self.chunks.clear()
 
-                chunks_to_return.append(temp_str)
+        if not str_:
+            return ""
 
-                # Now we have dealt with the singleline part.
-                # We have a chunk that contains at least one line break char and 0 or more chunks after that.
-                # As the first indents have been considered, we can deal with the rest as one joined string that contains 1 or more line break chars.
+        str_len = len(str_)
+        chunks_to_return = []
 
-                remaining_str = "".join(self.chunks[chunk_index : ])
-                remaining_str_len = len(remaining_str)
+        # We must consider as if there had been a line break before the beginning of the string.
+        # If the first line contains at least one character, even though they may be whitespace, the first indents are applied.
+        # When the string is normalized, I dont add indents to lines that would be empty when normalized,
+        #     but here the lines arent normalized and therefore one whitespace char alone could take the indentation.
+        # If the string starts with a line break, the first line is empty and the indents are no longer needed for it.
 
-                char_index = 0
+        if not self.__first_indents_consumed:
+            self.__first_indents_consumed = True
 
-                while char_index < remaining_str_len: # The loop must be like this so that "char_index" can be adjusted.
-                    char = remaining_str[char_index]
+            if str_[0] not in LINE_BREAK_CHARS:
+                chunks_to_return.append(self.indents)
 
-                    # When we meet a line break "char", we check the length of the line break and get the entire line break string.
-                    # Then, depending on what follows, we decide whether to add the indents after the line break or not.
+        # "line_start_index" is where the part that hasnt been appended yet starts.
+        line_start_index = 0
 
-                    if char in LINE_BREAK_CHARS:
-                        line_break_len = get_line_break_len(remaining_str, remaining_str_len, char_index)
-                        line_break_str = remaining_str[char_index : char_index + line_break_len]
+        for match in COMPILED_REGEX_FOR_LINE_BREAKS.finditer(str_):
+            line_break_end_index = match.end()
 
-                        if char_index + line_break_len < remaining_str_len: # No way we can leave the loop from this block.
-                            next_char = remaining_str[char_index + line_break_len]
+            # If there's no character after the line break, we need to wait for the next chunk(s) to know whether it'll be a new line or a non-line-break char.
+            # A trailing "\r" may also be the first half of "\r\n" that has been split into 2 chunks.
+            # If "force" is False, we keep just the line break in the chunks and return what we have collected so far.
+            # If "force" is True, assuming there wont be any more chunks, the line break is returned with everything else after the loop.
 
-                            # If the next character is another line break char, it cant be the second character of "\r\n" and it must be a empty line, which doesnt require indents.
+            if line_break_end_index == str_len:
+                if not force:
+                    chunks_to_return.append(str_[line_start_index : match.start()])
+                    self.chunks.append(match.group())
+                    return "".join(chunks_to_return)
 
-                            if next_char in LINE_BREAK_CHARS:
-                                chunks_to_return.append(line_break_str)
-                                char_index += line_break_len
+                break
 
-                            # If it's a non-line-break char, even though they may be whitespace, as explained in the comments at the end of this method, indents are applied before the next char.
+            chunks_to_return.append(str_[line_start_index : line_break_end_index])
 
-                            else:
-                                chunks_to_return.append(line_break_str)
-                                chunks_to_return.append(self.indents)
-                                char_index += line_break_len
+            # If the next character is another line break char, it cant be the second character of "\r\n" and it must be a empty line, which doesnt require indents.
+            # If it's a non-line-break char, even though they may be whitespace, indents are applied before the next char.
 
-                        # If there's no character after the line break, we need to wait for the next chunk(s) to know whether it'll be a new line or a non-line-break char.
-                        # If "force" is False, as we are at the end of the string and are seeing a line break there, having dealt with all characters before it,
-                        #     we clear the chunks, add just the line break to the list and return what we have collected so far.
-                        # If "force" is True, assuming there wont be any more chunks, we add the line break to the list and return everything.
+            if str_[line_break_end_index] not in LINE_BREAK_CHARS:
+                chunks_to_return.append(self.indents)
 
-                        else:
-                            if force: # Can leave the loop.
-                                # self.chunks.clear() # Cleared after the loop.
-                                chunks_to_return.append(line_break_str)
-                                char_index += line_break_len
+            line_start_index = line_break_end_index
 
-                            else: # Returns from here.
-                                self.chunks.clear()
-                                self.chunks.append(line_break_str)
-                                return "".join(chunks_to_return)
+        chunks_to_return.append(str_[line_start_index : ])
+        return "".join(chunks_to_return)
 
-                    # In this algorithm, a non-line-break char is not associated with any further actions.
+# ------------------------------------------------------------------------------
+#     Extraction of first part
+# ------------------------------------------------------------------------------
 
-                    else: # Can leave the loop.
-                        chunks_to_return.append(char)
-                        char_index += 1
+# Considering Python's rules, 80 should be a good number.
+# Then, in the UI, a place that can display 80 characters should be able to deal with 50% more characters.
+# 80-100 too is a good option, but if we look for a punctuation char, expecting a more natural break, there should be a little more room.
 
-                # If we have left the loop, it means we have dealt with all the characters 1) Including the last non-line-break char or 2) The last one was a line break char and "force" was True.
-                # In either case, we clear the chunks and return what we have collected.
+# extract_first_part is called for every row of a list view, and the strings may be long notes.
+# Only the first "max_len" + 1 characters of the normalized string are needed (the extra one tells us whether the string must be truncated),
+#     so a window at the beginning of the string is normalized, starting with a few times "max_len" and doubled until it's enough.
 
-                self.chunks.clear()
-                return "".join(chunks_to_return)
+# As "\s" matches exactly what str.strip removes, the normalized window is always the beginning of the whole normalized string:
+#     a word cut at the end of the window is the beginning of the word and whitespace at the end is just removed.
 
-        # Returns the joined singleline string.
+MIN_NORMALIZATION_WINDOW_LEN = 256
 
-        # If the string is not empty, even though they might not be visible,
-        #     there is at least one character that deserves to be indented if the first indents havent been consumed.
-        # When the string is normalized, I dont add indents to lines that would be empty when normalized,
-        #     but here the lines arent normalized and therefore one whitespace char alone could take the indentation.
+def normalize_beginning_of_singleline_str(str_, min_len):
+    '''
+        Returns the beginning of normalize_singleline_str(str_) that is longer than "min_len" and False,
+        or the whole normalized string and True if it's not longer than that.
+    '''
 
-        str_ = "".join(self.chunks)
-        self.chunks.clear()
+    str_len = len(str_)
+    window_len = max(min_len * 2, MIN_NORMALIZATION_WINDOW_LEN)
 
-        if not self.__first_indents_consumed and str_:
-            self.__first_indents_consumed = True
-            return self.indents + str_
+    while window_len < str_len:
+        normalized_window = normalize_singleline_str(str_[0 : window_len])
 
-        return str_
+        if len(normalized_window) > min_len:
+            return normalized_window, False
 
-# ------------------------------------------------------------------------------
-#     Extraction of first part
-# ------------------------------------------------------------------------------
+        window_len *= 2
 
-# Considering Python's rules, 80 should be a good number.
-# Then, in the UI, a place that can display 80 characters should be able to deal with 50% more characters.
-# 80-100 too is a good option, but if we look for a punctuation char, expecting a more natural break, there should be a little more room.
+    return normalize_singleline_str(str_), True
 
 def extract_first_part(str_, ideal_len = 80, max_len = 120, trailing = "..."):
     if not str_:
@@ -694,10 +956,9 @@ def extract_first_part(str_, ideal_len = 80, max_len = 120, trailing = "..."):
 
     # When we want to extract the first part of a string, we dont want it to contain line breaks or redundant whitespace.
 
-    normalized_str = normalize_singleline_str(str_)
-    normalized_str_len = len(normalized_str)
+    normalized_str, is_whole = normalize_beginning_of_singleline_str(str_, max_len)
 
-    if normalized_str_len <= max_len:
+    if is_whole and len(normalized_str) <= max_len:
         return normalized_str
 
     def _extract(category_first_letter):
@@ -724,3 +985,24 @@ def extract_first_part(str_, ideal_len = 80, max_len = 120, trailing = "..."):
 
     # If it's a CJK string, it'd end up here.
     return normalized_str[0 : ideal_len].rstrip() + trailing
+
+def extract_first_parts(strs, ideal_len = 80, max_len = 120, trailing = "..."):
+    ''' Calls extract_first_part for each string; a string that appears more than once is processed only once. '''
+
+    first_parts_by_str = {}
+    first_parts = []
+
+    for str_ in strs:
+        if not str_:
+            first_parts.append(str_)
+            continue
+
+        first_part = first_parts_by_str.get(str_)
+
+        if first_part is None:
+            first_part = extract_first_part(str_, ideal_len = ideal_len, max_len = max_len, trailing = trailing)
+            first_parts_by_str[str_] = first_part
+
+        first_parts.append(first_part)
+
+    return first_parts
@@ -1,6 +1,7 @@
 ﻿# Created: 2024-03-23
 # Type-conversion-related things.
 
+import pyddle_collections as pcollections
 import pyddle_errors as perrors
 import pyddle_string as pstring
 
@@ -37,14 +38,14 @@ def str_to_complex_or_default(str_, default):
         return default
 
 # Properly capitalized string representations of boolean values.
-# Then, string.contains_ignore_case compares the strings in a way that is not most efficient.
+# They are kept in case-insensitive sets so that string.contains_ignore_case doesnt need to lowercase each of them every time.
 
 # There's a chance that I'll be adding more in languages other than English.
 # I might also implement a method that parses a string and returns a boolean value together with its properly capitalized string representation.
 # So, I'm starting with this slightly redundant approach.
 
-TRUE_STRS = ["True", "Yes", "1"] # I wont be covering numbers other than 1 for now.
-FALSE_STRS = ["False", "No", "0"]
+TRUE_STRS = pcollections.CaseInsensitiveSet(["True", "Yes", "1"]) # I wont be covering numbers other than 1 for now.
+FALSE_STRS = pcollections.CaseInsensitiveSet(["False", "No", "0"])
 
 def str_to_bool(str_):
     if pstring.contains_ignore_case(TRUE_STRS, str_):
@@ -76,6 +77,51 @@ def str_to_bool_or_default(str_, default):
 
 # The following methods will help us handle either case:
 
+# Comparing the string with every member showed up when, for example, a langtree with many translations was deserialized,
+#     each of them being looked up in popenai.Language with 50+ members.
+# Now a lookup table is built for each enum type and kind of key the first time it is needed.
+# Enum types dont change after they are defined, so the tables never need to be rebuilt.
+
+# Keys: (enum_type, by_name, ignore_case)
+# Values: Member names/values (lowercased if "ignore_case" is True) => Members
+__enum_lookup_tables: dict[tuple[type, bool, bool], dict] = {} # pylint: disable = invalid-name
+
+def get_enum_lookup_table(enum_type, by_name, ignore_case):
+    key = (enum_type, by_name, ignore_case)
+    lookup_table = __enum_lookup_tables.get(key)
+
+    if lookup_table is None:
+        lookup_table = {}
+
+        for member in enum_type:
+            member_key = member.name if by_name else member.value
+
+            if ignore_case:
+                member_key = pstring.to_ignore_case_key(member_key)
+
+            # Like the linear search, the first member is found if 2 of them have keys that are equal.
+            if member_key not in lookup_table:
+                lookup_table[member_key] = member
+
+        __enum_lookup_tables[key] = lookup_table
+
+    return lookup_table
+
+def _try_get_enum_member(enum_type, by_name, value):
+    ''' Looks up a member case-sensitively. Returns None if not found. '''
+
+    try:
+        return get_enum_lookup_table(enum_type, by_name = by_name, ignore_case = False).get(value)
+
+    except TypeError:
+        # Unhashable values like lists and dictionaries cant be looked up in a dictionary.
+        # The linear search compared them with "==" and returned None instead of raising an error, so it's still used for them.
+        for member in enum_type:
+            if (member.name if by_name else member.value) == value:
+                return member
+
+        return None
+
 def str_to_enum_by_name(str_, enum_type, ignore_case = True):
     member = try_str_to_enum_by_name(str_, enum_type = enum_type, ignore_case = ignore_case)
 
@@ -86,16 +132,10 @@ def str_to_enum_by_name(str_, enum_type, ignore_case = True):
     raise perrors.FormatError(f"Invalid enum name: {str_}")
 
 def try_str_to_enum_by_name(str_, enum_type, ignore_case = True):
-    for member in enum_type:
-        if ignore_case:
-            if pstring.equals_ignore_case(member.name, str_):
-                return member
+    if ignore_case:
+        return get_enum_lookup_table(enum_type, by_name = True, ignore_case = True).get(pstring.to_ignore_case_key(str_))
 
-        else:
-            if member.name == str_:
-                return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = True, value = str_)
 
 def str_to_enum_by_str_value(str_, enum_type, ignore_case = True):
     member = try_str_to_enum_by_str_value(str_, enum_type = enum_type, ignore_case = ignore_case)
@@ -106,16 +146,10 @@ def str_to_enum_by_str_value(str_, enum_type, ignore_case = True):
     raise perrors.FormatError(f"Invalid enum value: {str_}")
 
 def try_str_to_enum_by_str_value(str_, enum_type, ignore_case = True):
-    for member in enum_type:
-        if ignore_case:
-            if pstring.equals_ignore_case(member.value, str_):
-                return member
+    if ignore_case:
+        return get_enum_lookup_table(enum_type, by_name = False, ignore_case = True).get(pstring.to_ignore_case_key(str_))
 
-        else:
-            if member.value == str_:
-                return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = False, value = str_)
 
 # I'm not sure if we need a pair of methods for each value type.
 # It doesnt hurt to have them and we might implement some checks in the future,
@@ -130,11 +164,7 @@ def str_to_enum_by_int_value(value, enum_type):
     raise perrors.FormatError(f"Invalid enum value: {value}")
 
 def try_str_to_enum_by_int_value(value, enum_type):
-    for member in enum_type:
-        if member.value == value:
-            return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = False, value = value)
 
 def str_to_enum_by_float_value(value, enum_type):
     member = try_str_to_enum_by_float_value(value, enum_type = enum_type)
@@ -145,11 +175,7 @@ def str_to_enum_by_float_value(value, enum_type):
     raise perrors.FormatError(f"Invalid enum value: {value}")
 
 def try_str_to_enum_by_float_value(value, enum_type):
-    for member in enum_type:
-        if member.value == value:
-            return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = False, value = value)
 
 def str_to_enum_by_complex_value(value, enum_type):
     member = try_str_to_enum_by_complex_value(value, enum_type = enum_type)
@@ -160,11 +186,7 @@ def str_to_enum_by_complex_value(value, enum_type):
     raise perrors.FormatError(f"Invalid enum value: {value}")
 
 def try_str_to_enum_by_complex_value(value, enum_type):
-    for member in enum_type:
-        if member.value == value:
-            return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = False, value = value)
 
 def str_to_enum_by_bool_value(value, enum_type):
     member = try_str_to_enum_by_bool_value(value, enum_type = enum_type)
@@ -175,8 +197,4 @@ def str_to_enum_by_bool_value(value, enum_type):
     raise perrors.FormatError(f"Invalid enum value: {value}")
 
 def try_str_to_enum_by_bool_value(value, enum_type):
-    for member in enum_type:
-        if member.value == value:
-            return member
-
-    return None
+    return _try_get_enum_member(enum_type, by_name = False, value = value)
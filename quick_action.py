@@ -11,9 +11,11 @@ import os
 import sys
 import traceback
 
+import pyddle_collections as pcollections
 import pyddle_console as pconsole
 import pyddle_datetime as pdatetime
 import pyddle_debugging as pdebugging
+import pyddle_errors as perrors
 import pyddle_file_system as pfs
 import pyddle_global as pglobal
 import pyddle_kvs as pkvs
@@ -49,24 +51,39 @@ try:
     actions_file_path = pkvs.read_from_merged_data(f"{KVS_KEY_PREFIX}actions_file_path")
     pconsole.print(f"actions_file_path: {actions_file_path}")
 
-    actions: list[Action] = []
+    # Command => Action, case-insensitively.
+    actions = pcollections.CaseInsensitiveDict()
 
     def _get_action(command_):
-        for action_ in actions:
-            if pstring.equals_ignore_case(action_.command, command_):
-                return action_
-
-        return None
+        return actions.get(command_)
 
     def _save():
         pfs.create_parent_directory(actions_file_path)
 
         with pfs.open_file_and_write_utf_encoding_bom(actions_file_path) as file_:
-            json.dump([action.serialize_to_dict() for action in sorted(actions, key = lambda action: action.command)], file_, indent = 4)
+            json.dump([action.serialize_to_dict() for action in sorted(actions.values(), key = lambda action: action.command)], file_, indent = 4)
 
     if os.path.isfile(actions_file_path):
+        # Command => All the commands that are equal to it, for the commands that are used more than once.
+        duplicate_commands = pcollections.CaseInsensitiveDict()
+
         with pfs.open_file_and_detect_utf_encoding(actions_file_path) as file:
-            actions.extend([Action.deserialize_from_dict(action_data) for action_data in json.load(file)])
+            for action_data in json.load(file):
+                action = Action.deserialize_from_dict(action_data)
+
+                if action.command in actions:
+                    if action.command not in duplicate_commands:
+                        duplicate_commands[action.command] = [actions.get_original_key(action.command)]
+
+                    duplicate_commands[action.command].append(action.command)
+                    continue
+
+                actions[action.command] = action
+
+        # Skipping any of the actions would drop it from the file the next time it's saved.
+        # All the duplicates are reported at once so that they can be fixed in one go.
+        if duplicate_commands:
+            raise perrors.InvalidDataError("Duplicate commands: " + "; ".join(", ".join(commands) for commands in duplicate_commands.values()))
 
     while True:
         plogging.flush()
@@ -80,7 +97,7 @@ try:
 
                 if new_command and new_prompt:
                     if not _get_action(new_command):
-                        actions.append(Action(command_ = new_command, prompt = new_prompt))
+                        actions[new_command] = Action(command_ = new_command, prompt = new_prompt)
                         _save()
                         pconsole.print(f"Created: {new_command} ({new_prompt})")
 
@@ -93,7 +110,7 @@ try:
                 if actions:
                     pconsole.print("Actions:")
 
-                    for action in sorted(actions, key = lambda action: action.command):
+                    for action in sorted(actions.values(), key = lambda action: action.command):
                         pconsole.print(f"{action.command}: {action.prompt}", indents = pstring.LEVELED_INDENTS[1])
 
                 else:
@@ -125,7 +142,7 @@ try:
                     action = _get_action(existing_command)
 
                     if action:
-                        actions.remove(action)
+                        del actions[action.command]
                         _save()
                         pconsole.print(f"Deleted: {existing_command}")
 
@@ -0,0 +1,173 @@
+﻿# Created: 2026-10-19
+# Tests and benchmarks pyddle_langtree.ContextBuilder with synthetic trees.
+
+# No API calls are made.
+# The token counts are set in advance so that the results dont depend on tiktoken.
+
+import datetime
+import random
+import time
+import typing
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_langtree as plangtree
+import pyddle_openai as popenai
+
+random.seed(0)
+
+ROLES = [popenai.Role.USER, popenai.Role.ASSISTANT]
+
+def build_synthetic_tree(message_count, branch_probability = 0.1):
+    ''' Returns the root message and the most recently created message. '''
+
+    root_message = plangtree.Message(user_role = popenai.Role.SYSTEM, content = "System message.")
+    root_message.token_count = 20
+
+    current_message = root_message
+
+    for index in range(message_count):
+        role = ROLES[index % 2]
+
+        # Occasionally, a new branch is started from the current message's parent.
+        if current_message.parent_element and random.random() < branch_probability:
+            new_message = current_message.create_sibling_message(user_role = role, content = f"Message {index}")
+
+        else:
+            new_message = current_message.create_child_message(user_role = role, content = f"Message {index}")
+
+        new_message.token_count = random.randint(10, 800)
+        current_message = new_message
+
+    return root_message, current_message
+
+# The selection before the heap-based implementation, kept for comparison.
+def build_with_sorting(context_builder: plangtree.ContextBuilder, elements: list[plangtree.Message]):
+    elements = sorted(elements, key = lambda element: element.creation_utc, reverse = True)
+
+    max_numbers = [context_builder.max_number_of_system_messages, context_builder.max_number_of_user_messages, context_builder.max_number_of_assistant_messages]
+    numbers = [0, 0, 0]
+
+    max_total_tokens = [context_builder.max_total_tokens_of_system_messages, context_builder.max_total_tokens_of_user_messages, context_builder.max_total_tokens_of_assistant_messages]
+    total_tokens = [0, 0, 0]
+
+    elements_to_include = []
+
+    for element in elements:
+        index = [popenai.Role.SYSTEM, popenai.Role.USER, popenai.Role.ASSISTANT].index(element.user_role)
+
+        if max_numbers[index] is None or numbers[index] < max_numbers[index]:
+            if max_total_tokens[index] is None or total_tokens[index] + element.token_count <= max_total_tokens[index]:
+                elements_to_include.append(element)
+
+                numbers[index] += 1
+                total_tokens[index] += element.token_count
+
+    elements_to_include.sort(key = lambda element: element.creation_utc)
+
+    return elements_to_include
+
+# ------------------------------------------------------------------------------
+#     Compatibility
+# ------------------------------------------------------------------------------
+
+# Without "max_total_tokens", the selection must be identical to the original one
+#     for the candidates "build" actually collects, which include older siblings on the way to the root element.
+
+_, last_message = build_synthetic_tree(1000)
+candidates = plangtree.ContextBuilder.collect_candidates(last_message)
+
+for builder in [plangtree.ContextBuilder(), plangtree.ContextBuilder(max_number_of_user_messages = None, max_number_of_assistant_messages = 100)]:
+    is_identical = builder.build(last_message).elements == build_with_sorting(builder, candidates)
+    pconsole.print(f"Identical to the sorting-based selection ({len(candidates)} candidates): {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# Far from 1970, float timestamps cant tell adjacent microseconds apart.
+# The selection must still follow "creation_utc" exactly.
+
+far_future_utc = datetime.datetime(9000, 1, 1, tzinfo = datetime.UTC)
+far_future_root_message = plangtree.Message(user_role = popenai.Role.SYSTEM, content = "System message.", creation_utc = far_future_utc)
+far_future_root_message.token_count = 20
+
+# When the keys tie, "order" puts the older messages first, so lost precision would select the oldest ones.
+for index in range(10):
+    far_future_message = far_future_root_message.create_child_message(user_role = ROLES[index % 2], content = f"Message {index}")
+    far_future_message.creation_utc = far_future_utc + datetime.timedelta(microseconds = index + 1)
+    far_future_message.token_count = 10
+
+is_float_precise = len({(far_future_utc + datetime.timedelta(microseconds = index + 1)).timestamp() for index in range(10)}) == 10
+builder = plangtree.ContextBuilder(max_number_of_user_messages = 2, max_number_of_assistant_messages = 2)
+is_identical = builder.build_from_candidates(far_future_root_message.child_messages).elements == build_with_sorting(builder, far_future_root_message.child_messages)
+pconsole.print(f"Identical to the sorting-based selection at microsecond precision (float timestamps precise enough: {is_float_precise}): {is_identical}",
+               colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# With a total budget, the selected messages must fit in it and system messages come first if requested.
+
+builder = plangtree.ContextBuilder(max_number_of_user_messages = None, max_total_tokens_of_user_messages = None,
+                                   max_number_of_assistant_messages = None, max_total_tokens_of_assistant_messages = None,
+                                   max_total_tokens = 8192, prioritize_system_messages = True)
+
+context = builder.build(last_message)
+total_tokens = sum(element.token_count for element in context.elements)
+is_valid = total_tokens <= 8192 and context.elements[0].user_role == popenai.Role.SYSTEM
+pconsole.print(f"Within the total budget ({total_tokens} tokens) with the system message: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+for line in plangtree.Context.statistics_to_lines(context.get_statistics()):
+    pconsole.print(line, indents = "    ")
+
+# A message that doesnt fit in the remaining budget is skipped, not the end of the selection.
+# The older, smaller messages that still fit must be selected.
+
+packing_utc = datetime.datetime(2024, 1, 1, tzinfo = datetime.UTC)
+packing_messages = [plangtree.Message(user_role = popenai.Role.SYSTEM, content = "System message.", creation_utc = packing_utc)]
+
+for index in range(4):
+    packing_message = packing_messages[-1].create_child_message(user_role = ROLES[index % 2], content = f"Message {index}")
+    packing_message.creation_utc = packing_utc + datetime.timedelta(seconds = index + 1)
+    packing_messages.append(packing_message)
+
+for packing_message, token_count in zip(packing_messages, [10, 10, 10, 100, 30]):
+    packing_message.token_count = token_count
+
+builder = plangtree.ContextBuilder(max_number_of_user_messages = None, max_total_tokens_of_user_messages = None,
+                                   max_number_of_assistant_messages = None, max_total_tokens_of_assistant_messages = None,
+                                   max_total_tokens = 60)
+
+is_valid = builder.build(packing_messages[-1]).elements == [packing_messages[0], packing_messages[1], packing_messages[2], packing_messages[4]]
+pconsole.print(f"Older messages fill the budget around an oversized one: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# ------------------------------------------------------------------------------
+#     Benchmark
+# ------------------------------------------------------------------------------
+
+# Every message on the path is a candidate; with no per-role limits, only the total budget ends the selection.
+# The token counts are left uncounted to see how many messages are actually tokenized;
+#     unless the budget is used up exactly, every candidate is, to find the ones that still fit.
+
+class CountingTokenCounter:
+    def __init__(self):
+        self.number_of_calls = 0
+
+    def count(self, str_):
+        self.number_of_calls += 1
+        return 10 + len(str_) * 50
+
+for message_count in [1000, 5000, 20000]:
+    _, last_message = build_synthetic_tree(message_count, branch_probability = 0)
+    candidates = last_message.get_path_from_root()
+
+    for candidate in candidates:
+        candidate.token_count = None
+
+    builder = plangtree.ContextBuilder(max_number_of_user_messages = None, max_total_tokens_of_user_messages = None,
+                                       max_number_of_assistant_messages = None, max_total_tokens_of_assistant_messages = None,
+                                       max_total_tokens = 128000)
+
+    token_counter = CountingTokenCounter()
+
+    start = time.perf_counter()
+    context = builder.build_from_candidates(candidates, token_counter = typing.cast(popenai.TokenCounter, token_counter))
+    elapsed = time.perf_counter() - start
+
+    pconsole.print(f"{len(candidates)} candidates: {len(context.elements)} selected, {token_counter.number_of_calls} tokenized in {elapsed * 1000:.2f} ms")
+
+pdebugging.display_press_enter_key_to_continue_if_not_debugging()
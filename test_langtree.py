@@ -10,7 +10,6 @@ import typing
 
 import pyddle_console as pconsole
 import pyddle_debugging as pdebugging
-import pyddle_errors as perrors
 import pyddle_file_system as pfs
 import pyddle_global as pglobal
 import pyddle_langtree as plangtree
@@ -20,27 +19,28 @@ import pyddle_string as pstring
 
 pglobal.set_main_script_file_path(__file__)
 
+# The encoding is loaded while the user is typing the first input instead of in the middle of the first request.
+popenai.prewarm_encodings()
+
 # Generated by GitHub Copilot:
 JAPANESE_TRANSLATION_PROMPT = "Translate the following text into Japanese:"
 RUSSIAN_TRANSLATION_PROMPT = "Translate the following text into Russian:"
 
-def translate(element: plangtree.Message, language: popenai.Language):
+def translate(element: plangtree.Message):
     client = popenai.create_client()
 
-    if language == popenai.Language.JAPANESE:
-        prompt = JAPANESE_TRANSLATION_PROMPT
-
-    elif language == popenai.Language.RUSSIAN:
-        prompt = RUSSIAN_TRANSLATION_PROMPT
-
-    else:
-        raise perrors.NotSupportedError(f"Unsupported language: {language}")
-
-    element.generate_translation_with_prompt(
-        language = language,
-        prompt = f"{prompt}\n\n{element.content}",
+    # The translations are generated concurrently.
+    jobs = element.generate_translations_with_prompts(
+        prompts = {
+            popenai.Language.JAPANESE: f"{JAPANESE_TRANSLATION_PROMPT}\n\n{element.content}",
+            popenai.Language.RUSSIAN: f"{RUSSIAN_TRANSLATION_PROMPT}\n\n{element.content}"
+        },
         client = client)
 
+    for job in jobs:
+        if job.exception:
+            raise job.exception
+
 def create_sibling_message(element: plangtree.Message | None, user_role: popenai.Role, content: str):
     if element is None:
         new_current_message = plangtree.Message(user_role = user_role, content = content)
@@ -53,10 +53,7 @@ def create_sibling_message(element: plangtree.Message | None, user_role: popenai
     if user_role == popenai.Role.USER:
         # Comments: SH77 langtree-related Comments.json
 
-        threads.append(threading.Thread(target = translate, args = (new_current_message, popenai.Language.JAPANESE)))
-        threads[-1].start()
-
-        threads.append(threading.Thread(target = translate, args = (new_current_message, popenai.Language.RUSSIAN)))
+        threads.append(threading.Thread(target = translate, args = (new_current_message,)))
         threads[-1].start()
 
         context_builder = plangtree.get_default_context_builder()
@@ -106,10 +103,7 @@ def create_sibling_message(element: plangtree.Message | None, user_role: popenai
             user_role = popenai.Role.ASSISTANT,
             content = content)
 
-        threads.append(threading.Thread(target = translate, args = (new_current_message, popenai.Language.JAPANESE)))
-        threads[-1].start()
-
-        threads.append(threading.Thread(target = translate, args = (new_current_message, popenai.Language.RUSSIAN)))
+        threads.append(threading.Thread(target = translate, args = (new_current_message,)))
         threads[-1].start()
 
     return new_current_message
@@ -162,7 +156,7 @@ try:
                     # If not, it automatically means it's the root element, so we set it to None.
 
                     if previous_message:
-                        typing.cast(plangtree.Message, current_message.parent_element).child_messages.remove(current_message)
+                        typing.cast(plangtree.Message, current_message.parent_element).remove_child_message(current_message)
                         current_message = previous_message
                         _save() # Only when the JSON file has been affected.
 
@@ -202,6 +196,16 @@ try:
         colors = pconsole.IMPORTANT_COLORS if new_json_str == json_str else pconsole.ERROR_COLORS
         pconsole.print(f"new_json_str == json_str: {new_json_str == json_str}", colors = colors)
 
+        # The compact binary format must roundtrip just like JSON.
+
+        for compress in [False, True]:
+            compact_bytes = new_root_message.serialize_to_bytes(compress = compress)
+            compact_root_message = plangtree.deserialize_from_bytes(compact_bytes)
+            compact_json_str = json.dumps(compact_root_message.serialize_to_dict(), ensure_ascii = False, indent = 4)
+
+            colors = pconsole.IMPORTANT_COLORS if compact_json_str == json_str else pconsole.ERROR_COLORS
+            pconsole.print(f"compact_json_str == json_str (compress: {compress}, {len(compact_bytes)} bytes vs {len(json_str.encode("utf-8"))} bytes): {compact_json_str == json_str}", colors = colors)
+
 except Exception: # pylint: disable = broad-except
     pconsole.print(traceback.format_exc(), colors = pconsole.ERROR_COLORS)
 
@@ -0,0 +1,170 @@
+﻿# Created: 2026-10-19
+# Tests the asynchronous generation methods of pyddle_langtree.py with a local stand-in for openai.AsyncOpenAI.
+
+# No API calls are made.
+# LocalAsyncClient accepts the same calls as openai.AsyncOpenAI for what pyddle_openai uses and "responds" by echoing the last message.
+# Each call sleeps for a moment so that concurrently driven branches actually overlap.
+
+import asyncio
+import tempfile
+import traceback
+import types
+import typing
+
+import openai
+import openai.types.chat
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_global as pglobal
+import pyddle_langtree as plangtree
+import pyddle_openai as popenai
+
+pglobal.set_main_script_file_path(__file__)
+
+class LocalAsyncClient:
+    def __init__(self, delay = 0.05):
+        self.delay = delay
+
+        self.number_of_calls = 0
+        self.number_of_active_calls = 0
+        self.max_number_of_active_calls = 0
+        self.received_messages: list = []
+        self.received_kwargs: list = []
+
+        # Like "client.chat.completions.create".
+        self.chat = types.SimpleNamespace(completions = types.SimpleNamespace(create = self._create_chat_completions))
+
+    async def _create_chat_completions(self, model, messages, stream = None, timeout = None, **kwargs): # pylint: disable = unused-argument
+        self.number_of_calls += 1
+        self.received_messages.append(messages)
+        self.received_kwargs.append(kwargs)
+
+        self.number_of_active_calls += 1
+        self.max_number_of_active_calls = max(self.max_number_of_active_calls, self.number_of_active_calls)
+
+        try:
+            await asyncio.sleep(self.delay)
+
+        finally:
+            self.number_of_active_calls -= 1
+
+        content = f"Echo: {messages[-1]["content"]}"
+
+        if stream:
+            return self._stream_chunks(content)
+
+        # A real model object so that it can be cached.
+        return openai.types.chat.ChatCompletion.model_validate({
+            "id": f"chatcmpl-{self.number_of_calls}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }]
+        })
+
+    async def _stream_chunks(self, content):
+        for word in content.split(" "):
+            await asyncio.sleep(0)
+            yield types.SimpleNamespace(choices = [types.SimpleNamespace(delta = types.SimpleNamespace(content = f"{word} "))])
+
+class LocalTokenCounter:
+    def count(self, str_):
+        return len(str_)
+
+async def main():
+    client = LocalAsyncClient()
+    async_client = typing.cast(openai.AsyncOpenAI, client)
+
+    chat_settings = popenai.ChatSettings(model = popenai.Model.GPT_4_TURBO)
+
+    context_builder = plangtree.ContextBuilder()
+    context_builder.token_counter = typing.cast(popenai.TokenCounter, LocalTokenCounter())
+
+    root_message = plangtree.Message(user_role = popenai.Role.SYSTEM, content = "System message.")
+    user_message = root_message.create_child_message(user_role = popenai.Role.USER, content = "Hello.")
+
+    # One child message through the context builder.
+    # The client must receive the messages of the context, not the Context object itself.
+
+    assistant_message = await user_message.generate_child_message_with_context_builder_async(context_builder, async_client = async_client, chat_settings = chat_settings)
+
+    is_valid = assistant_message.parent_element is user_message and assistant_message.content == "Echo: Hello." and \
+        [message["content"] for message in client.received_messages[-1]] == ["System message.", "Hello."]
+    pconsole.print(f"generate_child_message_with_context_builder_async: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+    # Several branches driven concurrently by one event loop.
+
+    branch_messages = [assistant_message.create_child_message(user_role = popenai.Role.USER, content = f"Branch {index}.") for index in range(5)]
+
+    branch_responses = await asyncio.gather(*[
+        message.generate_child_message_with_context_builder_async(context_builder, async_client = async_client, chat_settings = chat_settings) for message in branch_messages])
+
+    is_valid = all(response.content == f"Echo: Branch {index}." and response.parent_element is branch_messages[index] for index, response in enumerate(branch_responses)) and \
+        client.max_number_of_active_calls == len(branch_messages)
+    pconsole.print(f"Concurrent branches (max active calls: {client.max_number_of_active_calls}): {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+    # A sibling of the assistant message.
+
+    sibling_message = await assistant_message.generate_sibling_message_with_messages_async(popenai.build_messages("Again."), async_client = async_client, chat_settings = chat_settings)
+    is_valid = sibling_message.parent_element is user_message and sibling_message.content == "Echo: Again."
+    pconsole.print(f"generate_sibling_message_with_messages_async: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+    # Streaming.
+
+    stream = await branch_responses[0].start_generating_message_with_context_builder_async(context_builder, async_client = async_client, chat_settings = chat_settings)
+    deltas = [popenai.extract_first_delta(chunk) async for chunk in stream]
+    is_valid = "".join(deltas).strip() == f"Echo: {branch_responses[0].content}"
+    pconsole.print(f"start_generating_message_with_context_builder_async: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+    # Attributes and translations.
+
+    await asyncio.gather(
+        user_message.generate_attribute_with_prompt_async("summary", "Summarize.", async_client = async_client, chat_settings = chat_settings),
+        user_message.generate_translation_with_prompt_async(popenai.Language.JAPANESE, "Translate.", async_client = async_client, chat_settings = chat_settings))
+
+    is_valid = user_message.attributes["summary"].value == "Echo: Summarize." and user_message.translations[popenai.Language.JAPANESE].content == "Echo: Translate."
+    pconsole.print(f"generate_attribute_with_prompt_async/generate_translation_with_prompt_async: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+    # The response cache on the async path.
+    # The second request must be replayed without reaching the client.
+    # "seed" and "temperature" must be sent even though they are 0.
+
+    with tempfile.TemporaryDirectory() as cache_directory_path:
+        cache = popenai.ResponseCache(directory_path = cache_directory_path)
+        number_of_calls = client.number_of_calls
+
+        contents = []
+
+        for _ in range(2):
+            response = await popenai.create_chat_completions_async(popenai.Model.GPT_4_TURBO, popenai.build_messages("Cached."), temperature = 0, seed = 0, client = async_client, cache = cache)
+            contents.append(popenai.extract_first_message(response))
+
+        is_valid = contents == ["Echo: Cached.", "Echo: Cached."] and client.number_of_calls == number_of_calls + 1 and \
+            client.received_kwargs[-1].get("seed") == 0 and client.received_kwargs[-1].get("temperature") == 0
+        pconsole.print(f"create_chat_completions_async with ResponseCache: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# The default async HTTP client is bound to the event loop it's used in.
+# Each asyncio.run call must get its own while the calls within one loop share it.
+
+async def get_default_async_http_clients():
+    return popenai.get_default_async_http_client(), popenai.get_default_async_http_client()
+
+try:
+    asyncio.run(main())
+
+    first_http_clients = asyncio.run(get_default_async_http_clients())
+    second_http_clients = asyncio.run(get_default_async_http_clients())
+
+    is_valid = first_http_clients[0] is first_http_clients[1] and second_http_clients[0] is second_http_clients[1] and first_http_clients[0] is not second_http_clients[0]
+    pconsole.print(f"Default async HTTP client per event loop: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+except Exception: # pylint: disable = broad-except
+    pconsole.print(traceback.format_exc(), colors = pconsole.ERROR_COLORS)
+
+finally:
+    pdebugging.display_press_enter_key_to_continue_if_not_debugging()
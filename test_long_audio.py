@@ -0,0 +1,145 @@
+﻿# Created: 2026-10-19
+# Tests the stitching of long audio transcriptions in pyddle_openai.py with a synthetic WAV file and a local stand-in for the transcriptions endpoint.
+
+# No API calls are made.
+# Each frame of the WAV file holds its own index in the original file,
+#     so LocalTranscriptionClient can tell which part of the original a segment file covers
+#     and "transcribes" the scripted phrases as Whisper would: relative to the file and cut where the file ends.
+
+import os
+import struct
+import tempfile
+import traceback
+import types
+import typing
+import wave
+
+import openai
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_openai as popenai
+
+FRAME_RATE = 100
+
+# (start, end, text) in seconds in the original file.
+# With 30-second segments, the phrase from 29 to 31.5 crosses the first boundary and the one from 59.5 to 60.8 crosses the second one.
+PHRASES = [(index * 3.0 + 0.5, index * 3.0 + 2.5, f"Phrase {index}.") for index in range(9)] + \
+    [(29.0, 31.5, "Crossing phrase one."), (32.0, 34.0, "After the first boundary.")] + \
+    [(index * 3.0 + 0.5, index * 3.0 + 2.5, f"Phrase {index}.") for index in range(12, 19)] + \
+    [(59.5, 60.8, "Crossing phrase two."), (61.5, 63.0, "After the second boundary."), (70.0, 72.0, "Last phrase.")]
+
+DURATION = 75
+
+def write_synthetic_wav(file_path):
+    with wave.open(file_path, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(4)
+        file.setframerate(FRAME_RATE)
+        file.writeframes(b"".join(struct.pack("<i", index) for index in range(DURATION * FRAME_RATE)))
+
+class LocalTranscriptionClient:
+    def __init__(self):
+        self.requested_timestamp_granularities = []
+
+        # Like "client.audio.transcriptions.create".
+        self.audio = types.SimpleNamespace(transcriptions = types.SimpleNamespace(create = self._create_transcription))
+
+    def _create_transcription(self, file, model, response_format, timestamp_granularities = None, **kwargs): # pylint: disable = unused-argument
+        self.requested_timestamp_granularities.append(timestamp_granularities)
+
+        with wave.open(file, "rb") as wave_file:
+            frames = wave_file.readframes(wave_file.getnframes())
+
+        file_start = struct.unpack_from("<i", frames, 0)[0] / FRAME_RATE
+        file_end = file_start + len(frames) // 4 / FRAME_RATE
+
+        segments = []
+        words = []
+
+        for start, end, text in PHRASES:
+            if end <= file_start or start >= file_end:
+                continue
+
+            # What the file contains of the phrase.
+            if start < file_start:
+                text = f"(tail of) {text}"
+
+            if end > file_end:
+                text = f"{text} (cut)"
+
+            relative_start = max(start, file_start) - file_start
+            relative_end = min(end, file_end) - file_start
+
+            segments.append({"id": len(segments), "start": relative_start, "end": relative_end, "text": f" {text}"})
+            words.append({"word": text, "start": relative_start, "end": relative_end})
+
+        result = {"language": "english", "duration": file_end - file_start, "text": "".join(segment["text"] for segment in segments).strip()}
+
+        # Like the API, the segments are omitted when only "word" is requested.
+        if not timestamp_granularities or "segment" in timestamp_granularities:
+            result["segments"] = segments
+
+        if timestamp_granularities and "word" in timestamp_granularities:
+            result["words"] = words
+
+        return types.SimpleNamespace(model_dump = lambda: result)
+
+try:
+    EXPECTED_TEXTS = [text for _, _, text in sorted(PHRASES)]
+
+    with tempfile.TemporaryDirectory() as directory_path:
+        wav_file_path = os.path.join(directory_path, "synthetic.wav")
+        write_synthetic_wav(wav_file_path)
+
+        # The segment files must extend after their ranges, not before them.
+
+        segments = popenai.split_wav_file(wav_file_path, directory_path, segment_duration = 30, overlap = 2)
+        segment_ranges = [(segment.offset, segment.start, segment.end) for segment in segments]
+        is_valid = segment_ranges == [(0, 0, 30), (30, 30, 60), (60, 60, 75)]
+        pconsole.print(f"Segment ranges {segment_ranges}: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+        for timestamp_granularities in [None, ["word"], ["segment", "word"]]:
+            client = LocalTranscriptionClient()
+
+            result = typing.cast(dict, popenai.create_long_audio_transcription(
+                file_path = wav_file_path,
+                model = popenai.Model.WHISPER_1,
+                response_format = popenai.TranscriptFormat.VERBOSE_JSON,
+                timestamp_granularities = timestamp_granularities,
+                client = typing.cast(openai.OpenAI, client),
+                segment_duration = 30,
+                overlap = 2))
+
+            # The phrases crossing the boundaries must be kept whole, without cut or duplicated tails.
+            texts = [segment["text"].strip() for segment in result["segments"]]
+            is_valid = texts == EXPECTED_TEXTS and result["text"] == " ".join(EXPECTED_TEXTS) and \
+                [segment["start"] for segment in result["segments"]] == [start for start, _, _ in sorted(PHRASES)]
+
+            if timestamp_granularities and "word" in timestamp_granularities:
+                is_valid = is_valid and [word["word"] for word in result["words"]] == EXPECTED_TEXTS
+
+            pconsole.print(f"Stitched (timestamp_granularities: {timestamp_granularities}, requested: {client.requested_timestamp_granularities[0]}): {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+            if not is_valid:
+                for text in texts:
+                    pconsole.print(text, indents = "    ")
+
+        # SRT is rendered from the same stitched parts.
+
+        subtitles = typing.cast(str, popenai.create_long_audio_transcription(
+            file_path = wav_file_path,
+            model = popenai.Model.WHISPER_1,
+            response_format = popenai.TranscriptFormat.SRT,
+            client = typing.cast(openai.OpenAI, LocalTranscriptionClient()),
+            segment_duration = 30,
+            overlap = 2))
+
+        is_valid = "00:00:29,000 --> 00:00:31,500\nCrossing phrase one.\n" in subtitles and "(cut)" not in subtitles and "(tail of)" not in subtitles
+        pconsole.print(f"SRT: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+except Exception: # pylint: disable = broad-except
+    pconsole.print(traceback.format_exc(), colors = pconsole.ERROR_COLORS)
+
+finally:
+    pdebugging.display_press_enter_key_to_continue_if_not_debugging()
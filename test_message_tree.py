@@ -0,0 +1,102 @@
+﻿# Created: 2026-10-19
+# Tests the tree operations of pyddle_langtree.Message.
+
+# No API calls are made.
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_errors as perrors
+import pyddle_langtree as plangtree
+import pyddle_openai as popenai
+
+def get_contents(messages):
+    return [message.content for message in messages]
+
+# The tree:
+#     root
+#         a
+#             a1
+#             a2
+#                 a2x
+#         b
+#             b1
+#         c
+
+root = plangtree.Message(user_role = popenai.Role.SYSTEM, content = "root")
+
+a = root.create_child_message(user_role = popenai.Role.USER, content = "a")
+b = root.create_child_message(user_role = popenai.Role.USER, content = "b")
+c = root.create_child_message(user_role = popenai.Role.USER, content = "c")
+
+a1 = a.create_child_message(user_role = popenai.Role.ASSISTANT, content = "a1")
+a2 = a.create_child_message(user_role = popenai.Role.ASSISTANT, content = "a2")
+a2x = a2.create_child_message(user_role = popenai.Role.USER, content = "a2x")
+
+b1 = b.create_child_message(user_role = popenai.Role.ASSISTANT, content = "b1")
+
+# ------------------------------------------------------------------------------
+#     Traversal
+# ------------------------------------------------------------------------------
+
+is_valid = get_contents(root.iterate_depth_first()) == ["root", "a", "a1", "a2", "a2x", "b", "b1", "c"]
+pconsole.print(f"iterate_depth_first: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+is_valid = get_contents(root.iterate_breadth_first()) == ["root", "a", "b", "c", "a1", "a2", "b1", "a2x"]
+pconsole.print(f"iterate_breadth_first: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+is_valid = get_contents(a.iterate_depth_first()) == ["a", "a1", "a2", "a2x"]
+pconsole.print(f"iterate_depth_first (subtree): {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+is_valid = get_contents(a2x.get_path_from_root()) == ["root", "a", "a2", "a2x"]
+pconsole.print(f"get_path_from_root: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+is_valid = get_contents(root.get_path_from_root()) == ["root"]
+pconsole.print(f"get_path_from_root (root): {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# A deep chain must not hit the recursion limit.
+
+deep_message = root
+
+for index in range(10000):
+    deep_message = deep_message.create_child_message(user_role = popenai.Role.USER, content = f"deep {index}")
+
+is_valid = len(deep_message.get_path_from_root()) == 10001 and sum(1 for _ in root.iterate_depth_first()) == 10008 and sum(1 for _ in root.iterate_breadth_first()) == 10008
+pconsole.print(f"Deep chain: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+root.remove_child_message(root.child_messages[-1])
+
+# ------------------------------------------------------------------------------
+#     remove_child_message
+# ------------------------------------------------------------------------------
+
+root.remove_child_message(b)
+
+is_valid = get_contents(root.child_messages) == ["a", "c"] and \
+    [message.get_sibling_index() for message in root.child_messages] == [0, 1] and \
+    b.parent_element is None and b.parent_element_guid is None and b.get_sibling_index() is None and \
+    get_contents(b.get_path_from_root()) == ["b"] and get_contents(b1.get_path_from_root()) == ["b", "b1"] and \
+    get_contents(root.iterate_depth_first()) == ["root", "a", "a1", "a2", "a2x", "c"]
+
+pconsole.print(f"remove_child_message: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+is_valid = c.get_previous_message() is a
+pconsole.print(f"get_previous_message after removal: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# Removing a message that isnt a child must fail without changing anything.
+
+try:
+    a.remove_child_message(c)
+    pconsole.print("Removing a non-child message rejected: False", colors = pconsole.ERROR_COLORS)
+
+except perrors.ArgumentError:
+    is_valid = get_contents(root.child_messages) == ["a", "c"] and c.parent_element is root
+    pconsole.print(f"Removing a non-child message rejected: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+try:
+    root.remove_child_message(b)
+    pconsole.print("Removing a removed message rejected: False", colors = pconsole.ERROR_COLORS)
+
+except perrors.ArgumentError:
+    pconsole.print("Removing a removed message rejected: True", colors = pconsole.IMPORTANT_COLORS)
+
+pdebugging.display_press_enter_key_to_continue_if_not_debugging()
@@ -2,6 +2,7 @@
 # Test/sample code for pyddle_openai.py.
 
 import json
+import time
 import traceback
 
 import PIL.Image # pip install pillow
@@ -22,6 +23,30 @@ pfs.make_and_move_to_output_subdirectory("openai")
 # GitHub Copilot automatically generated this and I liked it. :)
 ENGLISH_TEXT_FOR_AUDIO = "Hello, my name is Pyddle. I am a Python library for creating games and applications. I am a work in progress, but I am getting better every day. I am excited to see what you will create with me. Have fun and happy coding!"
 
+def test_token_counter():
+    # No API calls are made.
+    # The batch and cached counts must be identical to the plain ones and the cached ones should be much faster.
+
+    token_counter = openai.TokenCounter(openai.Model.GPT_4_TURBO)
+    uncached_token_counter = openai.TokenCounter(openai.Model.GPT_4_TURBO, cache_size = 0)
+
+    strs = [f"{ENGLISH_TEXT_FOR_AUDIO} {index}" * 20 for index in range(1000)]
+
+    start = time.perf_counter()
+    counts = [uncached_token_counter.count(str_) for str_ in strs]
+    print(f"count: {time.perf_counter() - start:.3f} seconds")
+
+    start = time.perf_counter()
+    batch_counts = token_counter.count_batch(strs)
+    print(f"count_batch: {time.perf_counter() - start:.3f} seconds")
+
+    start = time.perf_counter()
+    cached_counts = [token_counter.count(str_) for str_ in strs]
+    print(f"count (cached): {time.perf_counter() - start:.3f} seconds")
+
+    is_identical = counts == batch_counts == cached_counts
+    pconsole.print(f"Counts identical: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
 def test_audio():
     # Makes audio.
 
@@ -108,6 +133,35 @@ def test_audio():
 
     print(f"English translation: {translation.text}")
 
+def test_long_audio_transcription():
+    # Makes a WAV file that is long enough to be split into a few segments with the default splitter.
+    # The text is generated in parts of up to 300 characters concurrently and the parts are joined into one file.
+
+    audio_file_name = openai.save_long_audio_speech(
+        file_path = "test_openai_english_long.wav",
+        input_ = " ".join([ENGLISH_TEXT_FOR_AUDIO] * 3),
+        model = openai.Model.TTS_1,
+        voice = openai.Voice.NOVA,
+        response_format = openai.AudioFormat.WAV,
+        max_length = 300)
+
+    print(f"Long English audio saved to: {audio_file_name}")
+
+    # Transcribes it in 15-second segments concurrently and stitches the subtitles.
+
+    subtitles = openai.create_long_audio_transcription(
+        file_path = audio_file_name,
+        model = openai.Model.WHISPER_1,
+        response_format = openai.TranscriptFormat.SRT,
+        segment_duration = 15)
+
+    subtitles_file_name = "test_openai_english_long.srt"
+    pfs.write_all_text_to_file(subtitles_file_name, subtitles)
+    print(f"Stitched subtitles saved to: {subtitles_file_name}")
+
+    for line in pstring.splitlines(subtitles):
+        pconsole.print(line, indents = pstring.LEVELED_INDENTS[1])
+
 def compare_original_and_translated_texts():
     translation_file_name = "test_openai_english_translation.json"
     translation_json = pfs.read_all_text_from_file(translation_file_name)
@@ -403,13 +457,16 @@ def test_images_and_vision():
     image_variation_responses = []
 
     for index in range(3):
+        # 2 variations each, returned as Base64 strings and decoded directly to the files.
         image_variation_responses.append(openai.create_image_variations(
             input_file_path = image_generation_file_names[index],
-            model = openai.Model.DALL_E_2))
+            model = openai.Model.DALL_E_2,
+            n = 2,
+            response_format = openai.ImageFormat.B64_JSON))
 
         variation_file_name = image_generation_file_names[index].replace(".png", "_variation.png")
-        openai.save_images(variation_file_name, image_variation_responses[index])
-        print(f"Image variation {index + 1} saved to: {variation_file_name}")
+        variation_file_paths = openai.save_images(variation_file_name, image_variation_responses[index])
+        print(f"Image variations {index + 1} saved to: {", ".join(variation_file_paths)}")
 
     # Asks Vision about each image.
 
@@ -439,9 +496,12 @@ def test_images_and_vision():
 
     vision_all_images_response = openai.create_chat_completions(
         model = openai.Model.GPT_4_VISION,
+        # This time, the images are downsampled to what the model sees with "low" before they are encoded.
         messages = openai.build_messages_for_vision(
             image_file_paths = image_generation_file_names,
-            user_message = "What do you find in common among these images?"))
+            user_message = "What do you find in common among these images?",
+            detail = openai.VisionDetail.LOW,
+            downsample = True))
             # => I once got a response like: I'm sorry, I can't help with identifying or making assumptions about these images.
 
     vision_all_images_file_name = "test_openai_images_vision.json"
@@ -459,6 +519,65 @@ def test_images_and_vision():
     for line in pstring.splitlines(vision_all_images_answer):
         pconsole.print(line, indents = pstring.LEVELED_INDENTS[1])
 
+def test_response_cache():
+    # The same deterministic request is sent twice (both with and without streaming).
+    # The second one should be returned from the cache almost instantly.
+
+    cache = openai.ResponseCache(directory_path = "test_openai_response_cache")
+    cache.clear()
+
+    messages = openai.build_messages("Name 3 household tools, separated by commas.")
+
+    for stream in [False, True]:
+        contents = []
+
+        for _ in range(2):
+            start = time.perf_counter()
+
+            response = openai.create_chat_completions(
+                model = openai.Model.GPT_4_TURBO,
+                messages = messages,
+                seed = 0,
+                stream = stream,
+                temperature = 0,
+                cache = cache)
+
+            if stream:
+                content = "".join(chunk_delta for chunk_delta in (openai.extract_first_delta(chunk) for chunk in response) if chunk_delta)
+
+            else:
+                content = openai.extract_first_message(response)
+
+            contents.append(content)
+            print(f"Response (stream: {stream}) in {time.perf_counter() - start:.3f} seconds: {content}")
+
+        colors = pconsole.IMPORTANT_COLORS if contents[0] == contents[1] else pconsole.ERROR_COLORS
+        pconsole.print(f"Cached response == original response (stream: {stream}): {contents[0] == contents[1]}", colors = colors)
+
+def test_request_executor():
+    # Asks for 3 household tools in different languages concurrently.
+    # The results must come back in the order of submission regardless of which response arrives first.
+
+    executor = openai.RequestExecutor(max_workers = 3, requests_per_minute = 60, tokens_per_minute = 10000)
+
+    languages = ["English", "Japanese", "Russian"]
+
+    jobs = [openai.create_chat_completions_job(
+        model = openai.Model.GPT_4_TURBO,
+        messages = openai.build_messages(f"Name 3 household tools in {language}, separated by commas."),
+        max_tokens = 100) for language in languages]
+
+    start = time.perf_counter()
+    executor.run(jobs)
+    print(f"Request executor completed {len(jobs)} jobs in {time.perf_counter() - start:.3f} seconds.")
+
+    for language, job in zip(languages, jobs):
+        if job.is_successful:
+            print(f"{language} ({job.number_of_attempts} attempts, estimated {job.estimated_tokens} tokens): {openai.extract_first_message(job.result)}")
+
+        else:
+            pconsole.print(f"{language}: {job.exception}", colors = pconsole.ERROR_COLORS)
+
 # ------------------------------------------------------------------------------
 #     Tests
 # ------------------------------------------------------------------------------
@@ -467,10 +586,15 @@ def test_images_and_vision():
 # You will find the file in the Resources repository's Episodic directory.
 
 try:
+    test_token_counter()
+
     test_audio()
     compare_original_and_translated_texts()
+    test_long_audio_transcription()
 
     test_chat()
+    test_response_cache()
+    test_request_executor()
 
     test_images_and_vision()
 
@@ -0,0 +1,148 @@
+﻿# Created: 2026-10-19
+# Tests the Batch API support in pyddle_openai.py with a local stand-in for the files and batches endpoints.
+
+# No API calls are made.
+# LocalBatchClient accepts the same calls as openai.OpenAI for what pyddle_openai uses,
+#     "processes" the uploaded JSONL file by echoing the last message of each request and returns the results in reverse order,
+#     so that mapping them back by "custom_id" is actually tested.
+
+import json
+import os
+import tempfile
+import traceback
+import types
+import typing
+
+import openai
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_errors as perrors
+import pyddle_global as pglobal
+import pyddle_openai as popenai
+import pyddle_string as pstring
+
+pglobal.set_main_script_file_path(__file__)
+
+class LocalBatchClient:
+    def __init__(self, number_of_polls_until_completed = 2, failing_custom_ids = None):
+        self.number_of_polls_until_completed = number_of_polls_until_completed
+        self.failing_custom_ids = failing_custom_ids or []
+
+        self.file_contents: dict[str, str] = {}
+        self.batch_objects: dict[str, types.SimpleNamespace] = {}
+        self.number_of_polls = 0
+
+        # Like "client.files.create" and "client.batches.retrieve".
+        self.files = types.SimpleNamespace(create = self._create_file, content = self._get_file_content)
+        self.batches = types.SimpleNamespace(create = self._create_batch, retrieve = self._retrieve_batch)
+
+    def _create_file(self, file, purpose):
+        file_id = f"file-{len(self.file_contents)}"
+        self.file_contents[file_id] = file.read().decode("utf-8")
+        return types.SimpleNamespace(id = file_id, purpose = purpose)
+
+    def _get_file_content(self, file_id):
+        return types.SimpleNamespace(text = self.file_contents[file_id])
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata = None): # pylint: disable = unused-argument
+        batch_id = f"batch-{len(self.batch_objects)}"
+        batch = types.SimpleNamespace(id = batch_id, status = "in_progress", input_file_id = input_file_id, output_file_id = None, error_file_id = None)
+        self.batch_objects[batch_id] = batch
+        return batch
+
+    def _retrieve_batch(self, batch_id):
+        batch = self.batch_objects[batch_id]
+        self.number_of_polls += 1
+
+        if batch.status == "in_progress" and self.number_of_polls >= self.number_of_polls_until_completed:
+            self._complete_batch(batch)
+
+        return batch
+
+    def _complete_batch(self, batch):
+        output_lines = []
+        error_lines = []
+
+        # JSONL lines are separated only by "\n"; see _read_batch_output_file.
+        for line in self.file_contents[batch.input_file_id].split("\n"):
+            if not line:
+                continue
+
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+
+            if custom_id in self.failing_custom_ids:
+                error_lines.append({"id": f"response-{custom_id}", "custom_id": custom_id, "response": None, "error": {"code": "stand_in_error", "message": "Failed on purpose."}})
+                continue
+
+            body = {
+                "id": f"chatcmpl-{custom_id}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": request["body"]["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": f"Echo: {request["body"]["messages"][-1]["content"]}"},
+                    "finish_reason": "stop"
+                }]
+            }
+
+            output_lines.append({"id": f"response-{custom_id}", "custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None})
+
+        output_lines.reverse()
+
+        # Like the API, non-ASCII characters arent escaped.
+        batch.output_file_id = self._create_file(types.SimpleNamespace(read = lambda: "".join(f"{json.dumps(line, ensure_ascii = False)}\n" for line in output_lines).encode("utf-8")), "batch_output").id
+
+        if error_lines:
+            batch.error_file_id = self._create_file(types.SimpleNamespace(read = lambda: "".join(f"{json.dumps(line)}\n" for line in error_lines).encode("utf-8")), "batch_output").id
+
+        batch.status = "completed"
+
+try:
+    settings = popenai.ChatSettings(model = popenai.Model.GPT_4_TURBO)
+    settings.max_tokens = 100
+
+    # The last message contains characters that str.splitlines would split at.
+    requests = [popenai.BatchRequest(custom_id = f"request-{index}", settings = settings, messages = popenai.build_messages(f"Message {index}")) for index in range(5)] + \
+        [popenai.BatchRequest(custom_id = "request-5", settings = settings, messages = popenai.build_messages("Line\u2028separator, next\x85line, form\x0cfeed"))]
+
+    # Duplicate IDs must be rejected before anything is uploaded.
+
+    try:
+        popenai.build_batch_jsonl(requests + [requests[0]])
+        pconsole.print("Duplicate custom_id accepted.", colors = pconsole.ERROR_COLORS)
+
+    except perrors.ArgumentError:
+        pconsole.print("Duplicate custom_id rejected.", colors = pconsole.IMPORTANT_COLORS)
+
+    client = LocalBatchClient(failing_custom_ids = ["request-3"])
+
+    # The uploaded JSONL file is a by-product of the test and doesnt belong in the output directory.
+    with tempfile.TemporaryDirectory() as temp_directory_path:
+        results = popenai.run_batch(
+            requests,
+            file_path = os.path.join(temp_directory_path, "test_openai_batch.jsonl"),
+            client = typing.cast(openai.OpenAI, client),
+            poll_interval = 0,
+            on_polled = lambda batch: pconsole.print(f"Polled: {batch.id} ({batch.status})"))
+
+    is_valid = True
+
+    for request, result in zip(requests, results):
+        if request.custom_id == "request-3":
+            is_valid = is_valid and not result.is_successful and result.error is not None
+
+        else:
+            is_valid = is_valid and result.is_successful and popenai.extract_first_message(result.response) == f"Echo: {request.messages[-1]["content"]}"
+
+        pconsole.print(f"{result.custom_id}: {popenai.extract_first_message(result.response) if result.is_successful else result.error}", indents = pstring.LEVELED_INDENTS[1])
+
+    pconsole.print(f"Results mapped back by custom_id: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+except Exception: # pylint: disable = broad-except
+    pconsole.print(traceback.format_exc(), colors = pconsole.ERROR_COLORS)
+
+finally:
+    pdebugging.display_press_enter_key_to_continue_if_not_debugging()
@@ -1,8 +1,59 @@
 ﻿# Created: 2024-03-16
 # A script to test pyddle_string.py and any string-related operations.
 
+import io
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+import pyddle_collections as pcollections
+import pyddle_console as pconsole
 import pyddle_debugging as pdebugging
-# pyddle_string must be imported in pyddle_debugging.
+# pyddle_string must be imported in pyddle_debugging for the evaluated expressions.
+import pyddle_string as pstring
+
+# ------------------------------------------------------------------------------
+#     CaseInsensitiveSet
+# ------------------------------------------------------------------------------
+
+# contains_* must return the same results for a list and the corresponding set.
+
+case_insensitive_names = [".git", ".vs", "bin", "obj", "Straße", "", "ΑΣ"]
+case_insensitive_candidates = [".GIT", ".Vs", "BIN", "Obj", "STRASSE", "straße", None, "", "ας", "ασ", "src"]
+
+for contains_func in [pstring.contains_ignore_case, pstring.contains_casefold]:
+    for casefold in [False, True]:
+        names_set = pcollections.CaseInsensitiveSet(case_insensitive_names, casefold = casefold)
+        is_identical = all(contains_func(case_insensitive_names, candidate) == contains_func(names_set, candidate) for candidate in case_insensitive_candidates)
+        pconsole.print(f"{contains_func.__name__} with CaseInsensitiveSet (casefold: {casefold}): {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# The set operations inherited from collections.abc.MutableSet must keep comparing the strings the same way.
+
+names_set = pcollections.CaseInsensitiveSet(["Straße", "Bin"], casefold = True)
+names_set.add("BIN")
+names_set |= ["OBJ"]
+names_set.discard("strasse")
+intersection = names_set & ["bin", "obj", "src"]
+
+is_valid = list(names_set) == ["Bin", "OBJ"] and names_set.get_original_str("obj") == "OBJ" and \
+    list(intersection) == ["bin", "obj"] and intersection.casefold and "STRASSE" in (intersection | ["straße"])
+pconsole.print(f"CaseInsensitiveSet operations: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# Directory walking checks each name against the same list.
+
+case_insensitive_names = [f"IgnoredDirectory{index}" for index in range(50)]
+names_set = pcollections.CaseInsensitiveSet(case_insensitive_names)
+case_insensitive_candidates = [f"ignoreddirectory{index}" for index in range(0, 100, 2)] * 200
+
+for names in [case_insensitive_names, names_set]:
+    start = time.perf_counter()
+    found_count = sum(1 for candidate in case_insensitive_candidates if pstring.contains_ignore_case(names, candidate))
+    elapsed = time.perf_counter() - start
+
+    pconsole.print(f"contains_ignore_case ({type(names).__name__}, {len(case_insensitive_candidates)} lookups): {elapsed * 1000:.2f} ms, found: {found_count}")
 
 # ------------------------------------------------------------------------------
 #     equals_at
@@ -106,6 +157,58 @@ pdebugging.try_evaluate('pstring.last_index_of_any("012", ["3"])')
 # pstring.last_index_of_any("012", ["1"]) => 1
 # pstring.last_index_of_any("012", ["3"]) => -1
 
+# ------------------------------------------------------------------------------
+#     index_of_any/last_index_of_any benchmark
+# ------------------------------------------------------------------------------
+
+# The per-index implementation before the regex-based one, kept for comparison.
+def index_of_any_at_each_index(str_, substrings, equals_at_func, reverse = False):
+    indices = range(len(str_) - 1, -1, -1) if reverse else range(len(str_))
+
+    for index in indices:
+        for substring in substrings:
+            if equals_at_func(str_, index, substring):
+                return index
+
+    return -1
+
+index_of_any_cases = [
+    ("Path", "C:\\Users\\someone\\Documents\\Projects\\pyddle\\output\\openai\\test_openai.json", ["\\", "/"], 100000),
+    ("Long text, late match", "lorem ipsum dolor sit amet " * 400 + "Consectetur", ["consectetur", "adipiscing", "elit"], 100),
+    ("Long text, no match", "lorem ipsum dolor sit amet " * 400, ["consectetur", "adipiscing", "elit"], 100)
+]
+
+index_of_any_funcs = [
+    ("index_of_any", pstring.index_of_any, pstring.equals_at, False),
+    ("index_of_any_ignore_case", pstring.index_of_any_ignore_case, pstring.equals_at_ignore_case, False),
+    ("last_index_of_any", pstring.last_index_of_any, pstring.equals_at, True),
+    ("last_index_of_any_casefold", pstring.last_index_of_any_casefold, pstring.equals_at_casefold, True)
+]
+
+for case_name, str_, substrings, number_of_calls in index_of_any_cases:
+    pconsole.print(f"{case_name} ({len(str_)} chars, {number_of_calls} calls):")
+
+    for func_name, func, equals_at_func, reverse in index_of_any_funcs:
+        start = time.perf_counter()
+
+        for _ in range(number_of_calls):
+            index = func(str_, substrings)
+
+        elapsed = time.perf_counter() - start
+
+        # The old implementation is slow enough to be measured with fewer calls.
+        old_number_of_calls = max(1, number_of_calls // 10)
+
+        start = time.perf_counter()
+
+        for _ in range(old_number_of_calls):
+            old_index = index_of_any_at_each_index(str_, substrings, equals_at_func, reverse = reverse)
+
+        old_elapsed = (time.perf_counter() - start) * number_of_calls / old_number_of_calls
+
+        pconsole.print(f"{func_name}: {elapsed * 1000:.2f} ms (per-index: {old_elapsed * 1000:.2f} ms), identical: {index == old_index}",
+                       indents = pstring.LEVELED_INDENTS[1], colors = pconsole.IMPORTANT_COLORS if index == old_index else pconsole.ERROR_COLORS)
+
 # ------------------------------------------------------------------------------
 #     Line parts
 # ------------------------------------------------------------------------------
@@ -128,4 +231,269 @@ pdebugging.try_evaluate('pstring.split_line_into_parts(" \\n ")')
 # pstring.split_line_into_parts(" a ") => (' ', 'a', ' ')
 # pstring.split_line_into_parts(" \n ") => (' \n ', '', '')
 
+# The strip-based splitting must return the same parts as the original regex for any mix of whitespace and visible characters.
+
+LINE_PARTS_REGEX = re.compile(r"^(\s*)(.*?)(\s*)$", flags = re.DOTALL)
+LINE_PARTS_CHARS = [" ", "\t", "\n", "\r", "\u3000", "\u00a0", "\x1c", "a", "b", "\u3042"]
+
+random.seed(0)
+
+line_parts_strs = ["".join(random.choices(LINE_PARTS_CHARS, k = random.randint(1, 12))) for _ in range(100000)]
+is_identical = all(pstring.split_line_into_parts(str_) == LINE_PARTS_REGEX.match(str_).groups() for str_ in line_parts_strs) # type: ignore
+pconsole.print(f"split_line_into_parts identical to the regex: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# Log-like lines: mostly indented, some with trailing whitespace, some empty.
+line_parts_strs = [f"{pstring.LEVELED_INDENTS[index % 3]}Line {index}: {"word " * (index % 20)}" if index % 5 else "" for index in range(200000)]
+
+start = time.perf_counter()
+
+for str_ in line_parts_strs:
+    LINE_PARTS_REGEX.match(str_).groups() # type: ignore
+
+regex_elapsed = time.perf_counter() - start
+
+start = time.perf_counter()
+
+for str_ in line_parts_strs:
+    pstring.split_line_into_parts(str_)
+
+split_elapsed = time.perf_counter() - start
+
+start = time.perf_counter()
+
+for str_ in line_parts_strs:
+    pstring.get_line_part_offsets(str_)
+
+offsets_elapsed = time.perf_counter() - start
+
+pconsole.print(f"{len(line_parts_strs)} lines: regex: {regex_elapsed * 1000:.2f} ms, split_line_into_parts: {split_elapsed * 1000:.2f} ms, get_line_part_offsets: {offsets_elapsed * 1000:.2f} ms",
+               colors = pconsole.IMPORTANT_COLORS)
+
+# ------------------------------------------------------------------------------
+#     Streaming line normalization
+# ------------------------------------------------------------------------------
+
+# iterate_normalized_lines must yield the same lines from a file object as splitlines returns from the file's content,
+#     while the peak memory usage stays small.
+
+line_normalization_text = "".join(f"  Line {index} \t\n" + ("\n" * (index % 5)) for index in range(200000))
+
+with tempfile.TemporaryDirectory() as temp_directory_path:
+    temp_file_path = os.path.join(temp_directory_path, "lines.txt")
+
+    with open(temp_file_path, "w", encoding = "utf-8") as temp_file:
+        temp_file.write(line_normalization_text)
+
+    del line_normalization_text
+
+    tracemalloc.start()
+
+    with open(temp_file_path, "r", encoding = "utf-8") as temp_file:
+        expected_lines = pstring.splitlines(temp_file.read(), trim_line_start = True)
+
+    # "expected_lines" stays allocated, so what the generator adds is measured from here.
+    baseline, list_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    with open(temp_file_path, "r", encoding = "utf-8") as temp_file:
+        is_identical = True
+        line_count = 0
+
+        for line_index, line in enumerate(pstring.iterate_normalized_lines(temp_file, trim_line_start = True)):
+            is_identical = is_identical and line_index < len(expected_lines) and line == expected_lines[line_index]
+            line_count += 1
+
+        is_identical = is_identical and line_count == len(expected_lines)
+
+    _, generator_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pconsole.print(f"iterate_normalized_lines ({line_count} lines): identical: {is_identical}, peak memory: {list_peak / 1024 / 1024:.1f} MiB (splitlines) vs {(generator_peak - baseline) / 1024 / 1024:.1f} MiB (generator)",
+                   colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# With "trim_line_end" set to False, only the line breaks that the stream ended the lines with are removed.
+# The items of a list are kept as they are.
+
+with io.StringIO("  a \r\nb\f\n\n\nc\r") as stream:
+    stream_lines = list(pstring.iterate_normalized_lines(stream, trim_line_end = False))
+
+list_lines = pstring.normalize_lines(["  a \r\n", "b\n", "", "", "c\r"], trim_line_end = False)
+
+is_valid = stream_lines == ["  a ", "b\f", "", "c"] and list_lines == ["  a \r\n", "b\n", "", "c\r"]
+pconsole.print(f"iterate_normalized_lines/normalize_lines (trim_line_end = False): {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# ------------------------------------------------------------------------------
+#     Regex registry
+# ------------------------------------------------------------------------------
+
+# Registering the same pattern with the same name returns the same object; another pattern with the name is an error.
+
+version_regex = pstring.register_regex("test_string/version", r"\[assembly:\s*AssemblyVersion\s*\(\"(?P<version>\d+\.\d+(\.\d+){0,2})\"\)\]", flags = re.IGNORECASE)
+is_same = pstring.register_regex("test_string/version", version_regex.pattern, flags = re.IGNORECASE) is version_regex and pstring.get_regex("test_string/version") is version_regex
+pconsole.print(f"Registered once: {is_same}", colors = pconsole.IMPORTANT_COLORS if is_same else pconsole.ERROR_COLORS)
+
+pdebugging.try_evaluate('pstring.register_regex("test_string/version", r"\\d+")')
+
+# Like reading the AssemblyInfo.cs files of many projects line by line.
+
+assembly_info_lines = [f"[assembly: AssemblyTitle(\"Project{index}\")]" for index in range(50000)] + ["[assembly: AssemblyVersion(\"1.2.3.4\")]"]
+
+for label, match_func in [
+    ("re.match with the pattern", lambda line: re.match(version_regex.pattern, line, flags = re.IGNORECASE)),
+    ("Registered regex", version_regex.match)]:
+    start = time.perf_counter()
+    matches = [match for match in map(match_func, assembly_info_lines) if match]
+    elapsed = time.perf_counter() - start
+
+    pconsole.print(f"{label}: {elapsed * 1000:.2f} ms for {len(assembly_info_lines)} lines, version: {matches[0].group("version")}")
+
+pstring.enable_regex_instrumentation()
+pstring.reset_regex_statistics()
+
+for line in assembly_info_lines:
+    version_regex.match(line)
+
+pstring.normalize_singleline_str("  Instrumented   string  ", trim_end = False) # The regex isnt used with the default options.
+pstring.enable_regex_instrumentation(False)
+
+pconsole.print("Regex statistics:")
+pconsole.print_lines(pstring.regex_statistics_to_lines(), indents = pstring.LEVELED_INDENTS[1])
+
+# ------------------------------------------------------------------------------
+#     normalize_singleline_strs
+# ------------------------------------------------------------------------------
+
+# The regex-based implementation of normalize_singleline_str before str.split was used with the default options, kept for comparison.
+def normalize_singleline_str_with_regex(str_, trim_start = True, remove_redundant_whitespace_chars = True, trim_end = True):
+    if not str_:
+        return str_
+
+    if trim_start:
+        new_str = str_.strip() if trim_end else str_.lstrip()
+
+    else:
+        new_str = str_.rstrip() if trim_end else str_
+
+    if remove_redundant_whitespace_chars:
+        return re.sub(r"\s+", " ", new_str)
+
+    return new_str
+
+# The other bulk approach that was tried: one regex pass over the strings joined with a separator.
+# Only for the default options and strings that dont contain the separator.
+def normalize_singleline_strs_in_joined_str(strs):
+    joined_str = "\x00".join(strs)
+    joined_str = re.sub(r"\s+", " ", joined_str).replace(" \x00", "\x00").replace("\x00 ", "\x00").strip(" ")
+    return joined_str.split("\x00")
+
+# Property check: for random strings (including None, "" and Unicode whitespace) and all the options,
+#     the results must be identical to those of the regex-based implementation.
+
+normalization_pieces = ["a", "bc", " ", "  ", "\t", "\n", "\r\n", "\u3000", "\u2028", "\x1c", "\xa0", "\u200b", "漢", "."]
+
+random.seed(0)
+
+is_identical = True
+
+for _ in range(2000):
+    strs = [random.choice([None, ""]) if random.random() < 0.05 else "".join(random.choice(normalization_pieces) for _ in range(random.randint(0, 12))) for _ in range(random.randint(0, 40))]
+
+    for trim_start in [False, True]:
+        for remove_redundant_whitespace_chars in [False, True]:
+            for trim_end in [False, True]:
+                expected_strs = [normalize_singleline_str_with_regex(str_, trim_start, remove_redundant_whitespace_chars, trim_end) for str_ in strs]
+
+                is_identical = (is_identical and
+                    [pstring.normalize_singleline_str(str_, trim_start, remove_redundant_whitespace_chars, trim_end) for str_ in strs] == expected_strs and
+                    pstring.normalize_singleline_strs(strs, trim_start, remove_redundant_whitespace_chars, trim_end) == expected_strs)
+
+pconsole.print(f"normalize_singleline_str(s) identical to the regex-based implementation: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# Where (if anywhere) each approach starts to pay off.
+
+for str_count in [1, 4, 16, 64, 1000, 20000]:
+    titles = [f"  Title {index}\tof  the\n entry  " for index in range(str_count)]
+    number_of_repetitions = max(1, 20000 // str_count)
+    elapsed_times = []
+
+    for func in [lambda strs: [normalize_singleline_str_with_regex(str_) for str_ in strs], normalize_singleline_strs_in_joined_str, pstring.normalize_singleline_strs]:
+        start = time.perf_counter()
+
+        for _ in range(number_of_repetitions):
+            func(titles)
+
+        elapsed_times.append(time.perf_counter() - start)
+
+    pconsole.print(f"{str_count} strings x {number_of_repetitions}: {elapsed_times[0] * 1000:.2f} ms (regex, one by one), "
+                   f"{elapsed_times[1] * 1000:.2f} ms (regex, joined), {elapsed_times[2] * 1000:.2f} ms (normalize_singleline_strs)")
+
+# ------------------------------------------------------------------------------
+#     extract_first_part
+# ------------------------------------------------------------------------------
+
+# Like rendering a list of long notes.
+# The results must be the same as normalizing the whole strings first, which is what extract_first_part used to do.
+
+def extract_first_part_from_whole_str(str_, ideal_len = 80, max_len = 120, trailing = "..."):
+    normalized_str = pstring.normalize_singleline_str(str_)
+
+    if len(normalized_str) <= max_len:
+        return normalized_str
+
+    return pstring.extract_first_part(normalized_str, ideal_len = ideal_len, max_len = max_len, trailing = trailing)
+
+long_notes = [f"Note {index}:\n\n" + "Lorem  ipsum dolor sit amet,\tconsectetur adipiscing elit.\n" * (index % 50 * 10) for index in range(500)]
+
+for label, func in [("Whole strings normalized", lambda strs: [extract_first_part_from_whole_str(str_) for str_ in strs]), ("extract_first_parts", pstring.extract_first_parts)]:
+    start = time.perf_counter()
+    first_parts = func(long_notes)
+    elapsed = time.perf_counter() - start
+
+    pconsole.print(f"{label}: {elapsed * 1000:.2f} ms for {len(long_notes)} notes ({sum(len(note) for note in long_notes)} chars)")
+
+is_identical = pstring.extract_first_parts(long_notes) == [extract_first_part_from_whole_str(note) for note in long_notes]
+pconsole.print(f"Identical: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# ------------------------------------------------------------------------------
+#     ChunkStrReader
+# ------------------------------------------------------------------------------
+
+# Streamed responses arrive in token-sized chunks of a few characters.
+# The concatenated output must be the whole text with the indents applied to every non-empty line, regardless of how the text is split.
+
+def indent_whole_str(str_, indents):
+    lines = str_.split("\n")
+    return "\n".join(f"{indents}{line}" if line else line for line in lines)
+
+# The chunk lengths are random, but seeded so that a failure can be reproduced.
+random.seed(0)
+
+chunk_str_reader_text = "".join(f"Line {index}: {"word " * (index % 20)}\n" + ("\n" if index % 7 == 0 else "") for index in range(20000))
+
+for line_break in ["\n", "\r\n"]:
+    text = chunk_str_reader_text.replace("\n", line_break)
+    chunks = []
+    chunk_start_index = 0
+
+    while chunk_start_index < len(text):
+        chunk_len = random.randint(1, 6)
+        chunks.append(text[chunk_start_index : chunk_start_index + chunk_len])
+        chunk_start_index += chunk_len
+
+    reader = pstring.ChunkStrReader(indents = pstring.LEVELED_INDENTS[1])
+    read_strs = []
+
+    start = time.perf_counter()
+
+    for chunk in chunks:
+        reader.add_chunk(chunk)
+        read_strs.append(reader.read_str())
+
+    read_strs.append(reader.read_str(force = True))
+    elapsed = time.perf_counter() - start
+
+    is_valid = "".join(read_strs) == indent_whole_str(text.replace(line_break, "\n"), pstring.LEVELED_INDENTS[1]).replace("\n", line_break)
+    pconsole.print(f"ChunkStrReader ({repr(line_break)}, {len(chunks)} chunks, {len(text)} chars): {elapsed * 1000:.2f} ms, valid: {is_valid}",
+                   colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
 pdebugging.display_press_enter_key_to_continue_if_not_debugging()
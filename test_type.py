@@ -0,0 +1,113 @@
+﻿# Created: 2026-10-19
+# Tests and benchmarks the string-to-enum conversions in pyddle_type.py.
+
+# No API calls are made.
+
+import enum
+import time
+
+import pyddle_console as pconsole
+import pyddle_debugging as pdebugging
+import pyddle_langtree as plangtree
+import pyddle_openai as popenai
+import pyddle_string as pstring
+import pyddle_type as ptype
+
+# The linear search before the lookup tables, kept for comparison.
+def try_str_to_enum_by_str_value_linearly(str_, enum_type, ignore_case = True):
+    for member in enum_type:
+        if ignore_case:
+            if pstring.equals_ignore_case(member.value, str_):
+                return member
+
+        else:
+            if member.value == str_:
+                return member
+
+    return None
+
+def try_str_to_enum_by_name_linearly(str_, enum_type, ignore_case = True):
+    for member in enum_type:
+        if ignore_case:
+            if pstring.equals_ignore_case(member.name, str_):
+                return member
+
+        else:
+            if member.name == str_:
+                return member
+
+    return None
+
+# ------------------------------------------------------------------------------
+#     Compatibility
+# ------------------------------------------------------------------------------
+
+# Includes values that only differ in case and a falsy value.
+class SampleEnum(enum.Enum):
+    ALPHA = "alpha"
+    BETA = "Beta"
+    EMPTY = ""
+    UPPER_BETA = "BETA"
+
+sample_strs = ["alpha", "ALPHA", "beta", "BETA", "Beta", "", None, "gamma", "upper_beta", "Upper_Beta", "EMPTY"]
+
+is_identical = all(
+    ptype.try_str_to_enum_by_str_value(str_, SampleEnum, ignore_case = ignore_case) == try_str_to_enum_by_str_value_linearly(str_, SampleEnum, ignore_case = ignore_case) and
+    ptype.try_str_to_enum_by_name(str_, SampleEnum, ignore_case = ignore_case) == try_str_to_enum_by_name_linearly(str_, SampleEnum, ignore_case = ignore_case)
+    for str_ in sample_strs for ignore_case in [True, False])
+
+pconsole.print(f"Identical to the linear search: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# Like the linear search, the "try_" methods must return None for unhashable values instead of raising an error.
+
+is_valid = all(func(value, SampleEnum) is None for func in [ptype.try_str_to_enum_by_int_value, ptype.try_str_to_enum_by_float_value,
+    ptype.try_str_to_enum_by_complex_value, ptype.try_str_to_enum_by_bool_value] for value in [["alpha"], {"alpha": 1}]) and \
+    ptype.try_str_to_enum_by_str_value(["alpha"], SampleEnum, ignore_case = False) is None and ptype.try_str_to_enum_by_name(["ALPHA"], SampleEnum, ignore_case = False) is None
+
+pconsole.print(f"Unhashable values: {is_valid}", colors = pconsole.IMPORTANT_COLORS if is_valid else pconsole.ERROR_COLORS)
+
+# ------------------------------------------------------------------------------
+#     Benchmark
+# ------------------------------------------------------------------------------
+
+# A langtree where every message has translations in several languages, some of which are not members of popenai.Language.
+
+TRANSLATION_LANGUAGES = [popenai.Language.JAPANESE, popenai.Language.RUSSIAN, popenai.Language.WELSH, "Klingon", "Esperanto"]
+
+# The tree is wide rather than deep because serialization is recursive.
+
+root_message = plangtree.Message(user_role = popenai.Role.SYSTEM, content = "System message.")
+
+for index in range(1000):
+    user_message = root_message.create_child_message(user_role = popenai.Role.USER, content = f"Question {index}")
+    assistant_message = user_message.create_child_message(user_role = popenai.Role.ASSISTANT, content = f"Answer {index}")
+
+    for message in [user_message, assistant_message]:
+        for language in TRANSLATION_LANGUAGES:
+            message.create_translation(language, f"{message.content} in {language}")
+
+root_dictionary = root_message.serialize_to_dict()
+translation_count = 2000 * len(TRANSLATION_LANGUAGES)
+
+start = time.perf_counter()
+deserialized_root_message = plangtree.Message.deserialize_from_dict(root_dictionary)
+elapsed = time.perf_counter() - start
+
+is_identical = deserialized_root_message.serialize_to_dict() == root_dictionary
+pconsole.print(f"Deserialized {translation_count} translations in {elapsed * 1000:.2f} ms, identical: {is_identical}", colors = pconsole.IMPORTANT_COLORS if is_identical else pconsole.ERROR_COLORS)
+
+# Just the language lookups, in the same number.
+
+language_strs = [language.value.upper() if isinstance(language, popenai.Language) else language for language in TRANSLATION_LANGUAGES] * 2000
+
+for func_name, func in [("Lookup tables", ptype.try_str_to_enum_by_str_value), ("Linear search", try_str_to_enum_by_str_value_linearly)]:
+    start = time.perf_counter()
+
+    for str_ in language_strs:
+        func(str_, popenai.Language, ignore_case = True)
+
+    elapsed = time.perf_counter() - start
+
+    pconsole.print(f"{func_name}: {elapsed * 1000:.2f} ms for {len(language_strs)} lookups", indents = pstring.LEVELED_INDENTS[1])
+
+pdebugging.display_press_enter_key_to_continue_if_not_debugging()